@@ -2,27 +2,37 @@ const express = require('express');
 const router = express.Router();
 const pool = require('../config/database');
 
+// Newest bucket of a rollup table for a household. Fetched before a windowed
+// query so that query is planned with a known start and range-scans the key
+const latestBucket = async (table, householdId) => {
+  const result = await pool.query(
+    `SELECT MAX(bucket) AS latest FROM ${table} WHERE household_id = $1`, [householdId]);
+  return result.rows[0].latest;
+};
+
 // GET /api/energy/consumption/:householdId
 router.get('/consumption/:householdId', async (req, res) => {
   try {
     const { householdId } = req.params;
     const { hours = 24 } = req.query;
 
+    // Served from the hourly rollup (database/schema.sql); the window starts
+    // at the bucket holding the latest reading minus `hours`
     const query = `
       SELECT 
-        time_bucket('1 hour', timestamp) AS hour,
+        bucket AS hour,
         appliance_type,
-        AVG(energy_kwh) as avg_energy_kwh,
-        AVG(cost_usd) as avg_cost_usd,
+        total_kwh / reading_count as avg_energy_kwh,
+        total_cost / reading_count as avg_cost_usd,
         usage_label
-      FROM energy_consumption
+      FROM energy_hourly
       WHERE household_id = $1
-        AND timestamp >= (SELECT MAX(timestamp) - INTERVAL '${hours} hours' FROM energy_consumption WHERE household_id = $1)
-      GROUP BY hour, appliance_type, usage_label
+        AND bucket >= $2::timestamp - INTERVAL '${hours} hours'
       ORDER BY hour DESC
     `;
 
-    const result = await pool.query(query, [householdId]);
+    const latest = await latestBucket('energy_hourly', householdId);
+    const result = await pool.query(query, [householdId, latest]);
     res.json(result.rows);
   } catch (error) {
     console.error('Error fetching consumption data:', error);
@@ -35,22 +45,23 @@ router.get('/peak-hours/:householdId', async (req, res) => {
   try {
     const { householdId } = req.params;
 
+    // Served from the hour-of-day rollup, which covers all history
     const query = `
       SELECT 
         usage_label,
-        EXTRACT(HOUR FROM timestamp) as hour,
-        COUNT(*) as frequency,
-        AVG(energy_kwh) as avg_energy_kwh
-      FROM energy_consumption
+        hour,
+        SUM(reading_count) as frequency,
+        SUM(total_kwh) / SUM(reading_count) as avg_energy_kwh
+      FROM energy_hour_profile
       WHERE household_id = $1
-        AND usage_label IN ('Peak', 'Normal', 'Off-Peak')
+        AND (usage_label IN ('Peak', 'Off-Peak') OR usage_label LIKE 'Normal%')
       GROUP BY usage_label, hour
       ORDER BY usage_label, hour
     `;
 
     const result = await pool.query(query, [householdId]);
 
-    // Organize by usage label
+    // Organize by usage label (with more than three bands, 'Normal 1'..'Normal N' all count as normal)
     const organized = {
       peak: [],
       normal: [],
@@ -65,7 +76,7 @@ router.get('/peak-hours/:householdId', async (req, res) => {
       };
 
       if (row.usage_label === 'Peak') organized.peak.push(data);
-      else if (row.usage_label === 'Normal') organized.normal.push(data);
+      else if (row.usage_label.startsWith('Normal')) organized.normal.push(data);
       else if (row.usage_label === 'Off-Peak') organized.offPeak.push(data);
     });
 
@@ -82,21 +93,23 @@ router.get('/cost-breakdown/:householdId', async (req, res) => {
     const { householdId } = req.params;
     const { days = 30 } = req.query;
 
+    // Whole days from the daily rollup, back from the day of the latest reading
     const query = `
       SELECT 
         appliance_type,
-        SUM(energy_kwh) as total_kwh,
-        SUM(cost_usd) as total_cost,
-        AVG(energy_kwh) as avg_kwh,
-        COUNT(*) as usage_count
-      FROM energy_consumption
+        SUM(total_kwh) as total_kwh,
+        SUM(total_cost) as total_cost,
+        SUM(total_kwh) / SUM(reading_count) as avg_kwh,
+        SUM(reading_count) as usage_count
+      FROM energy_daily
       WHERE household_id = $1
-        AND timestamp >= (SELECT MAX(timestamp) - INTERVAL '${days} days' FROM energy_consumption WHERE household_id = $1)
+        AND bucket >= $2::timestamp - INTERVAL '${days} days'
       GROUP BY appliance_type
       ORDER BY total_cost DESC
     `;
 
-    const result = await pool.query(query, [householdId]);
+    const latest = await latestBucket('energy_daily', householdId);
+    const result = await pool.query(query, [householdId, latest]);
 
     const totalCost = result.rows.reduce((sum, row) => sum + parseFloat(row.total_cost), 0);
 
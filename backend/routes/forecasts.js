@@ -1,7 +1,38 @@
 const express = require('express');
+const fs = require('fs');
+const path = require('path');
 const router = express.Router();
 const pool = require('../config/database');
 
+// Written by ml-pipeline/train_xgboost.py from its walk-forward validation folds
+const METRICS_PATH = process.env.MODEL_METRICS_PATH ||
+    path.join(__dirname, '../../ml-pipeline/models/walk_forward_metrics.json');
+
+let cachedMetrics = { mtimeMs: null, metrics: null };
+
+const loadModelMetrics = () => {
+    try {
+        const { mtimeMs } = fs.statSync(METRICS_PATH);
+        if (mtimeMs !== cachedMetrics.mtimeMs) {
+            const report = JSON.parse(fs.readFileSync(METRICS_PATH, 'utf8'));
+            cachedMetrics = {
+                mtimeMs,
+                metrics: {
+                    r2: report.r2,
+                    mae: report.mae,
+                    rmse: report.rmse,
+                    method: report.method,
+                    folds: report.n_folds
+                }
+            };
+        }
+        return cachedMetrics.metrics;
+    } catch (error) {
+        // No evaluation has been run yet
+        return { r2: 'N/A', mae: 'N/A', rmse: 'N/A', method: null, folds: 0 };
+    }
+};
+
 // GET /api/forecasts/:householdId
 router.get('/:householdId', async (req, res) => {
     try {
@@ -13,6 +44,8 @@ router.get('/:householdId', async (req, res) => {
         forecast_timestamp,
         appliance_type,
         predicted_energy_kwh,
+        predicted_lower_kwh,
+        predicted_upper_kwh,
         confidence_score,
         model_version
       FROM energy_forecasts
@@ -27,8 +60,9 @@ router.get('/:householdId', async (req, res) => {
         const totalPredicted = result.rows.reduce((sum, row) =>
             sum + parseFloat(row.predicted_energy_kwh), 0);
 
-        const avgConfidence = result.rows.length > 0
-            ? result.rows.reduce((sum, row) => sum + parseFloat(row.confidence_score), 0) / result.rows.length
+        const scored = result.rows.filter(row => row.confidence_score !== null);
+        const avgConfidence = scored.length > 0
+            ? scored.reduce((sum, row) => sum + parseFloat(row.confidence_score), 0) / scored.length
             : 0;
 
         // Group by day
@@ -46,7 +80,10 @@ router.get('/:householdId', async (req, res) => {
             dailyForecasts[date].appliances.push({
                 appliance: row.appliance_type,
                 predicted: parseFloat(row.predicted_energy_kwh).toFixed(4),
-                confidence: parseFloat(row.confidence_score).toFixed(2)
+                // Prediction interval; confidence is its measured coverage (null when none was stored)
+                lower: row.predicted_lower_kwh === null ? null : parseFloat(row.predicted_lower_kwh).toFixed(4),
+                upper: row.predicted_upper_kwh === null ? null : parseFloat(row.predicted_upper_kwh).toFixed(4),
+                confidence: row.confidence_score === null ? null : parseFloat(row.confidence_score).toFixed(2)
             });
         });
 
@@ -58,11 +95,7 @@ router.get('/:householdId', async (req, res) => {
                 modelVersion: result.rows[0]?.model_version || 'XGBoost_v1',
                 periodDays: days
             },
-            metrics: {
-                r2: 0.99,  // From model training
-                mae: 0.05,
-                rmse: 0.07
-            }
+            metrics: loadModelMetrics()
         });
     } catch (error) {
         console.error('Error fetching forecasts:', error);
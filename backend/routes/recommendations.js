@@ -8,36 +8,43 @@ router.get('/:householdId', async (req, res) => {
   try {
     const { householdId } = req.params;
 
-    // Gather energy data for recommendations
+    // Gather energy data for recommendations from the daily/hourly rollups
     const consumptionQuery = `
       SELECT 
         appliance_type,
         usage_label,
-        AVG(energy_kwh) as avg_kwh,
-        SUM(cost_usd) as total_cost
-      FROM energy_consumption
+        SUM(total_kwh) / SUM(reading_count) as avg_kwh,
+        SUM(total_cost) as total_cost
+      FROM energy_daily
       WHERE household_id = $1
-        AND timestamp >= (SELECT MAX(timestamp) - INTERVAL '7 days' FROM energy_consumption WHERE household_id = $1)
+        AND bucket >= $2::timestamp - INTERVAL '7 days'
       GROUP BY appliance_type, usage_label
       ORDER BY total_cost DESC
     `;
 
     const peakQuery = `
       SELECT 
-        EXTRACT(HOUR FROM timestamp) as hour,
-        AVG(energy_kwh) as avg_kwh
-      FROM energy_consumption
+        EXTRACT(HOUR FROM bucket) as hour,
+        SUM(total_kwh) / SUM(reading_count) as avg_kwh
+      FROM energy_hourly
       WHERE household_id = $1
         AND usage_label = 'Peak'
-        AND timestamp >= (SELECT MAX(timestamp) - INTERVAL '7 days' FROM energy_consumption WHERE household_id = $1)
+        AND bucket >= $2::timestamp - INTERVAL '7 days'
       GROUP BY hour
       ORDER BY avg_kwh DESC
       LIMIT 5
     `;
 
+    // Window starts are resolved first so both queries range-scan the rollup keys
+    const { rows: [latest] } = await pool.query(`
+      SELECT
+        (SELECT MAX(bucket) FROM energy_daily WHERE household_id = $1) AS daily,
+        (SELECT MAX(bucket) FROM energy_hourly WHERE household_id = $1) AS hourly
+    `, [householdId]);
+
     const [consumptionResult, peakResult] = await Promise.all([
-      pool.query(consumptionQuery, [householdId]),
-      pool.query(peakQuery, [householdId])
+      pool.query(consumptionQuery, [householdId, latest.daily]),
+      pool.query(peakQuery, [householdId, latest.hourly])
     ]);
 
     const energyData = {
@@ -3,10 +3,13 @@ const multer = require('multer');
 const csv = require('csv-parser');
 const fs = require('fs');
 const path = require('path');
+const axios = require('axios');
 const pool = require('../config/database');
 
 const router = express.Router();
 
+const FORECAST_SERVICE_URL = process.env.FORECAST_SERVICE_URL || 'http://127.0.0.1:8001';
+
 // Configure multer for file upload
 const upload = multer({
     dest: 'uploads/',
@@ -62,21 +65,52 @@ router.post('/energy-data', upload.single('file'), async (req, res) => {
             return 'Off-Peak';
         };
 
-        // Insert data into database
+        // Insert data into database, keeping the readings that were actually new
+        // (rows that repeat an existing reading are skipped and not counted)
         let insertedCount = 0;
+        const inserted = [];
         for (const row of results) {
             const usageLabel = assignUsageLabel(row.energy_kwh);
 
-            await client.query(
+            const { rows, rowCount } = await client.query(
                 `INSERT INTO energy_consumption 
                 (timestamp, household_id, appliance_type, energy_kwh, cost_usd, usage_label)
-                VALUES ($1, $2, $3, $4, $5, $6)`,
+                VALUES ($1, $2, $3, $4, $5, $6)
+                ON CONFLICT (household_id, timestamp, appliance_type) DO NOTHING
+                RETURNING timestamp, appliance_type, usage_label, energy_kwh, cost_usd`,
                 [row.timestamp, 1, row.appliance_type, parseFloat(row.energy_kwh), parseFloat(row.cost_usd), usageLabel]
             );
-            insertedCount++;
+            inserted.push(...rows);
+            insertedCount += rowCount;
         }
 
-        // Generate forecasts for next 7 days
+        // Fold the new readings into the rollups the dashboard reads
+        // (database/schema.sql), as ml-pipeline/bulk_load.py does for its loads
+        const rollups = [
+            ['energy_hourly', 'bucket', "date_trunc('hour', timestamp)"],
+            ['energy_daily', 'bucket', "date_trunc('day', timestamp)"],
+            ['energy_hour_profile', 'hour', 'EXTRACT(HOUR FROM timestamp)::int']
+        ];
+        for (const [table, key, expr] of rollups) {
+            await client.query(
+                `INSERT INTO ${table} AS r
+                (household_id, ${key}, appliance_type, usage_label, reading_count, total_kwh, total_cost)
+                SELECT $1, ${expr}, appliance_type, usage_label, COUNT(*), SUM(energy_kwh), COALESCE(SUM(cost_usd), 0)
+                FROM unnest($2::timestamp[], $3::varchar[], $4::varchar[], $5::numeric[], $6::numeric[])
+                    AS n(timestamp, appliance_type, usage_label, energy_kwh, cost_usd)
+                GROUP BY 2, 3, 4
+                ON CONFLICT (household_id, ${key}, appliance_type, usage_label) DO UPDATE
+                SET reading_count = r.reading_count + EXCLUDED.reading_count,
+                    total_kwh = r.total_kwh + EXCLUDED.total_kwh,
+                    total_cost = r.total_cost + EXCLUDED.total_cost`,
+                [1, inserted.map(r => r.timestamp), inserted.map(r => r.appliance_type),
+                    inserted.map(r => r.usage_label), inserted.map(r => r.energy_kwh), inserted.map(r => r.cost_usd)]
+            );
+        }
+
+        // Readings must be visible to the forecast service before it reads them
+        await client.query('COMMIT');
+
         const latestTimestamp = await client.query(
             'SELECT MAX(timestamp) as max_ts FROM energy_consumption WHERE household_id = $1',
             [1]
@@ -85,47 +119,49 @@ router.post('/energy-data', upload.single('file'), async (req, res) => {
         const lastDate = new Date(latestTimestamp.rows[0].max_ts);
         console.log(`📅 Latest timestamp: ${lastDate}`);
 
-        // Simple forecast based on average patterns
-        const avgQuery = await client.query(`
-            SELECT 
-                EXTRACT(hour FROM timestamp) as hour,
-                AVG(energy_kwh) as avg_kwh
-            FROM energy_consumption
-            WHERE household_id = $1
-            GROUP BY EXTRACT(hour FROM timestamp)
-            ORDER BY hour
-        `, [1]);
-
-        const hourlyAverages = {};
-        avgQuery.rows.forEach(row => {
-            hourlyAverages[row.hour] = parseFloat(row.avg_kwh);
-        });
-
-        // Delete old forecasts
-        await client.query('DELETE FROM energy_forecasts WHERE household_id = $1', [1]);
-
-        // Insert new forecasts
+        // Generate forecasts for next 7 days with the warm XGBoost forecast service
+        // (ml-pipeline/forecast_service.py), which bulk-writes energy_forecasts itself
         let forecastCount = 0;
-        for (let day = 1; day <= 7; day++) {
-            for (let hour = 0; hour < 24; hour++) {
-                const forecastDate = new Date(lastDate);
-                forecastDate.setDate(forecastDate.getDate() + day);
-                forecastDate.setHours(hour, 0, 0, 0);
-
-                const predictedKwh = (hourlyAverages[hour] || 1.5) * (0.95 + Math.random() * 0.1);
-
-                await client.query(
-                    `INSERT INTO energy_forecasts 
-                    (forecast_timestamp, household_id, appliance_type, predicted_energy_kwh, model_version, confidence_score, created_at)
-                    VALUES ($1, $2, $3, $4, $5, $6, NOW())`,
-                    [forecastDate, 1, 'Total', predictedKwh.toFixed(4), 'xgboost_v1', 0.95]
-                );
-                forecastCount++;
-            }
+        let modelVersion = 'xgboost_v1';
+        try {
+            const { data } = await axios.post(`${FORECAST_SERVICE_URL}/forecast`,
+                { household_id: 1, horizon: 7 * 24, write: true },
+                { timeout: 30000 });
+            forecastCount = data.forecastsWritten;
+            modelVersion = data.modelVersion;
+        } catch (serviceError) {
+            // Service not running: fall back to hourly averages, written in one statement,
+            // with the hour's 10th-90th percentile of readings as an 80% interval
+            console.warn(`⚠️ Forecast service unavailable (${serviceError.message}), using hourly averages`);
+            modelVersion = 'hourly_avg_v1';
+
+            await client.query('BEGIN');
+            await client.query('DELETE FROM energy_forecasts WHERE household_id = $1 AND model_version = $2',
+                [1, modelVersion]);
+            const fallback = await client.query(`
+                WITH hourly AS (
+                    SELECT EXTRACT(hour FROM timestamp) AS hour, AVG(energy_kwh) AS avg_kwh,
+                           PERCENTILE_CONT(0.1) WITHIN GROUP (ORDER BY energy_kwh) AS p10_kwh,
+                           PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY energy_kwh) AS p90_kwh
+                    FROM energy_consumption
+                    WHERE household_id = $1
+                    GROUP BY EXTRACT(hour FROM timestamp)
+                )
+                INSERT INTO energy_forecasts
+                (forecast_timestamp, household_id, appliance_type, predicted_energy_kwh,
+                 predicted_lower_kwh, predicted_upper_kwh, model_version, confidence_score, created_at)
+                SELECT ts, $1, 'Total', ROUND(COALESCE(h.avg_kwh, 1.5), 4),
+                       ROUND(h.p10_kwh::numeric, 4), ROUND(h.p90_kwh::numeric, 4), $3,
+                       CASE WHEN h.hour IS NULL THEN NULL ELSE 0.80 END, NOW()
+                FROM generate_series(date_trunc('day', $2::timestamp) + INTERVAL '1 day',
+                                     date_trunc('day', $2::timestamp) + INTERVAL '8 days' - INTERVAL '1 hour',
+                                     INTERVAL '1 hour') AS ts
+                LEFT JOIN hourly h ON h.hour = EXTRACT(hour FROM ts)
+            `, [1, latestTimestamp.rows[0].max_ts, modelVersion]);
+            await client.query('COMMIT');
+            forecastCount = fallback.rowCount;
         }
 
-        await client.query('COMMIT');
-
         // Clean up uploaded file
         fs.unlinkSync(filePath);
 
@@ -137,6 +173,7 @@ router.post('/energy-data', upload.single('file'), async (req, res) => {
             stats: {
                 rowsInserted: insertedCount,
                 forecastsGenerated: forecastCount,
+                modelVersion,
                 dateRange: {
                     from: results[0].timestamp,
                     to: results[results.length - 1].timestamp
@@ -15,6 +15,10 @@ CREATE TABLE IF NOT EXISTS households (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Kaggle Home ID whose readings the household holds (set by bulk_load.py); models
+-- trained per household cluster (segments.py) route on it
+ALTER TABLE households ADD COLUMN IF NOT EXISTS home_id INTEGER;
+
 -- ====================================
 -- 2. Energy Consumption Table (TimescaleDB Hypertable)
 -- ====================================
@@ -37,6 +41,22 @@ SELECT create_hypertable('energy_consumption', 'timestamp',
     if_not_exists => TRUE
 );
 
+-- Natural key: one reading per household, timestamp and appliance
+-- (created before compression is enabled; includes the time column as hypertables require).
+-- Databases loaded by the earlier, non-idempotent loader can hold duplicates that
+-- would stop the index from building: keep the first copy of each reading
+DO $$
+BEGIN
+    IF to_regclass('uq_energy_reading') IS NULL THEN
+        DELETE FROM energy_consumption a USING energy_consumption b
+        WHERE a.household_id = b.household_id AND a.timestamp = b.timestamp
+          AND a.appliance_type = b.appliance_type AND a.id > b.id;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_energy_reading
+    ON energy_consumption (household_id, timestamp, appliance_type);
+
 -- Enable compression
 ALTER TABLE energy_consumption SET (
     timescaledb.compress,
@@ -67,9 +87,25 @@ CREATE TABLE IF NOT EXISTS usage_patterns (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Readings behind avg_energy_kwh, so incremental loads can fold new readings in
+ALTER TABLE usage_patterns ADD COLUMN IF NOT EXISTS sample_count INTEGER NOT NULL DEFAULT 0;
+
 CREATE INDEX IF NOT EXISTS idx_usage_household 
     ON usage_patterns (household_id);
 
+-- Keep the newest duplicate pattern from earlier loads before adding the natural key
+DO $$
+BEGIN
+    IF to_regclass('uq_usage_pattern') IS NULL THEN
+        DELETE FROM usage_patterns a USING usage_patterns b
+        WHERE a.household_id = b.household_id AND a.hour = b.hour AND a.weekday = b.weekday
+          AND a.cluster_label = b.cluster_label AND a.id < b.id;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_usage_pattern
+    ON usage_patterns (household_id, hour, weekday, cluster_label);
+
 -- ====================================
 -- 4. Energy Forecasts Table
 -- ====================================
@@ -79,14 +115,35 @@ CREATE TABLE IF NOT EXISTS energy_forecasts (
     forecast_timestamp TIMESTAMP NOT NULL,
     appliance_type VARCHAR(50) NOT NULL,
     predicted_energy_kwh DECIMAL(10, 4) NOT NULL,
+    predicted_lower_kwh DECIMAL(10, 4),
+    predicted_upper_kwh DECIMAL(10, 4),
     confidence_score DECIMAL(5, 4),
     model_version VARCHAR(50),
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Prediction interval (lowest/highest trained quantile); confidence_score is its measured
+-- test coverage (NULL for forecasts without an interval)
+ALTER TABLE energy_forecasts ADD COLUMN IF NOT EXISTS predicted_lower_kwh DECIMAL(10, 4);
+ALTER TABLE energy_forecasts ADD COLUMN IF NOT EXISTS predicted_upper_kwh DECIMAL(10, 4);
+
 CREATE INDEX IF NOT EXISTS idx_forecast_household_time 
     ON energy_forecasts (household_id, forecast_timestamp DESC);
 
+-- Keep the newest duplicate forecast from earlier loads before adding the natural key
+DO $$
+BEGIN
+    IF to_regclass('uq_energy_forecast') IS NULL THEN
+        DELETE FROM energy_forecasts a USING energy_forecasts b
+        WHERE a.household_id = b.household_id AND a.forecast_timestamp = b.forecast_timestamp
+          AND a.appliance_type = b.appliance_type AND a.model_version = b.model_version
+          AND a.id < b.id;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_energy_forecast
+    ON energy_forecasts (household_id, forecast_timestamp, appliance_type, model_version);
+
 -- ====================================
 -- 5. Recommendations Table
 -- ====================================
@@ -104,6 +161,57 @@ CREATE TABLE IF NOT EXISTS recommendations (
 CREATE INDEX IF NOT EXISTS idx_recommendations_household 
     ON recommendations (household_id);
 
+-- ====================================
+-- 6. Load Watermarks
+-- ====================================
+-- Newest timestamp loaded per table by ml-pipeline/populate_database.py;
+-- incremental loads only merge rows newer than this
+CREATE TABLE IF NOT EXISTS load_watermarks (
+    table_name VARCHAR(63) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL,
+    rows_loaded BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- ====================================
+-- 7. Hourly, Daily and Hour-of-Day Rollups
+-- ====================================
+-- Readings, kWh and cost per household, bucket, appliance and usage label,
+-- kept current by ml-pipeline/rollups.py and backend/routes/upload.js; the
+-- dashboard endpoints read these instead of scanning energy_consumption
+CREATE TABLE IF NOT EXISTS energy_hourly (
+    household_id INTEGER NOT NULL REFERENCES households(household_id),
+    bucket TIMESTAMP NOT NULL,
+    appliance_type VARCHAR(50) NOT NULL,
+    usage_label VARCHAR(20) NOT NULL,
+    reading_count INTEGER NOT NULL,
+    total_kwh DECIMAL(14, 4) NOT NULL,
+    total_cost DECIMAL(14, 2) NOT NULL,
+    PRIMARY KEY (household_id, bucket, appliance_type, usage_label)
+);
+
+CREATE TABLE IF NOT EXISTS energy_daily (
+    household_id INTEGER NOT NULL REFERENCES households(household_id),
+    bucket TIMESTAMP NOT NULL,
+    appliance_type VARCHAR(50) NOT NULL,
+    usage_label VARCHAR(20) NOT NULL,
+    reading_count INTEGER NOT NULL,
+    total_kwh DECIMAL(14, 4) NOT NULL,
+    total_cost DECIMAL(14, 2) NOT NULL,
+    PRIMARY KEY (household_id, bucket, appliance_type, usage_label)
+);
+
+CREATE TABLE IF NOT EXISTS energy_hour_profile (
+    household_id INTEGER NOT NULL REFERENCES households(household_id),
+    hour INTEGER NOT NULL,
+    appliance_type VARCHAR(50) NOT NULL,
+    usage_label VARCHAR(20) NOT NULL,
+    reading_count INTEGER NOT NULL,
+    total_kwh DECIMAL(14, 4) NOT NULL,
+    total_cost DECIMAL(14, 2) NOT NULL,
+    PRIMARY KEY (household_id, hour, appliance_type, usage_label)
+);
+
 -- ====================================
 -- Seed Data: Insert Default Household
 -- ====================================
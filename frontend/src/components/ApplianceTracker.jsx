@@ -84,7 +84,7 @@ const ApplianceTracker = ({ householdId }) => {
     const filteredData = rawData.breakdown.filter(appliance => {
         if (filter === 'all') return true;
         if (filter === 'peak') return appliance.usageLabel === 'Peak';
-        if (filter === 'normal') return appliance.usageLabel === 'Normal';
+        if (filter === 'normal') return appliance.usageLabel?.startsWith('Normal');
         if (filter === 'off-peak') return appliance.usageLabel === 'Off-Peak';
         return true;
     });
@@ -130,7 +130,7 @@ const ApplianceTracker = ({ householdId }) => {
                             : 'bg-slate-700 text-slate-300 hover:bg-slate-600'
                             }`}
                     >
-                        Normal ({rawData.breakdown.filter(a => a.usageLabel === 'Normal').length})
+                        Normal ({rawData.breakdown.filter(a => a.usageLabel?.startsWith('Normal')).length})
                     </button>
                     <button
                         onClick={() => setFilter('off-peak')}
@@ -188,7 +188,7 @@ const ApplianceTracker = ({ householdId }) => {
                                         <h3 className="text-white font-semibold">{appliance.appliance}</h3>
                                         <div className="flex items-center gap-2">
                                             <span className={`text-xs px-2 py-0.5 rounded ${appliance.usageLabel === 'Peak' ? 'bg-red-900/50 text-red-300' :
-                                                appliance.usageLabel === 'Normal' ? 'bg-orange-900/50 text-orange-300' :
+                                                appliance.usageLabel?.startsWith('Normal') ? 'bg-orange-900/50 text-orange-300' :
                                                     'bg-green-900/50 text-green-300'
                                                 }`}>
                                                 {appliance.usageLabel}
@@ -0,0 +1,120 @@
+# -----------------------------
+# ⏱️ Benchmark - COPY bulk loader vs the old execute_values loop
+# -----------------------------
+# Tiles models/data_with_predictions.csv up to each requested size, loads it
+# with bulk_load.bulk_load() and (up to --legacy-max rows) with the previous
+# populate_database.py approach: iterrows() tuples + execute_values in
+# 1000-row batches, committing per batch, on one connection. Tables are
+# truncated before every run, and each COPY load is followed by an incremental
+# re-run of the same file. Rows/s counts readings + forecasts + patterns written.
+# Usage: python bench_bulk_load.py [--dsn "host=localhost dbname=IEOMS ..."]
+#                                  [--sizes 100000 500000 1000000]
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+
+from bulk_load import CSV_PATH, SOURCE_COLUMNS, bulk_load
+from db_config import DB_CONFIG
+from rollups import ROLLUPS
+
+# bulk_load folds every load into the rollups too, so they are emptied with the base tables
+TABLES = ["energy_consumption", "usage_patterns", "energy_forecasts", "load_watermarks", *ROLLUPS]
+
+
+def truncate(connect_kwargs):
+    with psycopg2.connect(**connect_kwargs) as conn, conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY")
+    conn.close()
+
+
+def legacy_load(connect_kwargs, path, batch_size=1000):
+    df = pd.read_csv(path)
+    conn = psycopg2.connect(**connect_kwargs)
+    cursor = conn.cursor()
+
+    energy = [(1, row["datetime"], row["Appliance Type"], float(row["Energy Consumption (kWh)"]),
+               float(row["Outdoor Temperature (°C)"]), row["Season"],
+               float(row["Energy Consumption (kWh)"]) * 0.12, row["usage_label"])
+              for _, row in df.iterrows()]
+    for i in range(0, len(energy), batch_size):
+        execute_values(cursor, """INSERT INTO energy_consumption (household_id, timestamp, appliance_type,
+            energy_kwh, outdoor_temp, season, cost_usd, usage_label) VALUES %s ON CONFLICT DO NOTHING""",
+                       energy[i:i + batch_size])
+        conn.commit()
+
+    patterns = df.groupby(["hour", "weekday", "usage_label"])["Energy Consumption (kWh)"].mean().reset_index()
+    execute_values(cursor, """INSERT INTO usage_patterns (household_id, hour, weekday, cluster_label,
+        avg_energy_kwh) VALUES %s ON CONFLICT DO NOTHING""",
+                   [(1, int(r["hour"]), int(r["weekday"]), r["usage_label"],
+                     float(r["Energy Consumption (kWh)"])) for _, r in patterns.iterrows()])
+    conn.commit()
+
+    forecasts = [(1, row["datetime"], row["Appliance Type"], float(row["predicted_energy_kwh"]),
+                  0.99, "XGBoost_v1") for _, row in df.iterrows()]
+    for i in range(0, len(forecasts), batch_size):
+        execute_values(cursor, """INSERT INTO energy_forecasts (household_id, forecast_timestamp,
+            appliance_type, predicted_energy_kwh, confidence_score, model_version) VALUES %s
+            ON CONFLICT DO NOTHING""", forecasts[i:i + batch_size])
+        conn.commit()
+    conn.close()
+    return len(energy) + len(patterns) + len(forecasts)
+
+
+def write_sized_csv(source, rows, path):
+    """Tile `source` to `rows` rows, shifting each copy a year later so natural keys stay unique."""
+    stamps = pd.to_datetime(source["datetime"])
+    reps = int(np.ceil(rows / len(source)))
+    copies = [source.assign(datetime=stamps + pd.DateOffset(years=k)) for k in range(reps)]
+    pd.concat(copies, ignore_index=True).iloc[:rows].to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk loader throughput benchmark")
+    parser.add_argument("--dsn", default=None, help="libpq connection string (default: db_config)")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 500_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=200_000,
+                        help="skip the old loader above this many rows")
+    args = parser.parse_args()
+
+    connect_kwargs = {"dsn": args.dsn} if args.dsn else DB_CONFIG
+    source = pd.read_csv(args.csv, usecols=SOURCE_COLUMNS)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            path = os.path.join(tmp, f"data_{rows}.csv")
+            write_sized_csv(source, rows, path)
+
+            truncate(connect_kwargs)
+            start = time.perf_counter()
+            loaded = sum(bulk_load(connect_kwargs, path).values())
+            results.append((rows, "copy", loaded, time.perf_counter() - start))
+
+            # Nothing is newer than the watermark now: only the CSV scan remains
+            start = time.perf_counter()
+            loaded = sum(bulk_load(connect_kwargs, path, incremental=True).values())
+            results.append((rows, "copy rerun inc", loaded, time.perf_counter() - start))
+
+            if rows <= args.legacy_max:
+                truncate(connect_kwargs)
+                start = time.perf_counter()
+                loaded = legacy_load(connect_kwargs, path)
+                results.append((rows, "execute_values", loaded, time.perf_counter() - start))
+            os.remove(path)
+    truncate(connect_kwargs)
+
+    print(f"\n{'readings':>10} {'loader':<15} {'rows':>10} {'seconds':>9} {'rows/s':>12}")
+    for rows, loader, loaded, elapsed in results:
+        print(f"{rows:>10} {loader:<15} {loaded:>10} {elapsed:>9.2f} {loaded / elapsed:>12,.0f}")
+    print("(copy rerun inc = incremental re-run of the same file; rows/s counts rows written)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -----------------------------
+# ⏱️ Benchmark - ForecastEngine vs. the legacy per-row forecast_energy
+# -----------------------------
+# Builds a 7-day × 24-hour × appliance grid and forecasts it once row by row
+# (the old forecast_energy code path) and once as a single ForecastEngine batch.
+# Usage: python bench_forecast_engine.py [--models models] [--households 1]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from forecast_engine import ForecastEngine, FEATURES, load_artifacts, require_artifacts
+
+
+def legacy_forecast_energy(m, app, temp, season, house, hr, day, mon, usage_label):
+    """The original train_xgboost.py forecast_energy, bound to the artifacts dict `m`."""
+    usage_encoded = m["le_usage"].transform([usage_label])[0]
+
+    feat = pd.DataFrame([[
+        m["le_app"].transform([app])[0],
+        temp,
+        m["le_season"].transform([season])[0],
+        house,
+        hr,
+        day,
+        mon,
+        m["appliance_base"][app],
+        m["season_mult"][season],
+        m["household_factor"][house],
+        m["monthly_mult"][mon],
+        m["daily_mult"][day],
+        temp * m["temp_coeff"].get(app, 0),
+        usage_encoded,
+        0, 0, 0,
+        0, 0, 0,
+        0, 0, 0
+    ]], columns=FEATURES)
+
+    feat_scaled = m["scaler_x"].transform(feat)
+    pred_scaled = m["xgboost_model"].predict(feat_scaled)[0]
+    return float(m["scaler_y"].inverse_transform([[pred_scaled]])[0][0])
+
+
+def build_grid(engine, households):
+    apps = engine.app_classes
+    hours = np.arange(24)
+    days = np.arange(7)
+    sizes = np.arange(1, households + 1) % len(engine.house_f)
+    sizes[sizes == 0] = 1
+    h, d, a, s = np.meshgrid(hours, days, np.arange(len(apps)), sizes, indexing="ij")
+    n = h.size
+    return {
+        "appliance": apps[a.ravel()],
+        "temp": np.full(n, 20.0),
+        "season": np.full(n, engine.season_classes[0]),
+        "house": s.ravel(),
+        "hour": h.ravel(),
+        "weekday": d.ravel(),
+        "month": np.full(n, 6),
+        "usage_label": np.full(n, engine.usage_classes[0]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ForecastEngine vs. legacy forecast_energy")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--households", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    require_artifacts(args.models)  # forecast_energy, the reference, runs on the pickle set
+    artifacts = load_artifacts(args.models)
+    engine = ForecastEngine(**{("model" if k == "xgboost_model" else k): v
+                               for k, v in artifacts.items()})
+    grid = build_grid(engine, args.households)
+    n = len(grid["hour"])
+    print(f"📐 Grid: {n} rows (7 days × 24 hours × {len(engine.app_classes)} appliances "
+          f"× {args.households} households)")
+
+    start = time.perf_counter()
+    legacy = np.array([legacy_forecast_energy(artifacts, *row) for row in zip(*grid.values())])
+    legacy_s = time.perf_counter() - start
+
+    batch_s = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        batched = engine.predict(**grid)
+        batch_s = min(batch_s, time.perf_counter() - start)
+
+    print(f"  legacy forecast_energy : {n / legacy_s:12,.0f} rows/s ({legacy_s:.3f}s)")
+    print(f"  ForecastEngine.predict : {n / batch_s:12,.0f} rows/s ({batch_s * 1000:.2f}ms)")
+    print(f"  speedup                : {legacy_s / batch_s:.0f}x")
+    print(f"  max |Δ| vs legacy      : {np.abs(legacy - batched).max():.2e} kWh")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# -----------------------------
+# ⏱️ Benchmark - forecast service latency for a full household horizon
+# -----------------------------
+# Starts the service in-process on a free port and POSTs /forecast requests
+# carrying the household's recent readings (no database needed), then reports
+# client-side p50/p99 latency.
+# Usage: python bench_forecast_service.py [--requests 200] [--horizon 168]
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from forecast_service import ForecastService, make_server
+
+
+def household_history(appliances, readings=12, end="2024-01-01 00:00"):
+    stamps = pd.date_range(end=end, periods=readings, freq="h")
+    rng = np.random.default_rng(0)
+    return [{"timestamp": str(ts), "appliance_type": app,
+             "energy_kwh": float(rng.uniform(0.2, 3.0)), "outdoor_temp": 12.0,
+             "household_size": 4}
+            for app in appliances for ts in stamps]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast service latency benchmark")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--horizon", type=int, default=168)
+    args = parser.parse_args()
+
+    service = ForecastService(args.models)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/forecast"
+
+    appliances = service.forecaster.engine.app_classes.tolist()
+    body = json.dumps({"household_id": 1, "horizon": args.horizon,
+                       "history": household_history(appliances)}).encode()
+
+    latencies = []
+    for i in range(args.requests + 5):
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        with urllib.request.urlopen(req) as resp:
+            result = json.loads(resp.read())
+        if i >= 5:  # warm-up
+            latencies.append((time.perf_counter() - start) * 1000)
+    server.shutdown()
+
+    lat = np.array(latencies)
+    print(f"📐 {len(appliances)} appliances × {args.horizon}h = "
+          f"{result['forecastsGenerated']} forecasts per request, {args.requests} requests")
+    print(f"  p50 : {np.percentile(lat, 50):8.2f} ms")
+    print(f"  p99 : {np.percentile(lat, 99):8.2f} ms")
+    print(f"  max : {lat.max():8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
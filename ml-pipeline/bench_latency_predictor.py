@@ -0,0 +1,111 @@
+# -----------------------------
+# ⏱️ Benchmark - single-row what-if latency: forecast_energy vs. ForecastEngine vs. LatencyPredictor
+# -----------------------------
+# Times one call at a time (p50 / p99 per call) on random what-if rows:
+#   legacy      the original forecast_energy (DataFrame, scaler, XGBRegressor, inverse scale)
+#   engine      ForecastEngine.predict with one row
+#   latency     LatencyPredictor.predict_one (scalers folded into the booster)
+#   exported    the same, reloaded from its portable export (model.json + latency.json)
+#   compiled    the export built as C (model.so, skipped without a C compiler)
+#   trees only  booster.inplace_predict on a ready, scaled row - XGBoost's floor
+# and checks every path against forecast_energy; exits with status 1 when any
+# differs by more than --tolerance kWh.
+# Usage: python bench_latency_predictor.py [--models models] [--calls 2000]
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_forecast_engine import legacy_forecast_energy
+from forecast_engine import ForecastEngine, load_artifacts, require_artifacts
+from latency_predictor import LatencyPredictor
+
+
+def random_rows(engine, n, rng):
+    return list(zip(
+        engine.app_classes[rng.integers(0, len(engine.app_classes), n)].tolist(),
+        np.round(rng.uniform(-5, 35, n), 1).tolist(),
+        engine.season_classes[rng.integers(0, len(engine.season_classes), n)].tolist(),
+        rng.choice(np.flatnonzero(~np.isnan(engine.house_f)), n).tolist(),
+        rng.integers(0, 24, n).tolist(),
+        rng.integers(0, 7, n).tolist(),
+        rng.integers(1, 13, n).tolist(),
+        engine.usage_classes[rng.integers(0, len(engine.usage_classes), n)].tolist(),
+    ))
+
+
+def time_calls(fn, rows):
+    """(predictions, per-call seconds) calling fn(*row) once per row."""
+    out, times = np.empty(len(rows)), np.empty(len(rows))
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        out[i] = fn(*row)
+        times[i] = time.perf_counter() - start
+    return out, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-row forecast latency and parity")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="max |Δ| vs forecast_energy, kWh")
+    args = parser.parse_args()
+
+    require_artifacts(args.models)  # forecast_energy, the reference, runs on the pickle set
+    artifacts = load_artifacts(args.models)
+    engine = ForecastEngine(**{("model" if k == "xgboost_model" else k): v
+                               for k, v in artifacts.items()})
+    predictor = LatencyPredictor.from_engine(engine)
+    compiled = None
+    with tempfile.TemporaryDirectory() as tmp:
+        exported = LatencyPredictor.load_export(predictor.export(tmp))
+        try:
+            start = time.perf_counter()
+            compiled = LatencyPredictor.load_export(predictor.export(tmp, compile=True))
+            print(f"🛠️ Trees compiled to C in {time.perf_counter() - start:.1f}s")
+        except RuntimeError as e:
+            print(f"⚠️ {e}")
+    rows = random_rows(engine, args.calls, np.random.default_rng(0))
+
+    # trees only: the same rows, already built, scaled and in float32
+    X = ((engine.build_features(*map(np.array, zip(*rows))) - engine.x_mean) / engine.x_scale).astype(np.float32)
+    booster = predictor.booster
+    paths = {
+        "legacy": lambda *row: legacy_forecast_energy(artifacts, *row),
+        "engine": lambda *row: engine.predict(*row)[0],
+        "latency": predictor.predict_one,
+        "exported": exported.predict_one,
+        **({"compiled": compiled.predict_one} if compiled else {}),
+    }
+    for fn in paths.values():  # warm up
+        fn(*rows[0])
+
+    results = {name: time_calls(fn, rows) for name, fn in paths.items()}
+    results["trees only"] = time_calls(
+        lambda i: booster.inplace_predict(X[i:i + 1], validate_features=False)[0],
+        [(i,) for i in range(len(rows))])
+
+    legacy = results["legacy"][0]
+    print(f"📐 {args.calls} single-row calls")
+    print(f"  {'path':<11} {'p50 µs':>9} {'p99 µs':>9} {'calls/s':>10} {'max |Δ| kWh':>12}")
+    failed = []
+    for name, (pred, times) in results.items():
+        diff = np.abs(pred - legacy).max()
+        if diff > args.tolerance:
+            failed.append(name)
+        print(f"  {name:<11} {np.median(times) * 1e6:>9.1f} {np.percentile(times, 99) * 1e6:>9.1f} "
+              f"{1 / times.mean():>10,.0f} {diff:>12.2e}")
+    for name in ["latency", "compiled"]:
+        if name in results:
+            speedup = np.median(results["legacy"][1]) / np.median(results[name][1])
+            print(f"  {name} is {speedup:.0f}x faster than forecast_energy per call (p50)")
+    if failed:
+        print(f"❌ Parity above {args.tolerance} kWh: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"✅ Every path within {args.tolerance} kWh of forecast_energy")
+
+
+if __name__ == "__main__":
+    main()
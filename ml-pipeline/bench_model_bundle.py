@@ -0,0 +1,74 @@
+# -----------------------------
+# ⏱️ Benchmark - model bundle vs. loose pickle set startup
+# -----------------------------
+# Starts a fresh interpreter per run and times (a) the imports plus loading a
+# ready ForecastEngine and (b) the load alone, once from the pickle set and
+# once from the latest bundle, then checks both engines predict the same.
+# Needs both formats in --models (train_xgboost.py --legacy-pickles).
+# Usage: python bench_model_bundle.py [--models models] [--runs 10]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from forecast_engine import require_artifacts
+
+CHILD = {
+    "pickles": """
+from forecast_engine import ForecastEngine, load_artifacts
+start = time.perf_counter()
+a = load_artifacts(models)
+engine = ForecastEngine(a.pop("xgboost_model"), **a)
+""",
+    "bundle": """
+from model_bundle import load_bundle
+start = time.perf_counter()
+engine = load_bundle(models)["engine"]
+""",
+}
+
+PROBE = """
+pred = engine.predict(engine.app_classes, 20.0, engine.season_classes[0], 3, 18, 2, 1,
+                      engine.usage_classes[0], lag_1=1.2, rolling_3=1.1)
+"""
+
+
+def run_child(fmt, models):
+    code = ("import json, sys, time\nt0 = time.perf_counter()\n"
+            f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\nmodels = sys.argv[1]\n"
+            + CHILD[fmt]
+            + "load_s = time.perf_counter() - start\ntotal_s = time.perf_counter() - t0\n"
+            + PROBE
+            + "print(json.dumps({'load_s': load_s, 'total_s': total_s, 'pred': pred.tolist()}))")
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code, models], check=True,
+                         capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model bundle vs. pickle startup benchmark")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    require_artifacts(args.models)
+    results = {fmt: [run_child(fmt, args.models) for _ in range(args.runs)] for fmt in CHILD}
+
+    diff = np.abs(np.array(results["bundle"][0]["pred"]) - np.array(results["pickles"][0]["pred"]))
+    print(f"📐 {args.runs} fresh processes per format, models in {args.models}/")
+    print(f"\n{'format':<9} {'load (median)':>14} {'imports+load':>13} {'process':>9}")
+    for fmt, runs in results.items():
+        med = {k: np.median([r[k] for r in runs]) * 1000 for k in ["load_s", "total_s", "process_s"]}
+        print(f"{fmt:<9} {med['load_s']:>12.1f}ms {med['total_s']:>11.1f}ms {med['process_s']:>7.0f}ms")
+    print(f"\n  max |bundle - pickles| prediction difference: {diff.max():.2e} kWh")
+
+
+if __name__ == "__main__":
+    main()
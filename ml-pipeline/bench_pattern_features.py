@@ -0,0 +1,131 @@
+# -----------------------------
+# ⏱️ Benchmark - pattern features: eager pandas vs. the Arrow Acero engine
+# -----------------------------
+# Generates an N-row synthetic CSV (generate_dataset.py), builds its feature
+# cache once, then runs build_pattern_features with each engine in its own
+# process, exactly as train_xgboost.py calls it after loading. Each run is
+# measured with StageRecorder (wall time, peak RSS within the step) and its six
+# columns and lookup tables are handed back for the equivalence check: same
+# keys in the same order, same NaNs, and values equal within --rtol (float32
+# inputs with --compact are summed in float64 by Arrow, hence a looser default).
+# Exits with status 1 when the engines disagree.
+#
+# Usage: python bench_pattern_features.py [--rows 1000000] [--compact] [--repeat 3]
+import argparse
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from features import load_features
+from generate_dataset import generate
+from instrument import StageRecorder
+from pattern_features import FEATURE_ENGINES, LOOKUP_NAMES, PATTERN_COLUMNS, build_pattern_features
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def worker(args):
+    """One engine, --repeat times; writes columns + lookups (pickle) and the stage report."""
+    df = load_features(args.csv, cache_dir=args.cache_dir, compact=args.compact)
+    run = StageRecorder(f"pattern_features.{args.worker}", report=args.report)
+    for i in range(args.repeat):
+        frame = df.copy(deep=False)
+        run.stage(f"run{i + 1}", rows=len(frame))
+        frame, lookups = build_pattern_features(frame, engine=args.worker)
+    run.done()
+    with open(args.out, "wb") as f:
+        pickle.dump({"columns": {c: np.asarray(frame[c], dtype=np.float64) for c in PATTERN_COLUMNS},
+                     "lookups": lookups}, f)
+
+
+def run_engine(engine, csv, cache_dir, workdir, args):
+    out, report = os.path.join(workdir, f"{engine}.pkl"), os.path.join(workdir, f"{engine}.json")
+    command = [sys.executable, os.path.join(HERE, "bench_pattern_features.py"), "--worker", engine,
+               "--csv", csv, "--cache-dir", cache_dir, "--out", out, "--report", report,
+               "--repeat", str(args.repeat), *(["--compact"] if args.compact else [])]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    with open(out, "rb") as f, open(report) as r:
+        return pickle.load(f), json.load(r)["stages"]
+
+
+def compare(a, b, rtol):
+    """List of mismatches between two engines' outputs (empty when equivalent)."""
+    problems = []
+    for column in PATTERN_COLUMNS:
+        x, y = a["columns"][column], b["columns"][column]
+        if not np.array_equal(np.isnan(x), np.isnan(y)):
+            problems.append(f"{column}: NaN positions differ")
+        elif not np.allclose(x, y, rtol=rtol, atol=0, equal_nan=True):
+            problems.append(f"{column}: max |Δ| {np.nanmax(np.abs(x - y)):.2e}")
+    for name in LOOKUP_NAMES:
+        x, y = a["lookups"][name], b["lookups"][name]
+        if list(x) != list(y):
+            problems.append(f"{name}: keys differ ({list(x)} vs {list(y)})")
+        elif not np.allclose(list(x.values()), list(y.values()), rtol=rtol, atol=0, equal_nan=True):
+            problems.append(f"{name}: values differ")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pattern features: pandas vs. Arrow Acero")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--compact", action="store_true", help="benchmark on the --compact feature cache")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rtol", type=float, default=None,
+                        help="relative tolerance (default 1e-9, or 1e-5 with --compact)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="keep the generated data here (default: temp dir)")
+    # worker mode (one engine per process)
+    parser.add_argument("--worker", choices=FEATURE_ENGINES, help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    parser.add_argument("--report", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+
+    rtol = args.rtol if args.rtol is not None else (1e-5 if args.compact else 1e-9)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-pattern-")
+    os.makedirs(workdir, exist_ok=True)
+    csv, cache_dir = os.path.join(workdir, "readings.csv"), os.path.join(workdir, "cache")
+    try:
+        print(f"📐 {args.rows:,} synthetic rows in {workdir}")
+        generate(csv, rows=args.rows, seed=args.seed)
+        load_features(csv, cache_dir=cache_dir, compact=args.compact)
+
+        results = {engine: run_engine(engine, csv, cache_dir, workdir, args) for engine in FEATURE_ENGINES}
+
+        print(f"\n  {'engine':<8} {'best s':>8} {'rows/s':>12} {'step MB':>9} {'peak MB':>9}")
+        summary = {}
+        for engine, (_, stages) in results.items():
+            best = min(stages, key=lambda s: s["wall_s"])
+            first = stages[0]
+            step_mb = first["peak_rss_mb"] - first["rss_start_mb"]
+            summary[engine] = (best["wall_s"], step_mb)
+            print(f"  {engine:<8} {best['wall_s']:>8.3f} {args.rows / best['wall_s']:>12,.0f} "
+                  f"{step_mb:>9.0f} {first['peak_rss_mb']:>9.0f}")
+        (pandas_s, pandas_mb), (arrow_s, arrow_mb) = summary["pandas"], summary["arrow"]
+        print(f"  speedup {pandas_s / arrow_s:.1f}x, working memory {arrow_mb:.0f} MB vs {pandas_mb:.0f} MB"
+              f" (step MB = peak RSS above the RSS at the start of the step)")
+
+        problems = compare(results["pandas"][0], results["arrow"][0], rtol)
+        if problems:
+            print(f"\n❌ Engines disagree (rtol {rtol:g}):")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\n✅ Identical feature columns and lookup tables (rtol {rtol:g})")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
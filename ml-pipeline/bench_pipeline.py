@@ -0,0 +1,172 @@
+# -----------------------------
+# ⏱️ Benchmark Suite - every ml-pipeline stage on synthetic data of growing size
+# -----------------------------
+# For each --sizes N, a fresh working directory gets an N-row synthetic Kaggle
+# CSV (generate_dataset.py) and then runs the stages in pipeline order, each
+# as its own process exactly as documented in the README:
+#   generate -> preprocess -> kmeans -> xgboost -> populate (only with --dsn)
+# Later stages reuse what earlier ones left behind (feature cache, K-Means), as
+# in a real retrain. Per stage it records wall time, peak RSS (largest process
+# in the stage's process tree) and throughput in input rows/s, appending one
+# JSON line per stage to --results. Every run is compared with the previous
+# run on this host (or --baseline LABEL) for the same stage, size and flags;
+# anything slower or bigger by more than --tolerance is reported as a
+# regression and the exit status is 1.
+#
+# Usage: python bench_pipeline.py [--sizes 10000 100000 1000000] [--dsn "host=..."]
+#                                 [--stages preprocess kmeans] [--label before-change]
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = "models/bench_pipeline.jsonl"
+STAGES = ["generate", "preprocess", "kmeans", "xgboost", "populate"]
+TOLERANCE = 0.15
+
+
+def stage_command(stage, rows, args):
+    """Script and arguments for `stage`, or None when it cannot run with these options."""
+    ingest = ["--compact"] if args.compact else []
+    commands = {
+        "generate": ["generate_dataset.py", "--rows", str(rows), "--seed", str(args.seed)],
+        "preprocess": ["preprocess_data.py", *ingest],
+        "kmeans": ["train_kmeans.py", *ingest, *(["--large"] if args.large else [])],
+        "xgboost": ["train_xgboost.py", *ingest, "--n-trials", str(args.n_trials),
+                    "--folds", str(args.folds)],
+        "populate": ["populate_database.py", "--dsn", args.dsn] if args.dsn else None,
+    }
+    return commands[stage]
+
+
+def run_stage(command, cwd, log_path):
+    """Run one stage script; returns (exit code, wall seconds, peak RSS MB of its process tree)."""
+    script, *script_args = command
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(HERE, script), *script_args],
+                                cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the child's usage including the descendants it waited for
+        _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return proc.returncode, wall, usage.ru_maxrss * scale / 1e6
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_baseline(history, record, label=None):
+    """Latest earlier successful record for the same host, stage, size and flags."""
+    for old in reversed(history):
+        if (old["host"] == record["host"] and old["stage"] == record["stage"]
+                and old["rows"] == record["rows"] and old["command"] == record["command"]
+                and old["returncode"] == 0 and (label is None or old["label"] == label)):
+            return old
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every ml-pipeline stage on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+                        help="stages to record (earlier stages they depend on still run)")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--label", default=None, help="name for this run (default: git revision)")
+    parser.add_argument("--baseline", default=None, help="compare against the run with this label")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="relative slowdown / memory growth reported as a regression")
+    parser.add_argument("--workdir", default=None, help="keep the per-size working directories here")
+    parser.add_argument("--dsn", default=None, help="libpq connection string; enables the populate stage")
+    parser.add_argument("--compact", action="store_true", help="pass --compact to the pipeline scripts")
+    parser.add_argument("--large", action="store_true", help="pass --large to train_kmeans.py")
+    parser.add_argument("--n-trials", type=int, default=5)
+    parser.add_argument("--folds", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    history = load_results(args.results)
+    run = {
+        "run_id": time.strftime("%Y%m%d-%H%M%S"),
+        "label": args.label or git_revision(),
+        "revision": git_revision(),
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    last = STAGES.index(max(args.stages, key=STAGES.index))
+    root = args.workdir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+
+    records, regressions = [], []
+    try:
+        for rows in args.sizes:
+            cwd = os.path.join(root, f"rows_{rows}")
+            shutil.rmtree(cwd, ignore_errors=True)
+            os.makedirs(os.path.join(cwd, "models"))
+            print(f"\n📦 {rows} rows in {cwd}")
+
+            for stage in STAGES[:last + 1]:
+                command = stage_command(stage, rows, args)
+                if command is None:
+                    print(f"  ⏭️ {stage}: skipped (needs --dsn)")
+                    continue
+                code, wall, rss = run_stage(command, cwd, os.path.join(cwd, f"{stage}.log"))
+                record = {**run, "stage": stage, "rows": rows, "command": " ".join(command),
+                          "returncode": code, "wall_s": round(wall, 3), "peak_rss_mb": round(rss, 1),
+                          "rows_per_s": round(rows / wall, 1)}
+                status = "✅" if code == 0 else f"❌ exit {code}, see {stage}.log"
+                print(f"  {stage:<11} {wall:>9.2f}s {rss:>9.0f} MB {rows / wall:>12,.0f} rows/s  {status}")
+                if stage in args.stages:
+                    records.append(record)
+                    with open(args.results, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+                if code != 0:
+                    break
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n📝 {len(records)} results appended to {args.results} (label {run['label']})")
+    print(f"\n{'stage':<11} {'rows':>10} {'wall s':>9} {'base s':>9} {'peak MB':>9} {'base MB':>9}")
+    for record in records:
+        base = find_baseline(history, record, args.baseline)
+        if base is None:
+            print(f"{record['stage']:<11} {record['rows']:>10} {record['wall_s']:>9.2f} {'-':>9} "
+                  f"{record['peak_rss_mb']:>9.0f} {'-':>9}")
+            continue
+        slower = record["wall_s"] > base["wall_s"] * (1 + args.tolerance)
+        bigger = record["peak_rss_mb"] > base["peak_rss_mb"] * (1 + args.tolerance)
+        flag = "  ⚠️ regression" if slower or bigger else ""
+        print(f"{record['stage']:<11} {record['rows']:>10} {record['wall_s']:>9.2f} {base['wall_s']:>9.2f} "
+              f"{record['peak_rss_mb']:>9.0f} {base['peak_rss_mb']:>9.0f}{flag}")
+        if flag:
+            regressions.append(record)
+    failed = [r for r in records if r["returncode"] != 0]
+    if regressions or failed:
+        print(f"\n⚠️ {len(regressions)} regression(s) beyond {args.tolerance:.0%}, {len(failed)} failed stage(s)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
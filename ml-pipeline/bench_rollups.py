@@ -0,0 +1,171 @@
+# -----------------------------
+# ⏱️ Benchmark - dashboard queries on the rollups vs on raw readings
+# -----------------------------
+# Tiles models/data_with_predictions.csv up to each requested size, loads it
+# with bulk_load.bulk_load() (which folds the rollups as it inserts), checks
+# the folded rollups equal a recompute from energy_consumption, then times each
+# dashboard query as backend/routes used to run it (GROUP BY over the readings
+# plus a MAX(timestamp) subquery) and as it runs now (on energy_hourly,
+# energy_daily or energy_hour_profile). Median of --runs executions after one warm-up each.
+# Usage: python bench_rollups.py [--dsn "host=localhost dbname=IEOMS ..."]
+#                                [--sizes 100000 1000000] [--runs 20]
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+import psycopg2
+
+from bench_bulk_load import TABLES, write_sized_csv
+from bulk_load import CSV_PATH, SOURCE_COLUMNS, bulk_load
+from db_config import DB_CONFIG
+from rollups import ROLLUPS, recompute_sql
+
+# (endpoint, rollup whose newest bucket starts the window, old query on readings,
+# current query on rollups). {bucket} is time_bucket('1 hour', timestamp), or
+# date_trunc on a server without TimescaleDB. As in backend/routes, the newest
+# bucket is fetched first and passed in, and that lookup is part of the timing.
+QUERIES = [
+    ("energy/consumption (24h)", "energy_hourly", """
+        SELECT {bucket} AS hour, appliance_type, AVG(energy_kwh), AVG(cost_usd), usage_label
+        FROM energy_consumption
+        WHERE household_id = 1
+          AND timestamp >= (SELECT MAX(timestamp) - INTERVAL '24 hours' FROM energy_consumption WHERE household_id = 1)
+        GROUP BY hour, appliance_type, usage_label ORDER BY hour DESC""", """
+        SELECT bucket AS hour, appliance_type, total_kwh / reading_count, total_cost / reading_count, usage_label
+        FROM energy_hourly
+        WHERE household_id = 1
+          AND bucket >= %(latest)s::timestamp - INTERVAL '24 hours'
+        ORDER BY hour DESC"""),
+    ("energy/peak-hours", None, """
+        SELECT usage_label, EXTRACT(HOUR FROM timestamp) AS hour, COUNT(*), AVG(energy_kwh)
+        FROM energy_consumption
+        WHERE household_id = 1 AND (usage_label IN ('Peak', 'Off-Peak') OR usage_label LIKE %(normal)s)
+        GROUP BY usage_label, hour ORDER BY usage_label, hour""", """
+        SELECT usage_label, hour, SUM(reading_count), SUM(total_kwh) / SUM(reading_count)
+        FROM energy_hour_profile
+        WHERE household_id = 1 AND (usage_label IN ('Peak', 'Off-Peak') OR usage_label LIKE %(normal)s)
+        GROUP BY usage_label, hour ORDER BY usage_label, hour"""),
+    ("energy/cost-breakdown (30d)", "energy_daily", """
+        SELECT appliance_type, SUM(energy_kwh), SUM(cost_usd) AS total_cost, AVG(energy_kwh), COUNT(*)
+        FROM energy_consumption
+        WHERE household_id = 1
+          AND timestamp >= (SELECT MAX(timestamp) - INTERVAL '30 days' FROM energy_consumption WHERE household_id = 1)
+        GROUP BY appliance_type ORDER BY total_cost DESC""", """
+        SELECT appliance_type, SUM(total_kwh), SUM(total_cost) AS total_cost,
+               SUM(total_kwh) / SUM(reading_count), SUM(reading_count)
+        FROM energy_daily
+        WHERE household_id = 1
+          AND bucket >= %(latest)s::timestamp - INTERVAL '30 days'
+        GROUP BY appliance_type ORDER BY total_cost DESC"""),
+    ("recommendations (7d)", "energy_daily", """
+        SELECT appliance_type, usage_label, AVG(energy_kwh), SUM(cost_usd) AS total_cost
+        FROM energy_consumption
+        WHERE household_id = 1
+          AND timestamp >= (SELECT MAX(timestamp) - INTERVAL '7 days' FROM energy_consumption WHERE household_id = 1)
+        GROUP BY appliance_type, usage_label ORDER BY total_cost DESC""", """
+        SELECT appliance_type, usage_label, SUM(total_kwh) / SUM(reading_count), SUM(total_cost) AS total_cost
+        FROM energy_daily
+        WHERE household_id = 1
+          AND bucket >= %(latest)s::timestamp - INTERVAL '7 days'
+        GROUP BY appliance_type, usage_label ORDER BY total_cost DESC"""),
+]
+
+
+def truncate(connect_kwargs, tables):
+    with psycopg2.connect(**connect_kwargs) as conn, conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY")
+    conn.close()
+
+
+def time_query(cursor, sql, runs, latest_table=None):
+    """Median wall time in ms (one warm-up run first) and the rows returned."""
+    def run():
+        params = {"normal": "Normal%"}  # every 'Normal N' band once k > 3, as energy.js matches them
+        if latest_table:
+            cursor.execute(f"SELECT MAX(bucket) FROM {latest_table} WHERE household_id = 1")
+            params["latest"] = cursor.fetchone()[0]
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    rows = run()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), rows
+
+def rollup_mismatches(cursor):
+    """Rows that differ between each folded rollup and a recompute from the readings."""
+    mismatches = {}
+    for table, (key, _, _) in ROLLUPS.items():
+        recompute, params = recompute_sql(table)
+        columns = f"household_id, {key}, appliance_type, usage_label, reading_count, total_kwh, total_cost"
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM (
+                (SELECT {columns} FROM {table} EXCEPT {recompute})
+                UNION ALL
+                ({recompute} EXCEPT SELECT {columns} FROM {table})
+            ) diff""", params)
+        mismatches[table] = cursor.fetchone()[0]
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard query latency, rollups vs raw readings")
+    parser.add_argument("--dsn", default=None, help="libpq connection string (default: db_config)")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    connect_kwargs = {"dsn": args.dsn} if args.dsn else DB_CONFIG
+    source = pd.read_csv(args.csv, usecols=SOURCE_COLUMNS)
+    tables = TABLES
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            path = os.path.join(tmp, f"data_{rows}.csv")
+            write_sized_csv(source, rows, path)
+            truncate(connect_kwargs, tables)
+
+            start = time.perf_counter()
+            bulk_load(connect_kwargs, path)
+            load_s = time.perf_counter() - start
+            os.remove(path)
+
+            conn = psycopg2.connect(**connect_kwargs)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("ANALYZE")
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')")
+                bucket = ("time_bucket('1 hour', timestamp)" if cursor.fetchone()[0]
+                          else "date_trunc('hour', timestamp)")
+                sizes = {}
+                for table in ["energy_consumption"] + list(ROLLUPS):
+                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                    sizes[table] = cursor.fetchone()[0]
+                mismatches = rollup_mismatches(cursor)
+                print(f"\n📦 {rows} readings loaded in {load_s:.1f}s - "
+                      + ", ".join(f"{t}: {n} rows" for t, n in sizes.items()))
+                print("   rollup rows differing from a recompute: "
+                      + ", ".join(f"{t}: {n}" for t, n in mismatches.items()))
+                for name, latest_table, raw_sql, rollup_sql in QUERIES:
+                    raw_ms, raw_rows = time_query(cursor, raw_sql.format(bucket=bucket), args.runs)
+                    rollup_ms, rollup_rows = time_query(cursor, rollup_sql, args.runs, latest_table)
+                    results.append((rows, name, raw_ms, rollup_ms, len(raw_rows), len(rollup_rows)))
+            conn.close()
+    truncate(connect_kwargs, tables)
+
+    print(f"\n{'readings':>10} {'query':<28} {'raw ms':>9} {'rollup ms':>10} {'speedup':>8} {'rows':>11}")
+    for rows, name, raw_ms, rollup_ms, raw_n, rollup_n in results:
+        print(f"{rows:>10} {name:<28} {raw_ms:>9.2f} {rollup_ms:>10.2f} {raw_ms / rollup_ms:>7.1f}x "
+              f"{raw_n:>5}/{rollup_n:<5}")
+    print("(rows = raw/rollup result rows; windowed rollup queries start on a bucket boundary)")
+
+
+if __name__ == "__main__":
+    main()
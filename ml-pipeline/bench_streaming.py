@@ -0,0 +1,158 @@
+# -----------------------------
+# ⏱️ Benchmark - streaming inference throughput (readings/s) and parity
+# -----------------------------
+# Replays the readings of a CSV in time order, one at a time, through:
+#   pandas      the per-series history kept as a list and shift/rolling recomputed
+#               over all of it for every reading (features only, first
+#               --baseline-readings readings, because it slows down as history grows)
+#   state       SeriesState ring buffers only (features, no prediction)
+#   stream      StreamingPredictor.run: state, K-Means distances, LatencyPredictor
+#   async       the same through arun() over an async generator
+#   compiled    stream with the trees compiled to C (skipped without a C compiler)
+# Parity checks cover two things. The online features must match pandas
+# shift/rolling over the full history for every reading. The streamed forecasts
+# must match one batched ForecastEngine call that uses RecursiveForecaster's
+# cluster features. Exits with status 1 when either differs by more than --tolerance.
+#
+# Usage: python bench_streaming.py [--csv smart_home_energy_consumption_large.csv] [--readings N]
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import LAGS, RAW_CSV, ROLLING_WINDOWS, load_features
+from forecast_engine import HISTORY_FEATURES
+from recursive_forecast import RecursiveForecaster
+from streaming import HOUR, SeriesState, StreamingPredictor, readings_from_frame
+
+LAG_FEATURES = [f"lag_{n}" for n in LAGS] + [f"rolling_{w}" for w in ROLLING_WINDOWS]
+
+
+def pandas_features(history):
+    """Next-reading features of one series, recomputed from its whole history."""
+    energy = pd.Series(history)
+    row = {f"lag_{n}": energy.shift(n - 1).iloc[-1] for n in LAGS}
+    row.update({f"rolling_{w}": energy.rolling(w, min_periods=1).mean().iloc[-1] for w in ROLLING_WINDOWS})
+    return row
+
+
+def replay_pandas(readings):
+    series = {}
+    for r in readings:
+        history = series.setdefault((r.household_id, r.appliance), [])
+        history.append(r.energy)
+        pandas_features(history)
+
+
+def replay_state(readings):
+    """Online features after every reading, as an (n, len(LAG_FEATURES)) array."""
+    series, out = {}, np.empty((len(readings), len(LAG_FEATURES)))
+    for i, r in enumerate(readings):
+        state = series.get((r.household_id, r.appliance))
+        if state is None:
+            state = series[(r.household_id, r.appliance)] = SeriesState()
+        state.push(r.energy)
+        features = state.features()
+        out[i] = [features[name] for name in LAG_FEATURES]
+    return out
+
+
+def reference_features(frame):
+    """The same features for every reading in one vectorized pandas pass."""
+    grouped = frame.groupby(["household_id", "appliance"], sort=False)["energy"]
+    out = pd.DataFrame({f"lag_{n}": grouped.shift(n - 1) for n in LAGS})
+    for w in ROLLING_WINDOWS:
+        out[f"rolling_{w}"] = grouped.rolling(w, min_periods=1).mean().reset_index(level=[0, 1], drop=True)
+    return out[LAG_FEATURES], grouped.cumcount().to_numpy() + 1
+
+
+def reference_forecasts(forecaster, frame, features, ready):
+    """Batched ForecastEngine forecasts for the readings that produce one."""
+    frame, features = frame[ready], features[ready]
+    target = frame["timestamp"].dt.floor("h") + HOUR
+    hour, weekday = target.dt.hour.to_numpy(), target.dt.dayofweek.to_numpy()
+    cluster, usage_label = forecaster.cluster_features(hour, weekday, features["lag_1"].to_numpy())
+    history = {name: features[name].to_numpy() for name in LAG_FEATURES if name in HISTORY_FEATURES}
+    return forecaster.engine.predict(
+        frame["appliance"].to_numpy(), frame["temp"].to_numpy(), frame["season"].to_numpy(),
+        frame["house"].to_numpy(), hour, weekday, target.dt.month.to_numpy(), usage_label,
+        **history, **cluster)
+
+
+def timed(fn, n):
+    start = time.perf_counter()
+    result = fn()
+    return result, n / (time.perf_counter() - start)
+
+
+async def _feed(readings):
+    for r in readings:
+        yield r
+
+
+async def _collect(streaming, readings):
+    return [f async for f in streaming.arun(_feed(readings))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming inference throughput and parity")
+    parser.add_argument("--csv", default=RAW_CSV)
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--readings", type=int, default=None, help="replay only the first N readings")
+    parser.add_argument("--baseline-readings", type=int, default=2000)
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="max |Δ| for features and kWh")
+    args = parser.parse_args()
+
+    readings = list(readings_from_frame(load_features(args.csv)))[:args.readings]
+    frame = pd.DataFrame(readings)
+    n = len(readings)
+    print(f"📐 {n:,} readings, {frame.groupby(['household_id', 'appliance']).ngroups:,} series")
+
+    streaming = StreamingPredictor.load(args.models)
+    forecaster = RecursiveForecaster.load(args.models)
+
+    baseline = readings[:args.baseline_readings]
+    rates = {"pandas": timed(lambda: replay_pandas(baseline), len(baseline))[1]}
+    online, rates["state"] = timed(lambda: replay_state(readings), n)
+    forecasts, rates["stream"] = timed(lambda: list(streaming.run(readings)), n)
+    fresh = StreamingPredictor.load(args.models)
+    async_forecasts, rates["async"] = timed(lambda: asyncio.run(_collect(fresh, readings)), n)
+    outputs = {"stream": forecasts, "async": async_forecasts}
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            compiled = StreamingPredictor.load(args.models, export=streaming.predictor.export(tmp, compile=True))
+            outputs["compiled"], rates["compiled"] = timed(lambda: list(compiled.run(readings)), n)
+        except RuntimeError as e:
+            print(f"⚠️ {e}")
+
+    features, count = reference_features(frame)
+    feature_diff = np.nanmax(np.abs(online - features.to_numpy()))
+    nan_match = np.array_equal(np.isnan(online), features.isna().to_numpy())
+    expected = reference_forecasts(forecaster, frame, features, count >= max(LAGS))
+
+    print(f"  {'path':<9} {'readings/s':>12} {'µs/reading':>11} {'max |Δ| kWh':>12}")
+    failed = [] if nan_match and feature_diff <= args.tolerance else ["features"]
+    for name, rate in rates.items():
+        diff = ""
+        if name in outputs:
+            pred = np.array([f.predicted_energy_kwh for f in outputs[name]])
+            worst = np.abs(pred - expected).max() if len(pred) == len(expected) else np.inf
+            failed += [name] if worst > args.tolerance else []
+            diff = f"{worst:.2e}"
+        print(f"  {name:<9} {rate:>12,.0f} {1e6 / rate:>11.1f} {diff:>12}")
+    print(f"  online features vs pandas shift/rolling: max |Δ| {feature_diff:.2e}"
+          f"{'' if nan_match else ', NaN positions differ'}")
+    print(f"  state is {rates['state'] / rates['pandas']:.0f}x faster than recomputing with pandas "
+          f"(over the first {len(baseline):,} readings)")
+    if failed:
+        print(f"❌ Parity above {args.tolerance}: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"✅ {len(expected):,} streamed forecasts within {args.tolerance} kWh of the batched engine")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -----------------------------
+# ⏱️ Benchmark - dense vs quantized vs external-memory XGBoost training
+# -----------------------------
+# Fits the same parameter sets on the same split with each training matrix
+# mode (see xgb_data.py), each mode in its own process, and reports that
+# process's peak RSS and per-trial fit time. Uses the arrays train_xgboost.py
+# hands to its tuning workers (the latest study under models/cache/tuning); --repeat tiles the
+# training rows to emulate a larger dataset.
+# Usage: python bench_xgb_training.py [--trials 3] [--repeat 4]
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+from xgboost import XGBRegressor
+
+from tuning import TUNING_DATA_DIR, latest_tuning_data, load_tuning_data
+from xgb_data import MATRIX_MODES, CHUNK_DIR, build_matrices, fit_booster, write_chunks
+
+TRIAL_PARAMS = [
+    {"n_estimators": 300, "max_depth": 6, "learning_rate": 0.1, "subsample": 0.8,
+     "colsample_bytree": 0.8, "min_child_weight": 3, "gamma": 0.1, "reg_alpha": 0.1, "reg_lambda": 1.0},
+    {"n_estimators": 500, "max_depth": 9, "learning_rate": 0.05, "subsample": 0.9,
+     "colsample_bytree": 0.7, "min_child_weight": 5, "gamma": 0.0, "reg_alpha": 0.5, "reg_lambda": 1.5},
+    {"n_estimators": 400, "max_depth": 12, "learning_rate": 0.08, "subsample": 0.7,
+     "colsample_bytree": 0.9, "min_child_weight": 1, "gamma": 0.5, "reg_alpha": 0.0, "reg_lambda": 0.5},
+]
+
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+def run_mode(mode, data_dir, trials, repeat):
+    """Child process: build the matrix for `mode`, fit `trials` parameter sets, print JSON."""
+    data = load_tuning_data(data_dir)
+    y_mean, y_scale = data["y_scaling"]
+    X_valid = np.asarray(data["X_valid"])
+    y_valid_scaled = (np.asarray(data["y_valid"]) - y_mean) / y_scale
+
+    start = time.perf_counter()
+    matrices = None
+    if mode == "external":
+        matrices = build_matrices(mode, X_valid=X_valid, y_valid_scaled=y_valid_scaled)
+    else:
+        X_train = np.tile(np.asarray(data["X_train"]), (repeat, 1))
+        y_train = np.tile(np.asarray(data["y_train"]), repeat)
+        if mode == "quantized":
+            matrices = build_matrices(mode, X_train, y_train, X_valid, y_valid_scaled)
+            del X_train, y_train  # the quantized matrix keeps its own bin indices
+    build = time.perf_counter() - start
+
+    fits = []
+    for params in TRIAL_PARAMS[:trials]:
+        start = time.perf_counter()
+        if matrices is None:
+            XGBRegressor(**params, random_state=42, n_jobs=-1).fit(X_train, y_train)
+        else:
+            fit_booster(params, matrices[0])
+        fits.append(time.perf_counter() - start)
+
+    print(json.dumps({"mode": mode, "build_s": build, "fits_s": fits, "peak_rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XGBoost training matrix benchmark")
+    parser.add_argument("--data", help="arrays saved by tuning.save_tuning_data "
+                                           "(default: the most recently tuned study)")
+    parser.add_argument("--trials", type=int, default=3, choices=range(1, len(TRIAL_PARAMS) + 1))
+    parser.add_argument("--repeat", type=int, default=1, help="tile the training rows N times")
+    parser.add_argument("--mode", choices=MATRIX_MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.data, args.trials, args.repeat)
+        return
+
+    args.data = args.data or latest_tuning_data() or TUNING_DATA_DIR
+    try:
+        data = load_tuning_data(args.data)
+    except FileNotFoundError:
+        raise SystemExit(f"❌ No tuning arrays in {args.data} - run "
+                         "train_xgboost.py --workers 2 first")
+    X_train = np.tile(np.asarray(data["X_train"]), (args.repeat, 1))
+    y_train = np.tile(np.asarray(data["y_train"]), args.repeat)
+    n_chunks = write_chunks(X_train, y_train)
+    print(f"📐 {len(X_train)} training rows × {X_train.shape[1]} features "
+          f"({n_chunks} chunks in {CHUNK_DIR}), {args.trials} trials per mode")
+    del X_train, y_train
+
+    results = []
+    for mode in MATRIX_MODES:
+        out = subprocess.run([sys.executable, __file__, "--mode", mode, "--data", args.data,
+                              "--trials", str(args.trials), "--repeat", str(args.repeat)],
+                             check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"\n{'mode':<10} {'peak RSS':>10} {'build':>8} {'fit/trial':>10}  per-trial fits")
+    for r in results:
+        fits = ", ".join(f"{f:.2f}" for f in r["fits_s"])
+        print(f"{r['mode']:<10} {r['peak_rss_mb']:>8.0f}MB {r['build_s']:>7.2f}s "
+              f"{np.mean(r['fits_s']):>9.2f}s  [{fits}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+# -----------------------------
+# 🚚 Bulk Loader - COPY-based, concurrent, bounded-memory, idempotent
+# -----------------------------
+# Streams models/data_with_predictions.csv into PostgreSQL without building a
+# Python tuple per row:
+#   - the CSV is read in chunks of the needed columns only
+#   - every Home ID becomes its own household (seeded into households first);
+#     sources without one load as the demo household
+#   - each chunk is rendered to CSV text column-wise by pandas and queued
+#   - energy_consumption and energy_forecasts each drain their queue through
+#     one COPY ... FROM STDIN into a temp staging table on their own pooled
+#     connection, concurrently
+#   - forecasts carry the outermost quantile columns (predicted_q10_kwh /
+#     predicted_q90_kwh, train_xgboost.py --quantiles) as their interval, and
+#     confidence_score is that interval's test-split coverage from the latest
+#     bundle (quantiles.interval_confidence); point-only forecasts store NULL
+#   - the staged rows are merged on natural keys: readings are inserted once
+#     per (household_id, timestamp, appliance_type), forecasts are upserted per
+#     (household_id, forecast_timestamp, appliance_type, model_version), and
+#     usage_patterns and the hourly/daily rollups (rollups.py) are folded
+#     forward from the readings actually inserted. Source rows that repeat a
+#     natural key are counted and reported, not silently dropped
+# Queues are bounded, so memory stays at a few chunks whatever the file size.
+# Each table is loaded in a single transaction, which also advances its row in
+# load_watermarks. With incremental=True only rows newer than that watermark
+# are shipped and merged, so a nightly load costs what the new data costs.
+# Re-running any load is a no-op.
+import io
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from model_bundle import load_manifest
+from quantiles import interval_columns, interval_confidence
+from rollups import fold_cte
+
+CSV_PATH = "models/data_with_predictions.csv"
+CHUNK_ROWS = 100_000
+QUEUE_CHUNKS = 4
+HOUSEHOLD_ID = 1  # demo household, as seeded by database/schema.sql, for sources without Home ID
+COST_PER_KWH = 0.12
+MODEL_VERSION = "XGBoost_v1"
+ABORT = object()  # queued instead of None when the producer fails, so the COPY fails too
+
+SOURCE_COLUMNS = ["datetime", "Appliance Type", "Energy Consumption (kWh)",
+                  "Outdoor Temperature (°C)", "Season", "usage_label", "hour", "weekday",
+                  "predicted_energy_kwh"]
+HOME_COLUMNS = ["Home ID", "Household Size"]
+
+ENERGY_COLUMNS = ["household_id", "timestamp", "appliance_type", "energy_kwh", "outdoor_temp",
+                  "season", "cost_usd", "usage_label"]
+FORECAST_COLUMNS = ["household_id", "forecast_timestamp", "appliance_type", "predicted_energy_kwh",
+                    "predicted_lower_kwh", "predicted_upper_kwh", "confidence_score", "model_version"]
+
+
+# ============================================================
+# 1. FRAME -> TABLE ROWS (column-wise)
+# ============================================================
+def household_ids(chunk):
+    """Home ID as household_id when the source has one, else the demo household."""
+    return chunk["Home ID"] if "Home ID" in chunk.columns else HOUSEHOLD_ID
+
+
+def energy_rows(chunk):
+    energy = chunk["Energy Consumption (kWh)"]
+    return pd.DataFrame({
+        "household_id": household_ids(chunk),
+        "timestamp": chunk["datetime"],
+        "appliance_type": chunk["Appliance Type"],
+        "energy_kwh": energy,
+        "outdoor_temp": chunk["Outdoor Temperature (°C)"],
+        "season": chunk["Season"],
+        "cost_usd": energy * COST_PER_KWH,
+        "usage_label": chunk["usage_label"],
+    })
+
+
+def forecast_rows(chunk, interval=None, confidence=None):
+    """`interval`: (lower column, upper column, level) from interval_columns(), or None.
+
+    `confidence` is the interval's confidence_score (defaults to its level).
+    """
+    lower, upper, level = interval or (None, None, None)
+    return pd.DataFrame({
+        "household_id": household_ids(chunk),
+        "forecast_timestamp": chunk["datetime"],
+        "appliance_type": chunk["Appliance Type"],
+        "predicted_energy_kwh": chunk["predicted_energy_kwh"],
+        "predicted_lower_kwh": chunk[lower] if lower else None,
+        "predicted_upper_kwh": chunk[upper] if upper else None,
+        "confidence_score": confidence if interval and confidence is not None else level,
+        "model_version": MODEL_VERSION,
+    })
+
+
+def to_csv_text(frame):
+    return frame.to_csv(header=False, index=False, na_rep="")
+
+
+# ============================================================
+# 2. NATURAL-KEY MERGES
+# ============================================================
+# Rows at or before the table's watermark are skipped; %(watermark)s is NULL on
+# a full load. Each merge returns (rows written, newest staged timestamp, a
+# secondary count, staged rows repeating another staged row's natural key).
+ENERGY_MERGE = """
+WITH inserted AS (
+    INSERT INTO energy_consumption ({columns})
+    SELECT {columns} FROM stage
+    WHERE %(watermark)s::timestamp IS NULL OR timestamp > %(watermark)s::timestamp
+    ON CONFLICT (household_id, timestamp, appliance_type) DO NOTHING
+    RETURNING household_id, timestamp, appliance_type, usage_label, energy_kwh, cost_usd
+), patterns AS (
+    INSERT INTO usage_patterns AS p
+        (household_id, hour, weekday, cluster_label, avg_energy_kwh, sample_count)
+    SELECT household_id, EXTRACT(HOUR FROM timestamp), EXTRACT(ISODOW FROM timestamp) - 1,
+           usage_label, AVG(energy_kwh), COUNT(*)
+    FROM inserted
+    WHERE usage_label IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (household_id, hour, weekday, cluster_label) DO UPDATE
+    SET avg_energy_kwh = (p.avg_energy_kwh * p.sample_count
+                          + EXCLUDED.avg_energy_kwh * EXCLUDED.sample_count)
+                         / (p.sample_count + EXCLUDED.sample_count),
+        sample_count = p.sample_count + EXCLUDED.sample_count
+    RETURNING 1
+),
+{rollups}
+SELECT (SELECT COUNT(*) FROM inserted), (SELECT MAX(timestamp) FROM stage),
+       (SELECT COUNT(*) FROM patterns),
+       (SELECT COUNT(*) - COUNT(DISTINCT (household_id, timestamp, appliance_type)) FROM stage)
+""".format(columns=", ".join(ENERGY_COLUMNS), rollups=fold_cte("inserted"))
+
+FORECAST_MERGE = """
+WITH upserted AS (
+    INSERT INTO energy_forecasts ({columns})
+    SELECT DISTINCT ON (household_id, forecast_timestamp, appliance_type, model_version)
+           {columns}
+    FROM stage
+    WHERE %(watermark)s::timestamp IS NULL OR forecast_timestamp > %(watermark)s::timestamp
+    ORDER BY household_id, forecast_timestamp, appliance_type, model_version
+    ON CONFLICT (household_id, forecast_timestamp, appliance_type, model_version) DO UPDATE
+    SET predicted_energy_kwh = EXCLUDED.predicted_energy_kwh,
+        predicted_lower_kwh = EXCLUDED.predicted_lower_kwh,
+        predicted_upper_kwh = EXCLUDED.predicted_upper_kwh,
+        confidence_score = EXCLUDED.confidence_score,
+        created_at = NOW()
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM upserted), (SELECT MAX(forecast_timestamp) FROM stage), 0,
+       (SELECT COUNT(*) - COUNT(DISTINCT (household_id, forecast_timestamp, appliance_type, model_version))
+        FROM stage)
+""".format(columns=", ".join(FORECAST_COLUMNS))
+
+WATERMARK_UPSERT = """
+INSERT INTO load_watermarks (table_name, watermark, rows_loaded)
+VALUES (%s, %s, %s)
+ON CONFLICT (table_name) DO UPDATE
+SET watermark = GREATEST(load_watermarks.watermark, EXCLUDED.watermark),
+    rows_loaded = load_watermarks.rows_loaded + EXCLUDED.rows_loaded,
+    updated_at = NOW()
+"""
+
+
+HOUSEHOLD_SEED = """
+INSERT INTO households (household_id, household_size, home_id) VALUES %s
+ON CONFLICT (household_id) DO UPDATE SET home_id = EXCLUDED.home_id
+"""
+# Ids are inserted explicitly, so move the SERIAL past them
+HOUSEHOLD_SEQUENCE = """
+SELECT setval(pg_get_serial_sequence('households', 'household_id'), MAX(household_id)) FROM households
+"""
+
+
+def seed_households(connect_kwargs, homes):
+    """A households row per Home ID in `homes` ({Home ID: household size}), marked with its home_id.
+
+    Existing rows keep their size and location.
+    """
+    with psycopg2.connect(**connect_kwargs) as conn, conn.cursor() as cursor:
+        execute_values(cursor, HOUSEHOLD_SEED, [(home, size, home) for home, size in sorted(homes.items())])
+        cursor.execute(HOUSEHOLD_SEQUENCE)
+    conn.close()
+
+
+def source_homes(chunks):
+    """{Home ID: household size at its first reading} over chunks of HOME_COLUMNS."""
+    homes = {}
+    for chunk in chunks:
+        first = chunk.drop_duplicates("Home ID")
+        for home, size in zip(first["Home ID"].tolist(), first["Household Size"].tolist()):
+            homes.setdefault(int(home), int(size))
+    return homes
+
+
+def read_watermarks(connect_kwargs):
+    """{table: newest loaded timestamp} from load_watermarks."""
+    with psycopg2.connect(**connect_kwargs) as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT table_name, watermark FROM load_watermarks")
+        watermarks = dict(cursor.fetchall())
+    conn.close()
+    return watermarks
+
+
+# ============================================================
+# 3. COPY STREAMS
+# ============================================================
+class QueueReader(io.TextIOBase):
+    """File-like object over a queue of CSV text blocks (None ends the stream).
+
+    read() hands over one whole block at a time; psycopg2 sends whatever read
+    returns, so blocks are never re-sliced to the requested size. ABORT makes
+    read() raise, which aborts the COPY and rolls its transaction back.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is not None and size >= 0:
+            block = None if self.done else self.blocks.get()
+            self.done = self.done or block is None or block is ABORT
+            if block is ABORT:
+                raise RuntimeError("Source rows failed to load - COPY aborted")
+            return block or ""
+        parts = []
+        while not self.done:
+            parts.append(self.read(1))
+        return "".join(parts)
+
+
+def copy_merge(pool, table, columns, stream, merge_sql, watermark=None):
+    """COPY `stream` into a staging table, merge it into `table` and advance its watermark.
+
+    Returns (rows written, secondary count reported by the merge, duplicate staged rows).
+    """
+    conn = pool.getconn()
+    try:
+        with conn, conn.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE stage ON COMMIT DROP AS "
+                           f"SELECT {', '.join(columns)} FROM {table} WITH NO DATA")
+            cursor.copy_expert(f"COPY stage ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                               stream, size=1 << 16)
+            cursor.execute(merge_sql, {"watermark": watermark})
+            written, newest, extra, duplicates = cursor.fetchone()
+            if newest is not None:
+                cursor.execute(WATERMARK_UPSERT, (table, newest, written))
+            return written, extra, duplicates
+    finally:
+        pool.putconn(conn)
+
+
+def _put(blocks, item, jobs):
+    """Queue `item`, but give up if the COPY draining the queue has failed."""
+    while True:
+        try:
+            blocks.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            for job in jobs:
+                if job.done() and job.exception():
+                    raise job.exception()
+
+
+# ============================================================
+# 4. ENTRY POINT
+# ============================================================
+def bulk_load(connect_kwargs, path=CSV_PATH, chunk_rows=CHUNK_ROWS, frame=None, incremental=False,
+              models_dir="models"):
+    """Load readings, forecasts and usage patterns from `path` (or an in-memory `frame`).
+
+    incremental=True skips rows at or before each table's load watermark.
+    Interval confidence comes from the latest bundle in `models_dir`.
+    Returns {table: rows written}.
+    """
+    if frame is not None:
+        interval = interval_columns(frame.columns)
+        homes = source_homes([frame[HOME_COLUMNS]]) if "Home ID" in frame.columns else None
+        chunks = (frame.iloc[i:i + chunk_rows] for i in range(0, len(frame), chunk_rows))
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        interval = interval_columns(header)
+        has_homes = "Home ID" in header
+        homes = source_homes(pd.read_csv(path, usecols=HOME_COLUMNS, chunksize=chunk_rows)) if has_homes else None
+        usecols = SOURCE_COLUMNS + (list(interval[:2]) if interval else []) + (["Home ID"] if has_homes else [])
+        chunks = pd.read_csv(path, usecols=usecols, chunksize=chunk_rows)
+    if homes:
+        seed_households(connect_kwargs, homes)
+    confidence = None
+    if interval:
+        manifest = load_manifest(models_dir) or {}
+        confidence = interval_confidence(interval[2], manifest.get("metadata"))
+
+    watermarks = read_watermarks(connect_kwargs) if incremental else {}
+    energy_wm = watermarks.get("energy_consumption")
+    forecast_wm = watermarks.get("energy_forecasts")
+
+    pool = ThreadedConnectionPool(1, 2, **connect_kwargs)
+    energy_q = queue.Queue(QUEUE_CHUNKS)
+    forecast_q = queue.Queue(QUEUE_CHUNKS)
+    try:
+        with ThreadPoolExecutor(2) as executor:
+            energy_job = executor.submit(copy_merge, pool, "energy_consumption", ENERGY_COLUMNS,
+                                         QueueReader(energy_q), ENERGY_MERGE, energy_wm)
+            forecast_job = executor.submit(copy_merge, pool, "energy_forecasts", FORECAST_COLUMNS,
+                                           QueueReader(forecast_q), FORECAST_MERGE, forecast_wm)
+            running = [energy_job, forecast_job]
+            end = ABORT
+            try:
+                for chunk in chunks:
+                    stamps = pd.to_datetime(chunk["datetime"])
+                    energy = chunk if energy_wm is None else chunk[stamps > energy_wm]
+                    forecast = chunk if forecast_wm is None else chunk[stamps > forecast_wm]
+                    if len(energy):
+                        _put(energy_q, to_csv_text(energy_rows(energy)), running)
+                    if len(forecast):
+                        _put(forecast_q, to_csv_text(forecast_rows(forecast, interval, confidence)), running)
+                end = None
+            finally:
+                # Always end the streams so the COPY threads can finish, but if reading
+                # the source failed partway, fail them: nothing partial is committed
+                # and no watermark moves past rows that never loaded
+                _put(energy_q, end, running)
+                _put(forecast_q, end, running)
+
+            readings, patterns, repeated_readings = energy_job.result()
+            forecasts, _, repeated_forecasts = forecast_job.result()
+            for table, repeated in [("energy_consumption", repeated_readings),
+                                    ("energy_forecasts", repeated_forecasts)]:
+                if repeated:
+                    print(f"⚠️ {repeated} source rows repeat another row's natural key in {table} "
+                          f"(household, timestamp, appliance) and were loaded once")
+            return {"energy_consumption": readings, "usage_patterns": patterns,
+                    "energy_forecasts": forecasts}
+    finally:
+        pool.closeall()
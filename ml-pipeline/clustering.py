@@ -0,0 +1,513 @@
+# -----------------------------
+# 🧩 Clustering helpers - usage-label mapping + large-data k-means
+# -----------------------------
+# Shared by train_kmeans.py. The large-data path never holds the full dataset:
+# the scaler and a MiniBatchKMeans are fitted chunk by chunk, every row is then
+# assigned chunk by chunk, and quality metrics are computed on a stratified
+# sample instead of the quadratic full-data silhouette score.
+#
+# --k auto picks the number of usage bands: every candidate k is fitted in its
+# own worker process on one uniform sample of SELECT_SAMPLE rows (a reservoir in
+# the large-data path) and scored by sampled silhouette, the inertia elbow and
+# Davies-Bouldin. The cost depends on the sample, not on the dataset. Workers
+# are separate processes (like the walk-forward workers, so the calling script
+# is never re-imported) that read the sample from one .npy file in a directory
+# private to the selecting process, removed once every candidate is scored:
+#   python clustering.py --sample DIR --k K
+#
+# The incremental path (update_kmeans.py) moves the saved centroids using only
+# new rows, keeps every cluster's label by matching new centroids to old ones,
+# and works out exactly which (hour, weekday, energy range) cells change label.
+import argparse
+import concurrent.futures
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+CLUSTER_FEATURES = ["hour", "weekday", "is_weekend", "Energy Consumption (kWh)"]
+ENERGY = "Energy Consumption (kWh)"
+SAMPLE_SIZE = 50_000
+MINIBATCH_SIZE = 65_536
+ENERGY_BIN = 0.05  # kWh per row of the hour × energy density grid
+DENSITY_PATH = "models/kmeans_density.json"
+K_RANGE = (2, 8)  # candidate cluster counts for --k auto
+SELECT_SAMPLE = 20_000  # rows the candidates are fitted on
+SILHOUETTE_SAMPLE = 5_000  # rows each silhouette score is computed on
+SELECTION_PATH = "models/kmeans_selection.json"
+SHARED_DIR = "/dev/shm"
+SELECT_DATA_DIR = "models/cache/kmeans_select"  # one subdirectory per selecting process without /dev/shm
+BAND_FEATURES = {"Peak": "prob_peak", "Off-Peak": "prob_offpeak"}  # every other band: prob_normal
+
+
+# ============================================================
+# 1. LABELS
+# ============================================================
+def band_names(k):
+    """Usage labels for k clusters, lowest energy first: Off-Peak, Normal (1..k-2), Peak."""
+    if k <= 1:
+        return ["Normal"][:k]
+    middle = ["Normal"] if k == 3 else [f"Normal {i}" for i in range(1, k - 1)]
+    return ["Off-Peak", *middle, "Peak"]
+
+
+def label_clusters(cluster_avg):
+    """cluster -> usage band, from each cluster's average energy consumption (highest first)."""
+    order = cluster_avg.sort_values(ascending=False).index
+    return dict(zip(order, reversed(band_names(len(order)))))
+
+
+def band_order(labels):
+    """The labels in use, highest-energy band first."""
+    used = set(labels.values())
+    return [lbl for lbl in reversed(band_names(len(labels))) if lbl in used]
+
+
+def band_groups(labels):
+    """prob_* feature -> clusters it is the distance to.
+
+    prob_peak / prob_offpeak measure the top and bottom band and prob_normal the
+    nearest band in between, so the model keeps three distance features for any
+    k (one cluster each at k=3). With no band in between (k=2), prob_normal is
+    the distance to the nearest cluster.
+    """
+    groups = {"prob_peak": [], "prob_normal": [], "prob_offpeak": []}
+    for c, lbl in sorted(labels.items()):
+        groups[BAND_FEATURES.get(lbl, "prob_normal")].append(int(c))
+    every = sorted(int(c) for c in labels)
+    return {name: clusters or every for name, clusters in groups.items()}
+
+
+def band_features(dist, labels):
+    """prob_* columns from a (rows, k) centroid-distance matrix."""
+    return {name: dist[:, clusters].min(axis=1) for name, clusters in band_groups(labels).items()}
+
+
+def match_labels(old_centers, new_centers, old_labels):
+    """Label each new centroid like the old centroid it is matched to (min total squared distance).
+
+    Both center arrays must be in the same (scaled) space.
+    """
+    cost = ((new_centers[:, None, :] - old_centers[None, :, :]) ** 2).sum(axis=2)
+    rows, cols = linear_sum_assignment(cost)
+    return {int(r): old_labels[int(c)] for r, c in zip(rows, cols)}
+
+
+def labels_in_energy_order(labels, energy):
+    """True when the usage bands still follow the clusters' energy ranking."""
+    return label_clusters(energy) == labels
+
+
+def centroid_energy(kmeans, scaler):
+    """Per-cluster energy at the centroid, in kWh (the cluster mean once k-means has converged)."""
+    centers = scaler.inverse_transform(kmeans.cluster_centers_)
+    return pd.Series(centers[:, CLUSTER_FEATURES.index(ENERGY)])
+
+
+# ============================================================
+# 2. SAMPLING + DIAGNOSTICS
+# ============================================================
+def stratified_sample(clusters, fraction, rng):
+    """Sorted row indices drawn from every cluster in proportion to its size."""
+    picked = []
+    for c in np.unique(clusters):
+        members = np.flatnonzero(clusters == c)
+        k = min(len(members), int(round(len(members) * fraction)))
+        if k:
+            picked.append(rng.choice(members, k, replace=False))
+    return np.sort(np.concatenate(picked)) if picked else np.array([], dtype=int)
+
+
+def cluster_diagnostics(X, clusters):
+    """Silhouette, Davies-Bouldin and Calinski-Harabasz scores for (sampled) points."""
+    if len(np.unique(clusters)) < 2:
+        return {"silhouette": np.nan, "davies_bouldin": np.nan,
+                "calinski_harabasz": np.nan, "sample_rows": len(X)}
+    return {
+        "silhouette": silhouette_score(X, clusters),
+        "davies_bouldin": davies_bouldin_score(X, clusters),
+        "calinski_harabasz": calinski_harabasz_score(X, clusters),
+        "sample_rows": len(X),
+    }
+
+
+# ============================================================
+# 3. AGGREGATES
+# ============================================================
+def cluster_aggregates(frame):
+    """Energy sum and row count per (cluster, appliance, hour) - every summary derives from it."""
+    return frame.groupby(["cluster", "Appliance Type", "hour"], observed=True)[ENERGY].agg(["sum", "count"])
+
+
+def merge_aggregates(total, part):
+    return part if total is None else total.add(part, fill_value=0)
+
+
+def mean_by(agg, labels, keys):
+    """Mean energy grouped by `keys` (any of usage_label / Appliance Type / hour / cluster)."""
+    frame = agg.reset_index()
+    frame["usage_label"] = frame["cluster"].map(labels)
+    grouped = frame.groupby(keys, observed=True)[["sum", "count"]].sum()
+    return grouped["sum"] / grouped["count"]
+
+
+def count_by(agg, labels, keys):
+    frame = agg.reset_index()
+    frame["usage_label"] = frame["cluster"].map(labels)
+    return frame.groupby(keys, observed=True)["count"].sum().astype(int)
+
+
+def density_counts(frame, n_clusters, energy_bin=ENERGY_BIN):
+    """Row counts per (cluster, hour, energy bin) in one bincount; shape (clusters, 24, bins).
+
+    Bins are `energy_bin` kWh wide from 0, as many as the chunk needs (merge_density
+    pads), so chunks can be counted without knowing the overall energy range.
+    """
+    energy = frame[ENERGY].to_numpy(dtype=float)
+    ok = np.isfinite(energy)
+    bins = (np.clip(energy[ok], 0, None) // energy_bin).astype(np.int64)
+    n_bins = int(bins.max()) + 1 if len(bins) else 1
+    cell = frame["cluster"].to_numpy(np.int64)[ok] * 24 + frame["hour"].to_numpy(np.int64)[ok]
+    counts = np.bincount(cell * n_bins + bins, minlength=n_clusters * 24 * n_bins)
+    return counts.reshape(n_clusters, 24, n_bins)
+
+
+def merge_density(total, part):
+    if total is None:
+        return part
+    n_bins = max(total.shape[2], part.shape[2])
+    widen = lambda a: np.pad(a, ((0, 0), (0, 0), (0, n_bins - a.shape[2])))
+    return widen(total) + widen(part)
+
+
+def density_by_label(density, labels):
+    """{usage label: (24, bins) counts} in the labels' order, clusters sharing a label summed."""
+    by_label = {}
+    for c, lbl in labels.items():
+        by_label[lbl] = by_label.get(lbl, 0) + density[int(c)]
+    return by_label
+
+
+def save_density(density, labels, energy_bin=ENERGY_BIN, path=DENSITY_PATH):
+    """Write the per-label hour × energy grids as JSON (counts[label][hour][bin]) for the dashboard."""
+    by_label = density_by_label(density, labels)
+    used = np.flatnonzero(sum(by_label.values()).sum(axis=0))
+    n_bins = int(used[-1]) + 1 if len(used) else 1
+    artifact = {
+        "energy_bin_kwh": energy_bin,
+        "energy_edges": [round(i * energy_bin, 6) for i in range(n_bins + 1)],
+        "hours": list(range(24)),
+        "labels": list(by_label),
+        "counts": {lbl: grid[:, :n_bins].astype(int).tolist() for lbl, grid in by_label.items()},
+        "rows": int(density.sum()),
+    }
+    with open(path, "w") as f:
+        json.dump(artifact, f, separators=(",", ":"))
+    return artifact
+
+
+# ============================================================
+# 4. LARGE-DATA FIT + ASSIGNMENT
+# ============================================================
+def _features(chunk):
+    return chunk[CLUSTER_FEATURES].to_numpy(dtype=float)
+
+
+def fit_scaler(batches, reservoir=None):
+    """StandardScaler fitted chunk by chunk; `reservoir` (FeatureReservoir) also samples the raw rows."""
+    scaler = StandardScaler()
+    for chunk in batches:
+        X = _features(chunk)
+        scaler.partial_fit(X)
+        if reservoir is not None:
+            reservoir.add(X)
+    return scaler
+
+
+def fit_minibatch_kmeans(make_batches, scaler, n_clusters=3, epochs=2,
+                         batch_size=MINIBATCH_SIZE, random_state=42):
+    """MiniBatchKMeans fitted over `epochs` passes of make_batches(), shuffled within each chunk."""
+    rng = np.random.default_rng(random_state)
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size,
+                             random_state=random_state, n_init=3)
+    for _ in range(epochs):
+        for chunk in make_batches():
+            X = scaler.transform(_features(chunk))[rng.permutation(len(chunk))]
+            for start in range(0, len(X), batch_size):
+                part = X[start:start + batch_size]
+                if len(part) >= n_clusters:
+                    kmeans.partial_fit(part)
+    return kmeans
+
+
+def assign_in_chunks(batches, scaler, kmeans, labels, sample_fraction, out_csv=None,
+                     prepare=None, random_state=42, energy_bin=ENERGY_BIN):
+    """Label every chunk, accumulate aggregates, density and a stratified sample, optionally stream to CSV.
+
+    Returns (aggregates, scaled sample features, sample rows, cluster sizes, density counts).
+    `prepare` (e.g. add_season_dummies) is applied to each chunk before it is labelled.
+    """
+    rng = np.random.default_rng(random_state)
+    agg = density = None
+    sample_X, sample_rows = [], []
+    for i, chunk in enumerate(batches):
+        if prepare:
+            chunk = prepare(chunk)
+        X = scaler.transform(_features(chunk))
+        chunk["cluster"] = kmeans.predict(X)
+        chunk["usage_label"] = chunk["cluster"].map(labels)
+        agg = merge_aggregates(agg, cluster_aggregates(chunk))
+        density = merge_density(density, density_counts(chunk, kmeans.n_clusters, energy_bin))
+
+        idx = stratified_sample(chunk["cluster"].to_numpy(), sample_fraction, rng)
+        sample_X.append(X[idx])
+        sample_rows.append(chunk.iloc[idx])
+
+        if out_csv:
+            chunk.to_csv(out_csv, mode="w" if i == 0 else "a", header=i == 0, index=False)
+
+    sizes = agg.groupby(level="cluster")["count"].sum().astype(int)
+    return agg, np.concatenate(sample_X), pd.concat(sample_rows, ignore_index=True), sizes, density
+
+
+def scale(scaler, frame):
+    """Scaled CLUSTER_FEATURES matrix, regardless of how the scaler was fitted."""
+    return (_features(frame) - scaler.mean_) / scaler.scale_
+
+
+# ============================================================
+# 5. SAVED MODEL + INCREMENTAL UPDATES
+# ============================================================
+KMEANS_ARTIFACTS = ["kmeans_model", "kmeans_scaler", "kmeans_labels", "kmeans_counts"]
+
+
+def save_kmeans(kmeans, scaler, labels, counts, models_dir="models"):
+    state = {"kmeans_model": kmeans, "kmeans_scaler": scaler,
+             "kmeans_labels": {int(c): lbl for c, lbl in labels.items()},
+             "kmeans_counts": np.asarray(counts, dtype=float)}
+    for name, obj in state.items():
+        with open(os.path.join(models_dir, f"{name}.pkl"), "wb") as f:
+            pickle.dump(obj, f)
+
+
+def load_kmeans(models_dir="models", required=("kmeans_model", "kmeans_scaler", "kmeans_labels")):
+    """Saved clustering artifacts keyed by name, or None if a required one is missing."""
+    loaded = {}
+    for name in KMEANS_ARTIFACTS:
+        path = os.path.join(models_dir, f"{name}.pkl")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                loaded[name] = pickle.load(f)
+        elif name in required:
+            return None
+    return loaded
+
+
+def update_centroids(kmeans, scaler, counts, new_rows, iterations=3):
+    """Move kmeans' centroids towards `new_rows` only; returns the updated per-cluster counts.
+
+    Each centroid becomes the count-weighted mean of its previous position and the
+    new rows assigned to it, so history is represented by (centroid, count) alone.
+    The scaler is left untouched to keep the feature space fixed.
+    """
+    X = scale(scaler, new_rows)
+    prior = kmeans.cluster_centers_.copy()
+    counts = np.asarray(counts, dtype=float)
+    centers = prior
+    added = np.zeros(len(prior))
+    for _ in range(iterations):
+        assign = _nearest(X, centers)
+        sums = np.zeros_like(prior)
+        np.add.at(sums, assign, X)
+        added = np.bincount(assign, minlength=len(prior)).astype(float)
+        total = counts + added
+        centers = np.where(total[:, None] > 0,
+                           (counts[:, None] * prior + sums) / np.maximum(total, 1)[:, None],
+                           prior)
+    kmeans.cluster_centers_ = centers
+    return counts + added
+
+
+def _nearest(X, centers):
+    return ((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+
+
+def _energy_segments(centers, scaler, hour, weekday):
+    """Breakpoints (kWh) where the nearest centroid changes along the energy axis at (hour, weekday).
+
+    With hour/weekday fixed, the squared distance to centroid k is A_k + B_k*z + z²
+    in the scaled energy z, so the ownership boundaries are the pairwise
+    intersections of the lines A_k + B_k*z.
+    """
+    e = CLUSTER_FEATURES.index(ENERGY)
+    base = (np.array([hour, weekday, float(weekday >= 5), scaler.mean_[e]]) - scaler.mean_) / scaler.scale_
+    A = ((base - centers) ** 2).sum(axis=1) - (base[e] - centers[:, e]) ** 2 + centers[:, e] ** 2
+    B = -2 * centers[:, e]
+    points = []
+    for i in range(len(centers)):
+        for j in range(i + 1, len(centers)):
+            if B[i] != B[j]:
+                points.append((A[j] - A[i]) / (B[i] - B[j]))
+    return np.array(points) * scaler.scale_[e] + scaler.mean_[e]
+
+
+def _label_at(centers, scaler, labels, hour, weekday, energy):
+    raw = np.column_stack([np.full(len(energy), hour), np.full(len(energy), weekday),
+                           np.full(len(energy), float(weekday >= 5)), energy])
+    nearest = _nearest((raw - scaler.mean_) / scaler.scale_, centers)
+    return np.array([labels[int(c)] for c in nearest], dtype=object)
+
+
+def changed_label_ranges(old_centers, old_labels, new_centers, new_labels, scaler):
+    """Exact (hour, weekday, energy range) cells whose usage label differs between two models.
+
+    Hour and weekday are discrete, so for each of the 168 combinations the label
+    is a piecewise-constant function of energy; comparing the two partitions gives
+    the only rows that need relabelling. energy_from/energy_to are half-open bounds
+    (-inf/inf at the ends).
+    """
+    changes = []
+    for hour in range(24):
+        for weekday in range(7):
+            cuts = np.unique(np.concatenate([
+                _energy_segments(old_centers, scaler, hour, weekday),
+                _energy_segments(new_centers, scaler, hour, weekday)]))
+            edges = np.concatenate([[-np.inf], cuts, [np.inf]])
+            mids = np.concatenate([[cuts[0] - 1] if len(cuts) else [0.0],
+                                   (cuts[:-1] + cuts[1:]) / 2,
+                                   [cuts[-1] + 1] if len(cuts) else []])
+            before = _label_at(old_centers, scaler, old_labels, hour, weekday, mids)
+            after = _label_at(new_centers, scaler, new_labels, hour, weekday, mids)
+            for k in np.flatnonzero(before != after):
+                lo, hi = edges[k], edges[k + 1]
+                if changes and changes[-1][:2] == (hour, weekday) and changes[-1][3] == lo \
+                        and changes[-1][4:] == (before[k], after[k]):
+                    changes[-1] = (hour, weekday, changes[-1][2], hi, before[k], after[k])
+                else:
+                    changes.append((hour, weekday, lo, hi, before[k], after[k]))
+    return pd.DataFrame(changes, columns=["hour", "weekday", "energy_from", "energy_to",
+                                          "old_label", "new_label"])
+
+
+# ============================================================
+# 6. CHOOSING K
+# ============================================================
+class FeatureReservoir:
+    """Uniform sample of at most `size` rows from a stream of chunks (bottom-k random keys)."""
+
+    def __init__(self, size=SELECT_SAMPLE, random_state=42):
+        self.size = size
+        self.rng = np.random.default_rng(random_state)
+        self.keys = np.empty(0)
+        self.rows = np.empty((0, len(CLUSTER_FEATURES)))
+
+    def add(self, X):
+        keys = np.concatenate([self.keys, self.rng.random(len(X))])
+        rows = np.concatenate([self.rows, X])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, rows = keys[keep], rows[keep]
+        self.keys, self.rows = keys, rows
+
+
+def k_arg(value):
+    """argparse type for --k: a cluster count or "auto"."""
+    return value if value == "auto" else int(value)
+
+
+def score_k(X, k, random_state=42):
+    """Fit k-means with k clusters on the sample; inertia, sampled silhouette and Davies-Bouldin."""
+    kmeans = KMeans(n_clusters=k, random_state=random_state, n_init=4).fit(X)
+    clusters = kmeans.labels_
+    return {
+        "k": k,
+        "inertia": float(kmeans.inertia_),
+        "silhouette": float(silhouette_score(X, clusters, sample_size=min(SILHOUETTE_SAMPLE, len(X)),
+                                             random_state=random_state)),
+        "davies_bouldin": float(davies_bouldin_score(X, clusters)),
+    }
+
+
+def elbow_scores(ks, inertia):
+    """Distance of each (k, inertia) point below the chord from the first to the last candidate.
+
+    Both axes are scaled to [0, 1], so the elbow is the candidate after which
+    adding clusters stops paying off (kneedle); the end points score 0.
+    """
+    ks, inertia = np.asarray(ks, dtype=float), np.asarray(inertia, dtype=float)
+    x = (ks - ks[0]) / max(ks[-1] - ks[0], 1)
+    y = (inertia - inertia.min()) / max(inertia.max() - inertia.min(), 1e-12)
+    return (1 - x) - y
+
+
+def _select_dir():
+    """A fresh directory for this process's sample, in shared memory when there is one."""
+    if os.path.isdir(SHARED_DIR):
+        return os.path.join(SHARED_DIR, f"ieoms-kselect-{os.getpid()}")
+    return os.path.join(SELECT_DATA_DIR, str(os.getpid()))
+
+
+def select_k(X, k_range=K_RANGE, workers=None):
+    """Score every k in k_range (inclusive) on the sample X in parallel worker processes.
+
+    Candidates are ranked on each criterion (silhouette and elbow higher,
+    Davies-Bouldin lower); the lowest rank sum wins, the smaller k on ties.
+    Returns (best k, per-candidate scores as a DataFrame).
+    """
+    ks = [k for k in range(k_range[0], k_range[1] + 1) if 2 <= k < len(X)]
+    if not ks:
+        raise ValueError(f"No candidate k in {k_range} for {len(X)} sample rows")
+    workers = min(workers or os.cpu_count() or 1, len(ks))
+    # Each worker gets its share of the cores for k-means' OpenMP threads
+    env = {**os.environ, "OMP_NUM_THREADS": str(max(1, (os.cpu_count() or 1) // workers))}
+    data_dir = _select_dir()
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        np.save(os.path.join(data_dir, "X.npy"), np.asarray(X, dtype=np.float64))
+        cmd = [sys.executable, os.path.abspath(__file__), "--sample", data_dir]
+
+        def run(k):
+            proc = subprocess.run(cmd + ["--k", str(k)], capture_output=True, text=True, env=env)
+            if proc.returncode:
+                raise RuntimeError(f"k-selection worker for k={k} failed:\n{proc.stderr[-2000:]}")
+            return json.loads(proc.stdout)
+
+        # A new candidate starts as soon as any worker finishes
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            scores = list(pool.map(run, ks))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    table = pd.DataFrame(scores).set_index("k")
+    table["elbow"] = elbow_scores(table.index, table["inertia"])
+    table["rank"] = (table["silhouette"].rank(ascending=False) + table["elbow"].rank(ascending=False)
+                     + table["davies_bouldin"].rank())
+    best = int(table["rank"].idxmin())  # idxmin keeps the first (smallest) k on ties
+    return best, table
+
+
+def save_selection(best, table, sample_rows, path=SELECTION_PATH):
+    with open(path, "w") as f:
+        json.dump({"k": best, "sample_rows": int(sample_rows),
+                   "candidates": table.reset_index().to_dict(orient="records")}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="k-selection worker")
+    parser.add_argument("--sample", required=True)
+    parser.add_argument("--k", type=int, required=True)
+    args = parser.parse_args()
+    print(json.dumps(score_k(np.load(os.path.join(args.sample, "X.npy")), args.k)))
+
+
+if __name__ == "__main__":
+    main()
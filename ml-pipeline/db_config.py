@@ -0,0 +1,9 @@
+# Database connection parameters shared by the ml-pipeline scripts
+# (mirrors backend/config/database.js)
+DB_CONFIG = {
+    'dbname': 'IEOMS',
+    'user': 'postgres',
+    'password': 'postgres',
+    'host': 'localhost',
+    'port': '5432'
+}
@@ -0,0 +1,325 @@
+# -----------------------------
+# 🧱 Shared Feature Layer - cleaning + time features for every ml-pipeline script
+# -----------------------------
+# preprocess_data.py, train_kmeans.py and train_xgboost.py all start from the same
+# cleaned, time-featured frame. It is built once per (source file content, feature
+# code version) and stored as an uncompressed Arrow IPC file under models/cache/,
+# which later runs memory-map instead of re-parsing the CSV.
+#
+# compact=True switches to the low-memory ingestion mode: explicit compact dtypes,
+# vectorized calendar/season derivation and a two-pass chunked read of the CSV, so
+# peak memory is bounded by `chunksize` rather than by the size of the dataset.
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+RAW_CSV = "smart_home_energy_consumption_large.csv"
+CACHE_DIR = "models/cache"
+
+# Bump whenever clean() / add_time_features() change what they produce,
+# so stale caches are never picked up.
+FEATURE_VERSION = "1"
+
+TARGET = "Energy Consumption (kWh)"
+
+# Compact ingestion dtypes. Household Size is read as float32 (it may contain
+# gaps) and narrowed to int8 once filled.
+CATEGORICAL_COLUMNS = ["Appliance Type", "Season", "Date", "Time"]
+COMPACT_DTYPES = {
+    "Appliance Type": "category",
+    "Season": "category",
+    "Date": "category",
+    "Time": "category",
+    "Energy Consumption (kWh)": "float32",
+    "Outdoor Temperature (°C)": "float32",
+    "Household Size": "float32",
+}
+CHUNKSIZE = 1_000_000
+
+# Lag/rolling features are computed per series; Home ID is optional in the CSV
+SERIES_COLUMNS = ["Home ID", "Appliance Type"]
+LAGS = (1, 2, 3)
+ROLLING_WINDOWS = (3, 6, 12)
+# Last readings of every series, so lag features for new rows need no history
+SERIES_TAIL_PATH = "models/series_tail.arrow"
+
+# Medians in the streaming pass are computed from value counts; float columns
+# are counted at this resolution so the counts stay bounded on huge files.
+MEDIAN_DECIMALS = 4
+
+# month (1-12) -> month-derived season, index 0 unused
+SEASON_BY_MONTH = np.array(["", "winter", "winter", "spring", "spring", "spring", "summer",
+                            "summer", "summer", "autumn", "autumn", "autumn", "winter"],
+                           dtype=object)
+SEASONS = ["autumn", "spring", "summer", "winter"]
+
+
+# ============================================================
+# 1. CLEANING + TIME FEATURES
+# ============================================================
+def clean(df):
+    """Fill missing numeric values with the column median, everything else with the mode."""
+    for col in df.columns:
+        if df[col].dtype in ["int64", "float64"]:
+            df[col] = df[col].fillna(df[col].median())
+        else:
+            df[col] = df[col].fillna(df[col].mode()[0])
+    return df
+
+
+def add_time_features(df):
+    df["datetime"] = pd.to_datetime(df["Date"] + " " + df["Time"])
+    df["hour"] = df["datetime"].dt.hour
+    df["day"] = df["datetime"].dt.day
+    df["month"] = df["datetime"].dt.month
+    df["weekday"] = df["datetime"].dt.dayofweek
+    df["is_weekend"] = (df["weekday"] >= 5).astype(int)
+    return df
+
+
+def add_season_dummies(df):
+    """Month-derived season one-hot columns (season_spring/summer/winter, autumn dropped).
+
+    Encoded against all four seasons, so every chunk gets the same columns
+    whichever seasons it happens to contain.
+    """
+    df["season"] = pd.Categorical(SEASON_BY_MONTH[df["month"].to_numpy(dtype=np.int64)],
+                                  categories=SEASONS)
+    return pd.get_dummies(df, columns=["season"], drop_first=True)
+
+
+def add_lag_features(df, keys=None, lags=LAGS, windows=ROLLING_WINDOWS):
+    """lag_N and rolling_N per (household, appliance) series in time order.
+
+    Rolling means cover the readings before the current one (at least one), the
+    same windows the recursive forecaster feeds at serving time. The frame comes
+    back sorted by series and time; rows without lag_{max(lags)} are NaN there.
+    """
+    keys = keys or [c for c in SERIES_COLUMNS if c in df.columns]
+    df = df.sort_values(keys + ["datetime"], kind="stable").reset_index(drop=True)
+    grouped = df.groupby(keys, sort=False, observed=True)[TARGET]
+    for n in lags:
+        df[f"lag_{n}"] = grouped.shift(n)
+
+    # Windowed sums from a per-series running total of the previous readings
+    prev = df[f"lag_{min(lags)}"].fillna(0.0).to_numpy(dtype=np.float64)
+    total = pd.Series(prev).groupby(grouped.ngroup().to_numpy()).cumsum().to_numpy()
+    seen = grouped.cumcount().to_numpy()
+    for w in windows:
+        n = np.minimum(seen, w)
+        before = np.where(seen > w, np.roll(total, w), 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df[f"rolling_{w}"] = np.where(n > 0, (total - before) / n, np.nan)
+    return df
+
+
+def save_series_tail(df, path=SERIES_TAIL_PATH, keys=None, window=max(ROLLING_WINDOWS)):
+    """Keep the last `window` readings of every series (the history add_lag_features needs)."""
+    keys = keys or [c for c in SERIES_COLUMNS if c in df.columns]
+    tail = (df.sort_values(keys + ["datetime"], kind="stable")
+              .groupby(keys, sort=False, observed=True).tail(window))
+    tail = tail[keys + ["datetime", TARGET]].reset_index(drop=True)
+    for key in keys:
+        if isinstance(tail[key].dtype, pd.CategoricalDtype):
+            tail[key] = tail[key].astype(str)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    feather.write_feather(tail, path, compression="uncompressed")
+    return len(tail)
+
+
+def load_series_tail(path=SERIES_TAIL_PATH):
+    """The saved series tail, or None before the first training run that wrote one."""
+    if not os.path.exists(path):
+        return None
+    return feather.read_table(path).to_pandas()
+
+
+# ============================================================
+# 2. ON-DISK CACHE
+# ============================================================
+def file_hash(path, block_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_path(path, cache_dir=CACHE_DIR, compact=False, digest=None):
+    """Cache file for `path`; pass its file_hash() as `digest` if already known."""
+    mode = "-compact" if compact else ""
+    return os.path.join(cache_dir,
+                        f"features_{digest or file_hash(path)}_v{FEATURE_VERSION}{mode}.arrow")
+
+
+def build_features(path=RAW_CSV):
+    """Parse the raw CSV and return the cleaned, time-featured frame (no caching)."""
+    return add_time_features(clean(pd.read_csv(path)))
+
+
+# ============================================================
+# 3. COMPACT STREAMING INGESTION
+# ============================================================
+def _read_chunks(path, chunksize):
+    return pd.read_csv(path, dtype=COMPACT_DTYPES, chunksize=chunksize)
+
+
+def _merge_counts(total, counts):
+    if total is None:
+        return counts
+    return total.add(counts, fill_value=0)
+
+
+def scan_fill_values(path=RAW_CSV, chunksize=CHUNKSIZE):
+    """First streaming pass: per-column fill value (median or mode) plus category sets.
+
+    Every column is reduced to value counts chunk by chunk, so memory depends on
+    the number of distinct values, not on the number of rows.
+    """
+    counts = {}
+    for chunk in _read_chunks(path, chunksize):
+        for col in chunk.columns:
+            values = chunk[col]
+            if col not in CATEGORICAL_COLUMNS and values.dtype.kind == "f":
+                values = values.round(MEDIAN_DECIMALS)
+            vc = values.value_counts(sort=False)
+            if col in CATEGORICAL_COLUMNS:
+                vc.index = vc.index.astype(str)
+            counts[col] = _merge_counts(counts.get(col), vc)
+
+    fill_values, categories = {}, {}
+    for col, vc in counts.items():
+        vc = vc[vc > 0].sort_index()
+        if col in CATEGORICAL_COLUMNS:
+            categories[col] = vc.index.astype(str)
+        if vc.empty:
+            fill_values[col] = None
+        elif col not in CATEGORICAL_COLUMNS and vc.index.dtype.kind in "iuf":
+            # Median from cumulative counts, matching pandas' midpoint rule
+            cum = vc.to_numpy().cumsum()
+            n = cum[-1]
+            lo = vc.index[np.searchsorted(cum, (n - 1) // 2, side="right")]
+            hi = vc.index[np.searchsorted(cum, n // 2, side="right")]
+            fill_values[col] = (lo + hi) / 2
+        else:
+            fill_values[col] = vc.idxmax()
+    return fill_values, categories
+
+
+def _calendar_lookups(categories):
+    """Parse each distinct Date / Time once into int64 ns offsets and int8 calendar fields."""
+    dates = pd.to_datetime(pd.Index(categories["Date"]))
+    times = pd.to_datetime("1970-01-01 " + pd.Index(categories["Time"]))
+    return {
+        "date_ns": dates.as_unit("ns").asi8,
+        "time_ns": times.as_unit("ns").asi8,
+        "hour": times.hour.to_numpy().astype(np.int8),
+        "day": dates.day.to_numpy().astype(np.int8),
+        "month": dates.month.to_numpy().astype(np.int8),
+        "weekday": dates.dayofweek.to_numpy().astype(np.int8),
+    }
+
+
+def _compact_chunk(chunk, fill_values, categories, lookups):
+    for col, cats in categories.items():
+        chunk[col] = pd.Categorical(chunk[col], categories=cats)
+    for col, value in fill_values.items():
+        if value is not None and chunk[col].isna().any():
+            chunk[col] = chunk[col].fillna(value)
+    if "Household Size" in chunk.columns:
+        chunk["Household Size"] = chunk["Household Size"].astype(np.int8)
+
+    date_codes = chunk["Date"].cat.codes.to_numpy()
+    time_codes = chunk["Time"].cat.codes.to_numpy()
+    chunk["datetime"] = pd.to_datetime(lookups["date_ns"][date_codes] + lookups["time_ns"][time_codes])
+    chunk["hour"] = lookups["hour"][time_codes]
+    chunk["day"] = lookups["day"][date_codes]
+    chunk["month"] = lookups["month"][date_codes]
+    chunk["weekday"] = lookups["weekday"][date_codes]
+    chunk["is_weekend"] = (chunk["weekday"] >= 5).astype(np.int8)
+    return chunk
+
+
+def ingest_compact(path, out_path, chunksize=CHUNKSIZE):
+    """Two-pass chunked ingestion of `path` into a compact Arrow IPC file at `out_path`."""
+    fill_values, categories = scan_fill_values(path, chunksize)
+    lookups = _calendar_lookups(categories)
+
+    tmp = out_path + ".tmp"
+    writer = schema = None
+    rows = 0
+    try:
+        for chunk in _read_chunks(path, chunksize):
+            table = pa.Table.from_pandas(_compact_chunk(chunk, fill_values, categories, lookups),
+                                         preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pa.ipc.new_file(tmp, schema)
+            writer.write_table(table.cast(schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, out_path)
+    return rows
+
+
+def iter_feature_batches(path=RAW_CSV, cache_dir=CACHE_DIR, compact=True, chunksize=CHUNKSIZE):
+    """Yield the cached feature frame in bounded-size pandas chunks (builds the cache if needed)."""
+    cached = _ensure_cache(path, cache_dir, compact, chunksize)
+    with pa.memory_map(cached) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).to_pandas()
+
+
+# ============================================================
+# 4. ENTRY POINT
+# ============================================================
+_announced = set()
+
+
+def _ensure_cache(path, cache_dir, compact, chunksize):
+    cached = cache_path(path, cache_dir, compact)
+    if os.path.exists(cached):
+        if cached not in _announced:
+            print(f"⚡ Using cached features: {cached}")
+            _announced.add(cached)
+        return cached
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if compact:
+        rows = ingest_compact(path, cached, chunksize)
+    else:
+        df = build_features(path)
+        rows = len(df)
+        tmp = cached + ".tmp"
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp,
+                              compression="uncompressed")
+        os.replace(tmp, cached)
+    print(f"✅ Features cached to {cached} ({rows} rows)")
+    return cached
+
+
+def load_features(path=RAW_CSV, cache_dir=CACHE_DIR, use_cache=True, compact=False,
+                  chunksize=CHUNKSIZE):
+    """Cleaned, time-featured frame for `path`, served from the memory-mapped cache when possible."""
+    if not use_cache and not compact:
+        return build_features(path)
+
+    cached = _ensure_cache(path, cache_dir, compact, chunksize)
+    table = feather.read_table(cached, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def add_ingest_args(parser):
+    """--compact / --chunksize flags shared by the pipeline scripts."""
+    parser.add_argument("--compact", action="store_true",
+                        help="low-memory ingestion: compact dtypes + chunked two-pass CSV read")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE,
+                        help=f"rows per chunk in --compact mode (default {CHUNKSIZE})")
+    return parser
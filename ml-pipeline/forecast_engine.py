@@ -0,0 +1,199 @@
+# -----------------------------
+# 🔮 ForecastEngine - batched XGBoost energy forecasts
+# -----------------------------
+# Replaces the pickled forecast_energy closure. Encoders and the pattern lookup
+# tables (appliance_base, season_mult, household_factor, monthly_mult, daily_mult,
+# temp_coeff) are resolved once into index-aligned arrays, so a whole
+# appliance × hour × day grid is encoded, scaled and predicted in one batch.
+import os
+import pickle
+
+import numpy as np
+import xgboost as xgb
+
+FEATURES = [
+    "Appliance_encoded", "Outdoor Temperature (°C)", "Season_encoded",
+    "Household Size", "hour", "weekday", "month",
+    "Appliance_Base", "Season_M", "House_F", "Month_M", "Day_M",
+    "Temp_Impact",
+    "usage_encoded", "prob_peak", "prob_normal", "prob_offpeak",
+    "lag_1", "lag_2", "lag_3",
+    "rolling_3", "rolling_6", "rolling_12"
+]
+
+# Features that depend on recent history; they default to 0 when not supplied
+HISTORY_FEATURES = ["prob_peak", "prob_normal", "prob_offpeak",
+                    "lag_1", "lag_2", "lag_3",
+                    "rolling_3", "rolling_6", "rolling_12"]
+
+# Resolved numeric state of an engine and its label vocabularies (see model_bundle.py)
+ENGINE_ARRAYS = ["x_mean", "x_scale", "app_base", "app_temp", "season_m",
+                 "house_f", "month_m", "day_m"]
+ENGINE_VOCABS = ["app_classes", "season_classes", "usage_classes"]
+
+ARTIFACTS = ["xgboost_model", "scaler_x", "scaler_y", "le_app", "le_season", "le_usage",
+             "appliance_base", "season_mult", "household_factor", "monthly_mult",
+             "daily_mult", "temp_coeff"]
+
+
+def load_artifacts(models_dir="models"):
+    """Unpickle every artifact train_xgboost.py writes, keyed by file stem."""
+    loaded = {}
+    for name in ARTIFACTS:
+        with open(os.path.join(models_dir, f"{name}.pkl"), "rb") as f:
+            loaded[name] = pickle.load(f)
+    return loaded
+
+
+def require_artifacts(models_dir="models"):
+    """Exit with a hint when the pickle set is missing (train_xgboost.py writes it only with --legacy-pickles)."""
+    missing = [f"{name}.pkl" for name in ARTIFACTS if not os.path.exists(os.path.join(models_dir, f"{name}.pkl"))]
+    if missing:
+        raise SystemExit(f"❌ No pickle set in {models_dir}/ (missing {', '.join(missing)}) - "
+                         f"retrain with python train_xgboost.py --legacy-pickles")
+
+
+def _encode(classes, values):
+    """Vectorized LabelEncoder.transform: position of each value in the sorted classes."""
+    values = np.asarray(values)
+    codes = np.searchsorted(classes, values)
+    codes = np.minimum(codes, len(classes) - 1)
+    unknown = classes[codes] != values
+    if unknown.any():
+        raise ValueError(f"Unknown labels: {sorted(set(values[unknown].tolist()))}")
+    return codes
+
+
+def _dense_lookup(mapping, size):
+    """Integer-keyed dict -> array indexed by key (NaN for missing keys)."""
+    table = np.full(size, np.nan)
+    for key, value in mapping.items():
+        table[int(key)] = value
+    return table
+
+
+class ForecastEngine:
+    # Optional multi-quantile model (quantiles.py), attached with set_quantile_model
+    quantile_model = None
+    quantiles = ()
+
+    def __init__(self, model, scaler_x, scaler_y, le_app, le_season, le_usage,
+                 appliance_base, season_mult, household_factor, monthly_mult,
+                 daily_mult, temp_coeff):
+        self.model = model
+        self.app_classes = np.asarray(le_app.classes_)
+        self.season_classes = np.asarray(le_season.classes_)
+        self.usage_classes = np.asarray(le_usage.classes_)
+
+        # Lookups aligned with the encoder codes
+        self.app_base = np.array([appliance_base[a] for a in self.app_classes], dtype=float)
+        self.app_temp = np.array([temp_coeff.get(a, 0) for a in self.app_classes], dtype=float)
+        self.season_m = np.array([season_mult[s] for s in self.season_classes], dtype=float)
+        self.house_f = _dense_lookup(household_factor, int(max(household_factor)) + 1)
+        self.month_m = _dense_lookup(monthly_mult, 13)
+        self.day_m = _dense_lookup(daily_mult, 7)
+
+        self.x_mean = np.asarray(scaler_x.mean_, dtype=float)
+        self.x_scale = np.asarray(scaler_x.scale_, dtype=float)
+        self.y_mean = float(scaler_y.mean_[0])
+        self.y_scale = float(scaler_y.scale_[0])
+        self._set_model(model)
+
+    def _set_model(self, model):
+        self.model = model
+        # A bare Booster (from a bundle) predicts on NumPy arrays via inplace_predict
+        self._predict = model.inplace_predict if isinstance(model, xgb.Booster) else model.predict
+
+    def set_quantile_model(self, model, quantiles):
+        """Attach a Booster predicting `quantiles` of the scaled target (one column each)."""
+        self.quantile_model = model
+        self.quantiles = tuple(sorted(float(q) for q in quantiles))
+
+    @classmethod
+    def from_arrays(cls, model, arrays, vocabs, y_mean, y_scale):
+        """Rebuild an engine from its resolved arrays instead of the pickled objects."""
+        engine = cls.__new__(cls)
+        for name in ENGINE_ARRAYS:
+            setattr(engine, name, arrays[name])
+        for name in ENGINE_VOCABS:
+            setattr(engine, name, np.asarray(vocabs[name], dtype=object))
+        engine.y_mean, engine.y_scale = float(y_mean), float(y_scale)
+        engine._set_model(model)
+        return engine
+
+    @classmethod
+    def load(cls, models_dir="models"):
+        """Load the latest model bundle, or the loose pickles from older training runs."""
+        from model_bundle import load_bundle
+        bundle = load_bundle(models_dir)
+        if bundle is not None:
+            return bundle["engine"]
+        loaded = load_artifacts(models_dir)
+        return cls(loaded.pop("xgboost_model"), **loaded)
+
+    def build_features(self, appliance, temp, season, house, hour, weekday, month,
+                       usage_label, **history):
+        """Raw feature matrix (rows × FEATURES) for equally long input arrays.
+
+        Scalars broadcast. Keyword arguments named in HISTORY_FEATURES supply
+        the lag/rolling/cluster-distance columns; missing ones are 0.
+        """
+        appliance, temp, season, house, hour, weekday, month, usage_label = np.broadcast_arrays(
+            appliance, temp, season, house, hour, weekday, month, usage_label)
+        n = appliance.shape[0] if appliance.ndim else 1
+
+        app_code = _encode(self.app_classes, appliance.ravel())
+        season_code = _encode(self.season_classes, season.ravel())
+        usage_code = _encode(self.usage_classes, usage_label.ravel())
+        house = house.ravel().astype(np.int64)
+        hour = hour.ravel().astype(np.int64)
+        weekday = weekday.ravel().astype(np.int64)
+        month = month.ravel().astype(np.int64)
+        temp = temp.ravel().astype(float)
+
+        X = np.zeros((n, len(FEATURES)))
+        X[:, 0] = app_code
+        X[:, 1] = temp
+        X[:, 2] = season_code
+        X[:, 3] = house
+        X[:, 4] = hour
+        X[:, 5] = weekday
+        X[:, 6] = month
+        X[:, 7] = self.app_base[app_code]
+        X[:, 8] = self.season_m[season_code]
+        X[:, 9] = self.house_f[house]
+        X[:, 10] = self.month_m[month]
+        X[:, 11] = self.day_m[weekday]
+        X[:, 12] = temp * self.app_temp[app_code]
+        X[:, 13] = usage_code
+        for name, values in history.items():
+            if name not in HISTORY_FEATURES:
+                raise TypeError(f"Unexpected history feature: {name}")
+            X[:, FEATURES.index(name)] = values
+        return X
+
+    def predict_features(self, X):
+        """Scale, predict and inverse-scale a raw feature matrix in one batch."""
+        pred_scaled = self._predict((X - self.x_mean) / self.x_scale)
+        return pred_scaled * self.y_scale + self.y_mean
+
+    def predict(self, appliance, temp, season, house, hour, weekday, month, usage_label,
+                **history):
+        """Forecast energy (kWh) for every row of the input arrays."""
+        X = self.build_features(appliance, temp, season, house, hour, weekday, month,
+                                usage_label, **history)
+        return self.predict_features(X)
+
+    def predict_quantiles_features(self, X):
+        """(rows × self.quantiles) kWh for a raw feature matrix in one batch; rows never cross."""
+        if self.quantile_model is None:
+            raise ValueError("No quantile model - train with train_xgboost.py --quantiles")
+        pred = self.quantile_model.inplace_predict((X - self.x_mean) / self.x_scale)
+        return np.sort(pred.reshape(len(X), -1) * self.y_scale + self.y_mean, axis=1)
+
+    def predict_quantiles(self, appliance, temp, season, house, hour, weekday, month, usage_label,
+                          **history):
+        """predict() for every quantile of the quantile model: (rows × self.quantiles) kWh."""
+        X = self.build_features(appliance, temp, season, house, hour, weekday, month,
+                                usage_label, **history)
+        return self.predict_quantiles_features(X)
@@ -0,0 +1,251 @@
+# -----------------------------
+# 🛰️ Forecast Service - long-lived local XGBoost inference
+# -----------------------------
+# Loads the model artifacts once and keeps them warm, so the backend can ask
+# for a full recursive horizon per household without unpickling anything per
+# request. Listens on localhost only. When per-segment models were trained
+# (train_xgboost.py --segment-by), each series is routed to its segment's model.
+#
+#   GET  /health
+#   POST /forecast  {"household_id": 1, "horizon": 168, "write": true,
+#                    "history": [...optional readings, otherwise read from the DB...]}
+#   POST /whatif    {"appliance_type": "Heater", "outdoor_temp": 4.5, "season": "Winter",
+#                    "household_size": 3, "hour": 19, "weekday": 2, "month": 1,
+#                    "usage_label": "Peak", ...optional lag_1 / rolling_3 / ...}
+#                   one-row forecast through LatencyPredictor (latency_predictor.py)
+#
+# With "write": true the horizon replaces the household's MODEL_VERSION rows in
+# energy_forecasts in a single bulk insert; other model versions' rows are kept.
+#
+# Usage: python forecast_service.py [--port 8001]
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from forecast_engine import HISTORY_FEATURES
+from latency_predictor import LatencyPredictor
+from model_bundle import load_manifest
+from quantiles import interval_confidence
+from recursive_forecast import load_history_db, SERIES_KEYS
+from segments import SegmentedForecaster, load_homes
+
+DEFAULT_PORT = int(os.environ.get("FORECAST_SERVICE_PORT", 8001))
+MODEL_VERSION = "xgboost_v1"
+
+# Kaggle season names by month, for readings uploaded without a season
+SEASON_NAMES = np.array(["", "Winter", "Winter", "Spring", "Spring", "Spring", "Summer",
+                         "Summer", "Summer", "Fall", "Fall", "Fall", "Winter"], dtype=object)
+
+# API field -> history column (same names the DB rows and uploaded CSVs use)
+HISTORY_FIELDS = {
+    "household_id": "household_id",
+    "timestamp": "datetime",
+    "appliance_type": "Appliance Type",
+    "energy_kwh": "Energy Consumption (kWh)",
+    "outdoor_temp": "Outdoor Temperature (°C)",
+    "season": "Season",
+    "household_size": "Household Size",
+}
+
+
+def history_from_records(records, household_id):
+    df = pd.DataFrame(records).rename(columns=HISTORY_FIELDS)
+    for col in HISTORY_FIELDS.values():
+        if col not in df.columns:
+            df[col] = np.nan
+    df["household_id"] = df["household_id"].fillna(household_id).astype(int)
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    df["Energy Consumption (kWh)"] = df["Energy Consumption (kWh)"].astype(float)
+    df["Outdoor Temperature (°C)"] = df["Outdoor Temperature (°C)"].astype(float)
+    return df
+
+
+def fill_exogenous(history, default_household_size=4):
+    """Season from the month, temperature carried forward per series, default household size.
+
+    Readings uploaded through the backend only carry timestamp / appliance / kWh.
+    A temperature that is still missing after the carry-forward stays NaN and is
+    treated as a missing value by XGBoost.
+    """
+    history = history.sort_values("datetime", kind="stable").copy()
+    history["Season"] = history["Season"].astype(object)
+    missing = history["Season"].isna()
+    history.loc[missing, "Season"] = SEASON_NAMES[history.loc[missing, "datetime"].dt.month]
+    history["Outdoor Temperature (°C)"] = (history.groupby(SERIES_KEYS)["Outdoor Temperature (°C)"]
+                                           .ffill())
+    history["Household Size"] = history["Household Size"].fillna(default_household_size).astype(int)
+    return history
+
+
+class ForecastService:
+    def __init__(self, models_dir="models", db_config=None):
+        start = time.perf_counter()
+        self.forecaster = SegmentedForecaster.load(models_dir)
+        # confidence_score of [lower, upper]: its measured test coverage (quantiles.py)
+        quantiles = self.forecaster.engine.quantiles
+        manifest = load_manifest(models_dir) or {}
+        self.confidence = (interval_confidence(quantiles[-1] - quantiles[0], manifest.get("metadata"))
+                           if quantiles else None)
+        self.segment_by = getattr(self.forecaster, "by", None)
+        self.db_config = db_config
+        self.lock = threading.Lock()
+        self.whatif_predictor = LatencyPredictor.from_engine(self.forecaster.engine)
+        self.whatif_lock = threading.Lock()  # the predictor reuses one input row
+        segments = (f", {len(self.forecaster.forecasters)} per-{self.segment_by} models"
+                    if self.segment_by else "")
+        print(f"✅ Models loaded in {(time.perf_counter() - start) * 1000:.0f}ms{segments}")
+
+    def _connect(self):
+        import psycopg2
+        return psycopg2.connect(**self.db_config)
+
+    def forecast(self, household_id, horizon=168, history=None):
+        if history is None:
+            with self._connect() as conn:
+                history = load_history_db(conn, household_id=household_id)
+        else:
+            history = history_from_records(history, household_id)
+        if self.segment_by == "household_cluster" and self.db_config is not None:
+            # Household clusters are keyed by Home ID: only households loaded from one route there
+            with self._connect() as conn:
+                homes = load_homes(conn)
+            with self.lock:
+                self.forecaster.homes = homes
+        if history.empty:
+            raise ValueError(f"No readings for household {household_id}")
+
+        history = fill_exogenous(history)
+        known = history["Appliance Type"].isin(self.forecaster.engine.app_classes)
+        skipped = sorted(history.loc[~known, "Appliance Type"].unique().tolist())
+        if not known.any():
+            raise ValueError(f"No known appliance types for household {household_id}: {skipped}")
+
+        with self.lock:
+            result = self.forecaster.forecast(history[known], horizon=horizon)
+        return result, skipped
+
+    def whatif(self, req):
+        """kWh for one appliance at one hour, from the global model."""
+        history = {name: float(req[name]) for name in HISTORY_FEATURES if name in req}
+        with self.whatif_lock:
+            return self.whatif_predictor.predict_one(
+                req["appliance_type"], float(req["outdoor_temp"]), req["season"],
+                int(req["household_size"]), int(req["hour"]), int(req["weekday"]), int(req["month"]),
+                req.get("usage_label", "Normal"), **history)
+
+    def write(self, forecasts):
+        """Replace each household's MODEL_VERSION forecasts with `forecasts` in one transaction."""
+        from psycopg2.extras import execute_values
+
+        # Rows without an interval (no quantile model for their segment) store NULL
+        has_band = forecasts["predicted_lower_kwh"].notna().to_numpy()
+        bounds = forecasts[["predicted_lower_kwh", "predicted_upper_kwh"]].round(4).astype(object)
+        rows = list(zip(
+            forecasts["household_id"].astype(int).tolist(),
+            forecasts["forecast_timestamp"].dt.to_pydatetime().tolist(),
+            forecasts["Appliance Type"].tolist(),
+            forecasts["predicted_energy_kwh"].round(4).tolist(),
+            bounds["predicted_lower_kwh"].where(has_band, None).tolist(),
+            bounds["predicted_upper_kwh"].where(has_band, None).tolist(),
+            [self.confidence if band else None for band in has_band],
+            [MODEL_VERSION] * len(forecasts),
+        ))
+        with self._connect() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM energy_forecasts WHERE household_id = ANY(%s) AND model_version = %s",
+                           (sorted(set(forecasts["household_id"].astype(int).tolist())), MODEL_VERSION))
+            execute_values(cursor, """
+                INSERT INTO energy_forecasts
+                (household_id, forecast_timestamp, appliance_type, predicted_energy_kwh,
+                 predicted_lower_kwh, predicted_upper_kwh, confidence_score, model_version)
+                VALUES %s
+            """, rows, page_size=len(rows) or 1)
+        return len(rows)
+
+
+class ForecastHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "OK", "model_version": MODEL_VERSION,
+                             "segment_by": self.service.segment_by})
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path not in ("/forecast", "/whatif"):
+            self._send(404, {"error": "Not found"})
+            return
+        try:
+            start = time.perf_counter()
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/whatif":
+                kwh = self.service.whatif(req)
+                self._send(200, {"predicted_energy_kwh": round(kwh, 4), "modelVersion": MODEL_VERSION,
+                                 "latencyMs": round((time.perf_counter() - start) * 1000, 3)})
+                return
+            household_id = int(req.get("household_id", 1))
+
+            forecasts, skipped = self.service.forecast(
+                household_id, int(req.get("horizon", 168)), req.get("history"))
+            written = self.service.write(forecasts) if req.get("write") else 0
+
+            payload = {
+                "household_id": household_id,
+                "forecastsGenerated": len(forecasts),
+                "forecastsWritten": written,
+                "skippedAppliances": skipped,
+                "modelVersion": MODEL_VERSION,
+                "latencyMs": round((time.perf_counter() - start) * 1000, 2),
+            }
+            if req.get("return_forecasts"):
+                payload["forecasts"] = forecasts.astype(object).where(forecasts.notna(), None).rename(
+                    columns={"Appliance Type": "appliance_type"}).to_dict(orient="records")
+            self._send(200, payload)
+        except (ValueError, KeyError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            print(f"❌ Forecast failed: {e}")
+            self._send(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service, port=DEFAULT_PORT):
+    handler = type("BoundForecastHandler", (ForecastHandler,), {"service": service})
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived local forecast service")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--models", default="models")
+    args = parser.parse_args()
+
+    from db_config import DB_CONFIG
+    server = make_server(ForecastService(args.models, DB_CONFIG), args.port)
+    print(f"🛰️ Forecast service listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# -----------------------------
+# 🧪 Synthetic Dataset - Kaggle-schema smart-home readings at any size
+# -----------------------------
+# Offline stand-in for download_dataset.py. Writes the same columns as the
+# Kaggle file (Home ID, Appliance Type, Energy Consumption (kWh), Time, Date,
+# Outdoor Temperature (°C), Season, Household Size) with a realistic shape:
+#   - fixed per-appliance base loads (APPLIANCES below; no trained model is read)
+#   - daily profiles per appliance (meal peaks, evening TV/lights, flat fridge)
+#     and a weekend lift
+#   - an annual temperature cycle with day-to-day weather and a diurnal swing;
+#     heating and cooling loads respond to it, lighting to day length
+#   - a fixed household size per home that scales its consumption
+#   - multiplicative log-normal noise, optional missing values
+# Rows are generated and written in chunks (Arrow CSV writer), so 100M rows
+# take the same memory as 1M. Output is reproducible for a given --seed and
+# --chunk-rows.
+#
+# Usage: python generate_dataset.py --rows 1000000 [--out smart_home_energy_consumption_large.csv]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from features import RAW_CSV
+
+COLUMNS = ["Home ID", "Appliance Type", "Energy Consumption (kWh)", "Time", "Date",
+           "Outdoor Temperature (°C)", "Season", "Household Size"]
+CHUNK_ROWS = 1_000_000
+
+# name -> (base kWh per reading, daily profile)
+APPLIANCES = {
+    "Air Conditioning": (3.5, "climate"),
+    "Heater": (3.5, "climate"),
+    "Fridge": (0.3, "flat"),
+    "Oven": (1.1, "meals"),
+    "Microwave": (1.1, "meals"),
+    "Dishwasher": (1.1, "after_meals"),
+    "Washing Machine": (1.1, "daytime"),
+    "Computer": (1.1, "work"),
+    "TV": (1.1, "evening"),
+    "Lights": (1.1, "evening"),
+}
+
+# profile -> [(peak hour, width in hours, weight)] on top of a floor of 1
+PROFILE_PEAKS = {
+    "flat": [(15, 6, 0.1)],
+    "climate": [(7, 2, 1.0), (19, 3, 1.5)],
+    "meals": [(7.5, 1, 1.5), (12.5, 1, 2.0), (19, 1.5, 4.0)],
+    "after_meals": [(13.5, 1, 1.0), (20.5, 1.5, 3.0)],
+    "daytime": [(10, 2, 2.0), (16, 2, 1.5)],
+    "work": [(11, 3, 2.0), (21, 2, 2.0)],
+    "evening": [(7, 1, 1.0), (20.5, 2.5, 4.0)],
+}
+NIGHT_FLOOR = 0.25  # share of the floor left between midnight and 6am
+
+SEASON_BY_MONTH = np.array(["", "Winter", "Winter", "Spring", "Spring", "Spring", "Summer",
+                            "Summer", "Summer", "Fall", "Fall", "Fall", "Winter"])
+
+
+def daily_profile(peaks):
+    """24 hourly multipliers with mean 1: night floor plus circular Gaussian bumps."""
+    hours = np.arange(24, dtype=np.float64)
+    shape = np.where(hours < 6, NIGHT_FLOOR, 1.0)
+    for center, width, weight in peaks:
+        distance = np.minimum(np.abs(hours - center), 24 - np.abs(hours - center))
+        shape = shape + weight * np.exp(-0.5 * (distance / width) ** 2)
+    return shape / shape.mean()
+
+
+class DatasetShape:
+    """Everything that is fixed for a dataset: calendar, weather, homes, profiles."""
+
+    def __init__(self, seed=42, homes=500, start="2023-01-01", days=365):
+        rng = np.random.default_rng([seed, 0])
+        self.dates = pd.date_range(start, periods=days, freq="D")
+        doy = self.dates.dayofyear.to_numpy()
+
+        # Annual cycle peaking in late July plus AR(1) day-to-day weather
+        weather = np.zeros(days)
+        shocks = rng.normal(0, 2.5, days)
+        for d in range(1, days):
+            weather[d] = 0.7 * weather[d - 1] + shocks[d]
+        self.day_temp = 13 + 11 * np.cos(2 * np.pi * (doy - 205) / 365.25) + weather
+        # Lighting follows darkness: longest evenings around the winter solstice
+        self.day_light = 1 + 0.3 * np.cos(2 * np.pi * (doy - 355) / 365.25)
+        self.weekend = self.dates.dayofweek.to_numpy() >= 5
+        self.season = SEASON_BY_MONTH[self.dates.month.to_numpy()]
+
+        self.home_size = rng.choice([1, 2, 3, 4, 5], homes, p=[0.15, 0.3, 0.2, 0.25, 0.1])
+        self.home_level = rng.lognormal(0, 0.15, homes)
+
+        self.app_names = list(APPLIANCES)
+        self.app_base = np.array([base for base, _ in APPLIANCES.values()])
+        self.app_profile = np.stack([daily_profile(PROFILE_PEAKS[p]) for _, p in APPLIANCES.values()])
+        self.heater = self.app_names.index("Heater")
+        self.cooler = self.app_names.index("Air Conditioning")
+        self.lights = self.app_names.index("Lights")
+        self.fridge = self.app_names.index("Fridge")
+
+        self.date_text = pa.array(self.dates.strftime("%Y-%m-%d"))
+        self.time_text = pa.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)])
+        self.season_names = np.unique(self.season)
+
+    def chunk(self, rng, n, missing=0.0):
+        """One chunk of `n` readings as an Arrow table in Kaggle column order."""
+        day = rng.integers(0, len(self.dates), n)
+        minute = rng.integers(0, 1440, n)
+        hour = minute // 60
+        home = rng.integers(0, len(self.home_size), n)
+        app = rng.integers(0, len(self.app_names), n)
+
+        temp = (self.day_temp[day] + 5 * np.cos(2 * np.pi * (hour - 15) / 24)
+                + rng.normal(0, 1.5, n))
+
+        level = self.app_base[app] * self.app_profile[app, hour]
+        level *= np.where(self.weekend[day] & (app != self.fridge), 1.15, 1.0)
+        level *= np.where(app == self.heater, 0.2 + 0.12 * np.clip(17 - temp, 0, None), 1.0)
+        level *= np.where(app == self.cooler, 0.2 + 0.18 * np.clip(temp - 21, 0, None), 1.0)
+        level *= np.where(app == self.lights, self.day_light[day], 1.0)
+        level *= (0.7 + 0.15 * self.home_size[home]) * self.home_level[home]
+        energy = np.round(level * rng.lognormal(-0.03, 0.25, n), 2)
+        temp = np.round(temp, 1)
+
+        if missing > 0:
+            energy[rng.random(n) < missing] = np.nan
+            temp[rng.random(n) < missing] = np.nan
+
+        season_codes = np.searchsorted(self.season_names, self.season[day]).astype(np.int32)
+        return pa.table([
+            pa.array(home + 1, pa.int32()),
+            pa.DictionaryArray.from_arrays(pa.array(app.astype(np.int32)), pa.array(self.app_names)),
+            pa.array(energy, from_pandas=True),
+            pa.DictionaryArray.from_arrays(pa.array(minute.astype(np.int32)), self.time_text),
+            pa.DictionaryArray.from_arrays(pa.array(day.astype(np.int32)), self.date_text),
+            pa.array(temp, from_pandas=True),
+            pa.DictionaryArray.from_arrays(pa.array(season_codes), pa.array(self.season_names)),
+            pa.array(self.home_size[home].astype(np.int8)),
+        ], names=COLUMNS)
+
+
+def generate(path=RAW_CSV, rows=1_000_000, seed=42, homes=500, start="2023-01-01", days=365,
+             missing=0.0, chunk_rows=CHUNK_ROWS):
+    """Write `rows` synthetic readings to `path`; returns the number of rows written."""
+    shape = DatasetShape(seed, homes, start, days)
+    options = pacsv.WriteOptions(include_header=False, quoting_style="none")
+    written = 0
+    with open(path, "wb") as f:
+        f.write((",".join(COLUMNS) + "\n").encode())
+        with pacsv.CSVWriter(f, shape.chunk(np.random.default_rng(0), 1).schema,
+                             write_options=options) as writer:
+            for index, offset in enumerate(range(0, rows, chunk_rows)):
+                n = min(chunk_rows, rows - offset)
+                writer.write_table(shape.chunk(np.random.default_rng([seed, index + 1]), n, missing))
+                written += n
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Kaggle-schema energy dataset")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--out", default=RAW_CSV)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--homes", type=int, default=500)
+    parser.add_argument("--start", default="2023-01-01", help="first date of the readings")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--missing", type=float, default=0.0,
+                        help="fraction of energy/temperature values left empty")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = generate(args.out, args.rows, args.seed, args.homes, args.start, args.days,
+                    args.missing, args.chunk_rows)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {rows} rows written to {args.out} in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
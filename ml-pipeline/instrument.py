@@ -0,0 +1,263 @@
+# -----------------------------
+# 📏 Instrumentation - per-stage timing, memory and profiling for the pipeline scripts
+# -----------------------------
+# A script creates one StageRecorder and marks where each named stage starts:
+#
+#   run = StageRecorder("train_kmeans", args)      # args from add_instrument_args
+#   run.stage("load")
+#   data = load_features(...)
+#   run.stage("kmeans", rows=len(data))           # ends "load", starts "kmeans"
+#   ...
+#   run.done()
+#
+# (`with run.stage(...):` also works for a block.) Per stage it records wall
+# time, CPU time of the process and of the worker processes it waited for,
+# RSS at the start and end, peak RSS within the stage (Linux: the kernel
+# high-water mark is reset at every stage start; elsewhere the process peak so
+# far) and the row count with its rows/s. The JSON report is written to
+# --report (default models/reports/<script>.json) when the process exits, also
+# after a crash, with the unfinished stage marked as failed.
+#
+# --profile STAGE [STAGE ...] (or "all") attaches a profiler to those stages:
+#   --profiler cprofile  deterministic; models/profiles/<script>.<stage>.prof
+#                        plus a .txt of the top functions by cumulative time
+#   --profiler sample    statistical (SIGPROF every --sample-ms of CPU time);
+#                        collapsed stacks in .folded for flamegraph.pl/speedscope
+import atexit
+import collections
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import resource
+import signal
+import sys
+import time
+
+REPORT_DIR = "models/reports"
+PROFILE_DIR = "models/profiles"
+PROFILERS = ["cprofile", "sample"]
+SAMPLE_MS = 5
+TOP_FUNCTIONS = 40
+
+# ru_maxrss is kilobytes on Linux, bytes on macOS
+_MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+
+def add_instrument_args(parser):
+    """--report / --profile / --profiler / --sample-ms flags shared by the pipeline scripts."""
+    parser.add_argument("--report", default=None,
+                        help=f"stage report JSON (default {REPORT_DIR}/<script>.json)")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="STAGE",
+                        help="profile these stages ('all' for every stage)")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile")
+    parser.add_argument("--sample-ms", type=float, default=SAMPLE_MS,
+                        help=f"CPU ms between samples with --profiler sample (default {SAMPLE_MS})")
+    return parser
+
+
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    """Reset the kernel's RSS high-water mark; False where that is unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _process_peak_mb():
+    return _proc_status_mb("VmHWM") or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_SCALE / 2**20
+
+
+def _rss_mb():
+    return _proc_status_mb("VmRSS") or _process_peak_mb()
+
+
+def _children_peak_mb():
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * _MAXRSS_SCALE / 2**20
+
+
+class SamplingProfiler:
+    """Collapsed call stacks sampled on SIGPROF (CPU time of the main thread's process)."""
+
+    def __init__(self, interval_ms=SAMPLE_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = collections.Counter()
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+    def enable(self):
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def disable(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous)
+
+    def save(self, path):
+        with open(path + ".folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path + ".folded"
+
+
+class CProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def enable(self):
+        self.profile.enable()
+
+    def disable(self):
+        self.profile.disable()
+
+    def save(self, path):
+        self.profile.dump_stats(path + ".prof")
+        text = io.StringIO()
+        pstats.Stats(self.profile, stream=text).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        with open(path + ".txt", "w") as f:
+            f.write(text.getvalue())
+        return path + ".prof"
+
+
+class Stage:
+    """One named stage; started by StageRecorder.stage(), ended by the next one."""
+
+    def __init__(self, recorder, name, rows=None):
+        self.recorder, self.name, self.rows = recorder, name, rows
+        self.record = None
+        self.profiler = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.record is None:
+            self.recorder._end(self, "failed" if exc_type else "ok")
+        return False
+
+
+class StageRecorder:
+    """Collects per-stage measurements for one script run and writes the JSON report."""
+
+    def __init__(self, script, args=None, report=None, profile=(), profiler="cprofile",
+                 sample_ms=SAMPLE_MS):
+        if args is not None:
+            report, profile = args.report, args.profile
+            profiler, sample_ms = args.profiler, args.sample_ms
+        self.script = script
+        self.report_path = report or os.path.join(REPORT_DIR, f"{script}.json")
+        self.profile, self.profiler, self.sample_ms = set(profile), profiler, sample_ms
+        self.stages, self.current, self.finished = [], None, False
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._start_wall = time.perf_counter()
+        atexit.register(self._write)
+
+    def stage(self, name, rows=None):
+        """End the current stage and start `name`; returns it for `with` or a later .rows."""
+        if self.current is not None:
+            self._end(self.current, "ok")
+        stage = Stage(self, name, rows)
+        self.current = stage
+        stage._wall = time.perf_counter()
+        stage._times = os.times()
+        stage._rss = _rss_mb()
+        stage._children_peak = _children_peak_mb()
+        stage._peak_reset = _reset_peak()
+        if "all" in self.profile or name in self.profile:
+            stage.profiler = SamplingProfiler(self.sample_ms) if self.profiler == "sample" else CProfiler()
+            stage.profiler.enable()
+        return stage
+
+    def rows(self, n):
+        """Set the row count of the current stage."""
+        self.current.rows = int(n)
+
+    def done(self):
+        """End the last stage and mark the run as complete."""
+        if self.current is not None:
+            self._end(self.current, "ok")
+        self.finished = True
+
+    def _end(self, stage, status):
+        if stage.profiler is not None:
+            stage.profiler.disable()
+        wall = time.perf_counter() - stage._wall
+        times = os.times()
+        children_peak = _children_peak_mb()
+        stage.record = {
+            "stage": stage.name,
+            "status": status,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(max(0.0, times.user + times.system - stage._times.user - stage._times.system), 4),
+            "children_cpu_s": round(times.children_user + times.children_system
+                                    - stage._times.children_user - stage._times.children_system, 4),
+            "rss_start_mb": round(stage._rss, 1),
+            "rss_end_mb": round(_rss_mb(), 1),
+            "peak_rss_mb": round(_process_peak_mb(), 1),
+            "peak_is_stage_local": stage._peak_reset,
+            "children_peak_rss_mb": round(children_peak, 1) if children_peak > stage._children_peak else None,
+            "rows": stage.rows,
+            "rows_per_s": round(stage.rows / wall, 1) if stage.rows and wall > 0 else None,
+        }
+        if stage.profiler is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stage.record["profile"] = stage.profiler.save(
+                os.path.join(PROFILE_DIR, f"{self.script}.{stage.name}"))
+        self.stages.append(stage.record)
+        if self.current is stage:
+            self.current = None
+
+    def _write(self):
+        if self.current is not None:
+            self._end(self.current, "failed")
+        report = {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "status": "ok" if self.finished else "failed",
+            "started_at": self.started_at,
+            "wall_s": round(time.perf_counter() - self._start_wall, 4),
+            "cpu_s": round(os.times().user + os.times().system, 4),
+            "children_cpu_s": round(os.times().children_user + os.times().children_system, 4),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_SCALE / 2**20, 1),
+            "children_peak_rss_mb": round(_children_peak_mb(), 1),
+            "host": platform.node(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "stages": self.stages,
+        }
+        directory = os.path.dirname(self.report_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.report_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        print(f"\n⏱️ Stage timings ({self.script}, report in {self.report_path})")
+        print(f"  {'stage':<16} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'rows/s':>12}")
+        for record in self.stages:
+            rate = f"{record['rows_per_s']:,.0f}" if record["rows_per_s"] else "-"
+            flag = "" if record["status"] == "ok" else f"  ({record['status']})"
+            print(f"  {record['stage']:<16} {record['wall_s']:>8.2f} {record['cpu_s']:>8.2f} "
+                  f"{record['peak_rss_mb']:>8.0f} {rate:>12}{flag}")
+            if "profile" in record:
+                print(f"  {'':<16} profile: {record['profile']}")
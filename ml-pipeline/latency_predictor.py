@@ -0,0 +1,236 @@
+# -----------------------------
+# ⚡ Latency Predictor - single-row what-if forecasts without the sklearn stack
+# -----------------------------
+# ForecastEngine is built for batches; for one appliance at one hour its NumPy
+# broadcasting, scaling and inverse scaling cost far more than walking the
+# trees. LatencyPredictor removes that overhead:
+#
+#   * scaler_y is folded into the booster: every leaf is multiplied by the
+#     target scale and the base score becomes base × scale + mean, so the trees
+#     emit kWh directly
+#   * scaler_x is folded into the inputs: encoders, lookups and calendar values
+#     are stored already scaled, so only temperature, temperature impact and
+#     history values are scaled per call, with the same float64 arithmetic as
+#     StandardScaler (split ties land exactly where they did in training)
+#   * each call fills a preallocated float32 row and calls the booster's
+#     inplace_predict single-threaded (no DataFrame, DMatrix or copies)
+#
+# export() writes the folded model as portable XGBoost JSON plus the lookups and
+# input scaling it needs (latency.json), loadable by any XGBoost runtime (C API,
+# JVM, Rust, ...) and by ONNX / tree-compiler converters. With --compile the
+# trees are also generated as C and built into model.so (needs a C compiler),
+# which predict_one then calls through ctypes instead of XGBoost.
+#
+# The preallocated row makes one predictor single-threaded: use one per thread
+# or a lock (forecast_service.py does the latter).
+#
+# Usage: python latency_predictor.py [--models models] [--export models/latency] [--compile]
+import argparse
+import ctypes
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import xgboost as xgb
+
+from forecast_engine import FEATURES, HISTORY_FEATURES, ForecastEngine
+
+EXPORT_DIR = "models/latency"
+LOOKUPS = ["app", "season", "usage", "house_f", "month_m", "day_m", "x_mean", "x_scale"]
+TEMP, TEMP_IMPACT = FEATURES.index("Outdoor Temperature (°C)"), FEATURES.index("Temp_Impact")
+
+
+def _booster(model):
+    return model if isinstance(model, xgb.Booster) else model.get_booster()
+
+
+def fold_target_scaler(booster, y_mean, y_scale):
+    """Copy of `booster` whose output is y × scale + mean, i.e. unscaled kWh.
+
+    Only for identity-link objectives (reg:squarederror and friends), where
+    the output is base_score + Σ leaves.
+    """
+    model = json.loads(booster.save_raw("json"))
+    learner = model["learner"]
+    objective = learner["objective"]["name"]
+    if objective not in ("reg:squarederror", "reg:pseudohubererror", "reg:absoluteerror"):
+        raise ValueError(f"Cannot fold the target scaler into a {objective} model")
+
+    for tree in learner["gradient_booster"]["model"]["trees"]:
+        # leaves hold their value in split_conditions
+        tree["split_conditions"] = [c * y_scale if left == -1 else c
+                                    for c, left in zip(tree["split_conditions"], tree["left_children"])]
+        tree["base_weights"] = [w * y_scale for w in tree["base_weights"]]
+
+    params = learner["learner_model_param"]
+    folded = float(params["base_score"].strip("[]")) * y_scale + y_mean
+    params["base_score"] = f"[{folded:.9E}]" if params["base_score"].startswith("[") else f"{folded:.9E}"
+
+    out = xgb.Booster(model_file=bytearray(json.dumps(model).encode()))
+    out.set_param({"nthread": 1})
+    return out
+
+
+def _c_float(value):
+    return f"{np.float32(value).item():.8e}f"  # 9 significant digits round-trip a float32
+
+
+def _c_tree(tree, node=0, depth=1):
+    """Nested if/else for one tree; NaN follows the node's default direction like XGBoost."""
+    pad = "    " * depth
+    left = tree["left_children"][node]
+    if left == -1:
+        return f"{pad}return {_c_float(tree['split_conditions'][node])};\n"
+    f, t = tree["split_indices"][node], _c_float(tree["split_conditions"][node])
+    test = f"!(x[{f}] >= {t})" if tree["default_left"][node] else f"x[{f}] < {t}"
+    return (f"{pad}if ({test}) {{\n{_c_tree(tree, left, depth + 1)}{pad}}} else {{\n"
+            f"{_c_tree(tree, tree['right_children'][node], depth + 1)}{pad}}}\n")
+
+
+def compile_trees(booster, path):
+    """Generate C for `booster` (model.c) and build it into path/model.so; returns the .so path."""
+    compiler = shutil.which(os.environ.get("CC", "cc"))
+    if compiler is None:
+        raise RuntimeError("No C compiler found (set CC) - export without --compile instead")
+    model = json.loads(booster.save_raw("json"))
+    trees = model["learner"]["gradient_booster"]["model"]["trees"]
+    base = float(model["learner"]["learner_model_param"]["base_score"].strip("[]"))
+
+    source = os.path.join(path, "model.c")
+    with open(source, "w") as f:
+        f.write("/* generated by latency_predictor.py - scaled features in, kWh out */\n")
+        for i, tree in enumerate(trees):
+            f.write(f"static float tree_{i}(const float *x) {{\n{_c_tree(tree)}}}\n")
+        f.write("float predict(const float *x) {\n    float s = 0.0f;\n")
+        f.writelines(f"    s += tree_{i}(x);\n" for i in range(len(trees)))
+        f.write(f"    return {_c_float(base)} + s;\n}}\n")
+    library = os.path.join(path, "model.so")
+    subprocess.run([compiler, "-O2", "-shared", "-fPIC", "-o", library, source], check=True)
+    return library
+
+
+class LatencyPredictor:
+    def __init__(self, booster, x_mean, x_scale, app, season, usage, house_f, month_m, day_m,
+                 library=None):
+        """`booster` emits kWh (fold_target_scaler). Raw lookups as in ForecastEngine:
+        `app` {appliance: [code, base, temp coefficient]}, `season` {season: [code, mult]},
+        `usage` {label: code}, house_f / month_m / day_m indexed by size / month / weekday.
+        `library`: a compile_trees() model.so to call instead of the booster."""
+        self.booster = booster
+        self.x_mean, self.x_scale = [float(v) for v in x_mean], [float(v) for v in x_scale]
+        self.lookups = {"app": app, "season": season, "usage": usage,
+                        "house_f": list(house_f), "month_m": list(month_m), "day_m": list(day_m)}
+
+        # scaler_x folded into the inputs: every looked-up value is stored scaled
+        s = lambda name, v: (float(v) - self.x_mean[FEATURES.index(name)]) / self.x_scale[FEATURES.index(name)]
+        self._app = {a: (s("Appliance_encoded", c), s("Appliance_Base", b), float(k))
+                     for a, (c, b, k) in app.items()}
+        self._season = {n: (s("Season_encoded", c), s("Season_M", m)) for n, (c, m) in season.items()}
+        self._usage = {n: s("usage_encoded", c) for n, c in usage.items()}
+        self._house = [(s("Household Size", i), s("House_F", v)) for i, v in enumerate(house_f)]
+        self._month = [(s("month", i), s("Month_M", v)) for i, v in enumerate(month_m)]
+        self._day = [(s("weekday", i), s("Day_M", v)) for i, v in enumerate(day_m)]
+        self._hour = [s("hour", i) for i in range(24)]
+        self._history = {name: FEATURES.index(name) for name in HISTORY_FEATURES}
+        self._no_history = [s(name, 0.0) for name in FEATURES[14:]]
+
+        self._row = np.zeros((1, len(FEATURES)), dtype=np.float32)
+        self._compiled = None
+        if library is not None:
+            self._library = ctypes.CDLL(os.path.abspath(library))
+            self._library.predict.restype = ctypes.c_float
+            self._library.predict.argtypes = [ctypes.c_void_p]
+            self._compiled = self._library.predict
+            self._row_address = self._row.ctypes.data
+
+    @classmethod
+    def from_engine(cls, engine, library=None):
+        """Fold the engine's scalers and resolve its lookups to dicts."""
+        return cls(
+            fold_target_scaler(_booster(engine.model), engine.y_mean, engine.y_scale),
+            engine.x_mean, engine.x_scale,
+            app={str(a): [i, float(engine.app_base[i]), float(engine.app_temp[i])]
+                 for i, a in enumerate(engine.app_classes)},
+            season={str(n): [i, float(engine.season_m[i])] for i, n in enumerate(engine.season_classes)},
+            usage={str(n): i for i, n in enumerate(engine.usage_classes)},
+            house_f=engine.house_f.tolist(), month_m=engine.month_m.tolist(), day_m=engine.day_m.tolist(),
+            library=library,
+        )
+
+    @classmethod
+    def load(cls, models_dir="models"):
+        """From the latest bundle (or the loose pickles, xgboost_model.pkl and scalers)."""
+        return cls.from_engine(ForecastEngine.load(models_dir))
+
+    @classmethod
+    def load_export(cls, path=EXPORT_DIR):
+        """From an export() directory (with its model.so when it was compiled): no pickles needed."""
+        with open(os.path.join(path, "latency.json")) as f:
+            lookups = json.load(f)
+        booster = xgb.Booster(model_file=os.path.join(path, "model.json"))
+        booster.set_param({"nthread": 1})
+        library = os.path.join(path, "model.so")
+        return cls(booster, **{k: lookups[k] for k in LOOKUPS},
+                   library=library if os.path.exists(library) else None)
+
+    def export(self, path=EXPORT_DIR, compile=False):
+        """Write model.json + latency.json (and model.c / model.so with `compile`) to `path`."""
+        os.makedirs(path, exist_ok=True)
+        self.booster.save_model(os.path.join(path, "model.json"))
+        with open(os.path.join(path, "latency.json"), "w") as f:
+            json.dump({"features": FEATURES, "x_mean": self.x_mean, "x_scale": self.x_scale,
+                       **self.lookups}, f, indent=2)
+        if compile:
+            compile_trees(self.booster, path)
+        return path
+
+    def predict_one(self, appliance, temp, season, house, hour, weekday, month, usage_label, **history):
+        """Forecast energy (kWh) for one row; history features (HISTORY_FEATURES) default to 0."""
+        try:
+            app_code, app_base, app_temp = self._app[appliance]
+            season_code, season_m = self._season[season]
+            usage_code = self._usage[usage_label]
+        except KeyError as e:
+            raise ValueError(f"Unknown label: {e.args[0]}") from None
+        house_code, house_f = self._house[house]
+        month_code, month_m = self._month[month]
+        day_code, day_m = self._day[weekday]
+        mean, scale = self.x_mean, self.x_scale
+
+        row = self._row
+        row[0, :14] = (app_code, (temp - mean[TEMP]) / scale[TEMP], season_code, house_code,
+                       self._hour[hour], day_code, month_code, app_base, season_m, house_f, month_m, day_m,
+                       (temp * app_temp - mean[TEMP_IMPACT]) / scale[TEMP_IMPACT], usage_code)
+        row[0, 14:] = self._no_history
+        for name, value in history.items():
+            if name not in self._history:
+                raise TypeError(f"Unexpected history feature: {name}")
+            i = self._history[name]
+            row[0, i] = (value - mean[i]) / scale[i]
+
+        if self._compiled is not None:
+            return self._compiled(self._row_address)
+        return float(self.booster.inplace_predict(row, validate_features=False)[0])
+
+    def predict_features(self, X):
+        """Forecast energy (kWh) for a raw (unscaled) feature matrix."""
+        X = (np.asarray(X, dtype=float) - self.x_mean) / self.x_scale
+        return self.booster.inplace_predict(X.astype(np.float32), validate_features=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build (and export) the low-latency predictor")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--export", default=EXPORT_DIR, help="directory for model.json + latency.json")
+    parser.add_argument("--compile", action="store_true", help="also build the trees as C (model.so)")
+    args = parser.parse_args()
+
+    predictor = LatencyPredictor.load(args.models)
+    path = predictor.export(args.export, compile=args.compile)
+    print(f"✅ Folded model and lookups exported to {path}/" + (" (compiled: model.so)" if args.compile else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# -----------------------------
+# 📦 Model Bundle - one versioned, pickle-free forecast model directory
+# -----------------------------
+# Replaces the loose pickles train_xgboost.py used to write (booster, scalers,
+# encoders, six lookup dicts). A bundle is
+#
+#   models/bundles/<version>/manifest.json   format, version id, features,
+#                                            vocabularies, array offsets, checksums
+#   models/bundles/<version>/booster.ubj     XGBoost native (UBJSON) model
+#   models/bundles/<version>/quantiles.ubj   multi-quantile model, when trained (quantiles.py)
+#   models/bundles/<version>/arrays.bin      every numeric array, float64, back to back
+#   models/bundles/LATEST                    version id of the newest bundle
+#
+# Loading reads the manifest, memory-maps arrays.bin once (each array is a view
+# into it) and loads the booster natively - no pickle, no sklearn objects, so
+# it is safe to point at an untrusted directory. The K-Means state the
+# recursive forecaster needs is carried along when it is known.
+#
+# Convert an existing pickle set: python model_bundle.py --from-pickles [--models models]
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import xgboost as xgb
+
+from forecast_engine import ENGINE_ARRAYS, ENGINE_VOCABS, FEATURES, ForecastEngine
+
+BUNDLE_FORMAT = 1
+BUNDLES_DIR = "bundles"
+CLUSTER_ARRAYS = ["kmeans_centers", "kmeans_mean", "kmeans_scale"]
+
+
+def _digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def latest_version(models_dir="models"):
+    try:
+        with open(os.path.join(models_dir, BUNDLES_DIR, "LATEST")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_bundle(engine, models_dir="models", clustering=None, metadata=None):
+    """Write `engine` (plus optional clustering arrays/labels) as a new bundle; returns its version.
+
+    `clustering` is {"kmeans_centers", "kmeans_mean", "kmeans_scale": arrays,
+    "kmeans_labels": {cluster: label}}. The bundle is assembled in a temporary
+    directory and renamed into place before LATEST is switched to it.
+    """
+    arrays = {name: np.asarray(getattr(engine, name), dtype=np.float64) for name in ENGINE_ARRAYS}
+    if clustering is not None:
+        arrays.update({name: np.asarray(clustering[name], dtype=np.float64) for name in CLUSTER_ARRAYS})
+
+    root = os.path.join(models_dir, BUNDLES_DIR)
+    tmp = os.path.join(root, f".tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    model = engine.model
+    booster = model if isinstance(model, xgb.Booster) else model.get_booster()
+    booster.save_model(os.path.join(tmp, "booster.ubj"))
+    names = ["booster.ubj", "arrays.bin"]
+    if engine.quantile_model is not None:
+        engine.quantile_model.save_model(os.path.join(tmp, "quantiles.ubj"))
+        names.append("quantiles.ubj")
+
+    layout, offset = {}, 0
+    with open(os.path.join(tmp, "arrays.bin"), "wb") as f:
+        for name, arr in arrays.items():
+            f.write(np.ascontiguousarray(arr).tobytes())
+            layout[name] = {"offset": offset, "shape": list(arr.shape)}
+            offset += arr.size
+
+    files = {name: _digest(os.path.join(tmp, name)) for name in names}
+    version = time.strftime("%Y%m%d-%H%M%S-") + hashlib.sha256(
+        "".join(files.values()).encode()).hexdigest()[:8]
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "xgboost_version": xgb.__version__,
+        "features": FEATURES,
+        "vocabs": {name: [str(v) for v in getattr(engine, name)] for name in ENGINE_VOCABS},
+        "target_scaling": {"mean": engine.y_mean, "scale": engine.y_scale},
+        "quantiles": list(engine.quantiles) if engine.quantile_model is not None else None,
+        "arrays": {"dtype": "float64", "layout": layout},
+        "kmeans_labels": ({str(int(c)): lbl for c, lbl in clustering["kmeans_labels"].items()}
+                          if clustering is not None else None),
+        "files": files,
+        "metadata": metadata or {},
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp, os.path.join(root, version))
+    with open(os.path.join(root, "LATEST.tmp"), "w") as f:
+        f.write(version)
+    os.replace(os.path.join(root, "LATEST.tmp"), os.path.join(root, "LATEST"))
+    return version
+
+
+def load_manifest(models_dir="models", version=None):
+    """A bundle's manifest alone (no model loaded), or None if there is no bundle."""
+    version = version or latest_version(models_dir)
+    if version is None:
+        return None
+    with open(os.path.join(models_dir, BUNDLES_DIR, version, "manifest.json")) as f:
+        return json.load(f)
+
+
+def load_bundle(models_dir="models", version=None, verify=False):
+    """{"version", "manifest", "engine", "clustering"} for a bundle, or None if there is none.
+
+    verify=True re-hashes the files against the manifest before loading.
+    """
+    manifest = load_manifest(models_dir, version)
+    if manifest is None:
+        return None
+    version = manifest["version"]
+    path = os.path.join(models_dir, BUNDLES_DIR, version)
+    if manifest["format"] != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest['format']} in {path}")
+    if manifest["features"] != FEATURES:
+        raise ValueError(f"Bundle {version} was trained on a different feature list")
+    if verify:
+        for name, digest in manifest["files"].items():
+            if _digest(os.path.join(path, name)) != digest:
+                raise ValueError(f"Checksum mismatch for {name} in bundle {version}")
+
+    blob = np.memmap(os.path.join(path, "arrays.bin"), dtype=np.float64, mode="r")
+    arrays = {}
+    for name, spec in manifest["arrays"]["layout"].items():
+        size = int(np.prod(spec["shape"]))
+        arrays[name] = blob[spec["offset"]:spec["offset"] + size].reshape(spec["shape"])
+
+    booster = xgb.Booster(model_file=os.path.join(path, "booster.ubj"))
+    scaling = manifest["target_scaling"]
+    engine = ForecastEngine.from_arrays(booster, arrays, manifest["vocabs"],
+                                        scaling["mean"], scaling["scale"])
+    if manifest.get("quantiles"):
+        engine.set_quantile_model(xgb.Booster(model_file=os.path.join(path, "quantiles.ubj")),
+                                  manifest["quantiles"])
+
+    clustering = None
+    if manifest.get("kmeans_labels") is not None:
+        clustering = {name: arrays[name] for name in CLUSTER_ARRAYS}
+        clustering["kmeans_labels"] = {int(c): lbl for c, lbl in manifest["kmeans_labels"].items()}
+    return {"version": version, "manifest": manifest, "engine": engine, "clustering": clustering}
+
+
+def clustering_state(kmeans, scaler, labels):
+    """Bundle clustering entry from a fitted KMeans, its StandardScaler and label map."""
+    return {"kmeans_centers": kmeans.cluster_centers_, "kmeans_mean": scaler.mean_,
+            "kmeans_scale": scaler.scale_, "kmeans_labels": labels}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a model bundle from the loose pickles")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--from-pickles", action="store_true", required=True)
+    args = parser.parse_args()
+
+    from forecast_engine import load_artifacts, require_artifacts
+    from clustering import load_kmeans
+
+    require_artifacts(args.models)
+    loaded = load_artifacts(args.models)
+    engine = ForecastEngine(loaded.pop("xgboost_model"), **loaded)
+    saved = load_kmeans(args.models)
+    clustering = (clustering_state(saved["kmeans_model"], saved["kmeans_scaler"],
+                                   saved["kmeans_labels"]) if saved else None)
+    version = save_bundle(engine, args.models, clustering, {"source": "pickles"})
+    print(f"📦 Bundle {version} written to {args.models}/{BUNDLES_DIR}/"
+          + ("" if clustering else " (no saved clustering found - K-Means not included)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# -----------------------------
+# 🧮 Pattern Features - lookup multipliers for train_xgboost.py, pandas or Arrow engine
+# -----------------------------
+# The pattern features are per-row lookups into small tables learnt from the
+# training frame:
+#   appliance_base    mean kWh per Appliance Type                 -> Appliance_Base
+#   season_mult       mean kWh per Season / overall mean          -> Season_M
+#   household_factor  mean kWh per Household Size / overall mean  -> House_F
+#   monthly_mult      mean kWh per month / overall mean           -> Month_M
+#   daily_mult        mean kWh per weekday / overall mean         -> Day_M
+#   temp_coeff        corr(temperature, kWh) for Heater and AC    -> Temp_Impact
+#
+# engine="pandas" is the original eager code: five groupbys, a filtered copy
+# per appliance for the correlations, then .map / masked .loc per column.
+#
+# engine="arrow" runs the same feature graph as two Arrow Acero plans, which
+# execute lazily, multi-threaded and batch by batch:
+#   1. one hash aggregation over (appliance, season, size, month, weekday)
+#      collecting count and the sums every lookup needs (kWh, and the pairwise
+#      temperature/kWh sums behind the correlation); each table is then a
+#      roll-up of that small cube
+#   2. one projection computing all six columns at once, each lookup being a
+#      `choose` on the key's position in its vocabulary, streamed batch by
+#      batch into the output arrays
+# Categorical keys (--compact) enter the plan as their int8 codes. No
+# full-length intermediate is materialized besides the six outputs. The result
+# matches the pandas engine to floating-point summation order; with --compact,
+# Arrow sums the float32 readings in float64, so lookups differ from pandas'
+# float32 means around 1e-7 (bench_pattern_features.py checks it and compares
+# speed and memory).
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.acero as ac
+import pyarrow.compute as pc
+
+TARGET = "Energy Consumption (kWh)"
+TEMP = "Outdoor Temperature (°C)"
+TEMP_APPLIANCES = ["Heater", "Air Conditioning"]
+FEATURE_ENGINES = ["pandas", "arrow"]
+PATTERN_COLUMNS = ["Appliance_Base", "Season_M", "House_F", "Month_M", "Day_M", "Temp_Impact"]
+LOOKUP_NAMES = ["appliance_base", "season_mult", "household_factor", "monthly_mult",
+                "daily_mult", "temp_coeff"]
+
+# lookup table -> (key column, output column, divided by the overall mean)
+LOOKUPS = {
+    "appliance_base": ("Appliance Type", "Appliance_Base", False),
+    "season_mult": ("Season", "Season_M", True),
+    "household_factor": ("Household Size", "House_F", True),
+    "monthly_mult": ("month", "Month_M", True),
+    "daily_mult": ("weekday", "Day_M", True),
+}
+KEYS = [key for key, _, _ in LOOKUPS.values()]
+
+
+# ============================================================
+# 1. PANDAS (EAGER)
+# ============================================================
+def pandas_lookups(df):
+    lookups = {}
+    overall = df[TARGET].mean()
+    for name, (key, _, relative) in LOOKUPS.items():
+        means = df.groupby(key)[TARGET].mean()
+        lookups[name] = (means / overall if relative else means).to_dict()
+
+    lookups["temp_coeff"] = {}
+    for app in TEMP_APPLIANCES:
+        ss = df[df["Appliance Type"] == app]
+        lookups["temp_coeff"][app] = ss[TEMP].corr(ss[TARGET])
+    return lookups
+
+
+def add_pattern_features(d, lookups):
+    """Per-row lookup columns from tables computed on the training frame."""
+    for name, (key, column, _) in LOOKUPS.items():
+        d[column] = d[key].map(lookups[name])
+
+    d["Temp_Impact"] = 0.0
+    for app, coef in lookups["temp_coeff"].items():
+        mask = d["Appliance Type"] == app
+        d.loc[mask, "Temp_Impact"] = d.loc[mask, TEMP] * coef
+    return d
+
+
+# ============================================================
+# 2. ARROW ACERO (LAZY, STREAMING, MULTI-THREADED)
+# ============================================================
+def _plan(table, *nodes):
+    return ac.Declaration.from_sequence(
+        [ac.Declaration("table_source", ac.TableSourceNodeOptions(table)), *nodes])
+
+
+def _cube(table):
+    """Count and sums per (appliance, season, size, month, weekday) in one aggregation."""
+    pair = pc.field(TEMP).is_valid() & pc.field(TARGET).is_valid()
+    t = pc.if_else(pair, pc.field(TEMP).cast(pa.float64()), pa.scalar(None, pa.float64()))
+    e = pc.if_else(pair, pc.field(TARGET).cast(pa.float64()), pa.scalar(None, pa.float64()))
+    columns = {"e": pc.field(TARGET).cast(pa.float64()), "t": t, "pe": e,
+               "tt": pc.multiply(t, t), "ee": pc.multiply(e, e), "te": pc.multiply(t, e)}
+    project = ac.ProjectNodeOptions([pc.field(k) for k in KEYS] + list(columns.values()),
+                                    KEYS + list(columns))
+    aggregates = [("e", "hash_count", None, "n"), ("t", "hash_count", None, "pairs")]
+    aggregates += [(name, "hash_sum", None, f"sum_{name}") for name in columns]
+    return _plan(table, ac.Declaration("project", project),
+                 ac.Declaration("aggregate", ac.AggregateNodeOptions(aggregates, keys=KEYS))
+                 ).to_table(use_threads=True)
+
+
+def _rollup(cube, keys):
+    sums = ["n", "pairs", "sum_e", "sum_t", "sum_pe", "sum_tt", "sum_ee", "sum_te"]
+    rolled = cube.group_by(keys).aggregate([(s, "sum") for s in sums])
+    return rolled.rename_columns([f"{c[:-4]}" if c.endswith("_sum") else c for c in rolled.column_names])
+
+
+def _decoder(key, categories):
+    """Maps a rolled-up key value back to the frame's value (category codes -> categories)."""
+    if key in categories:
+        return lambda code: categories[key][code] if code is not None and code >= 0 else None
+    return lambda value: value
+
+
+def arrow_lookups(table, categories=None):
+    """The same lookup tables as pandas_lookups, from one aggregation over `table`.
+
+    `categories` maps key columns given as category codes to their categories.
+    """
+    categories = categories or {}
+    cube = _cube(table)
+    total = _rollup(cube, [])
+    overall = total["sum_e"][0].as_py() / total["n"][0].as_py()
+
+    lookups = {}
+    for name, (key, _, relative) in LOOKUPS.items():
+        rolled = _rollup(cube, [key]).sort_by(key)
+        means = pc.divide(rolled["sum_e"], pc.cast(rolled["n"], pa.float64())).to_pylist()
+        decode = _decoder(key, categories)
+        # missing keys are dropped, as groupby does
+        lookups[name] = {decode(k): m / overall if relative else m
+                         for k, m in zip(rolled[key].to_pylist(), means) if decode(k) is not None}
+
+    by_app = _rollup(cube, ["Appliance Type"]).to_pydict()
+    decode = _decoder("Appliance Type", categories)
+    stats = {decode(app): i for i, app in enumerate(by_app["Appliance Type"])}
+    lookups["temp_coeff"] = {}
+    for app in TEMP_APPLIANCES:
+        coef = np.nan
+        if app in stats:
+            i = stats[app]
+            n, st, se = by_app["pairs"][i], by_app["sum_t"][i], by_app["sum_pe"][i]
+            if n > 1:
+                # Pearson on centered sums, as Series.corr computes it
+                sxx = by_app["sum_tt"][i] - st * st / n
+                syy = by_app["sum_ee"][i] - se * se / n
+                sxy = by_app["sum_te"][i] - st * se / n
+                coef = sxy / np.sqrt(sxx * syy) if sxx > 0 and syy > 0 else np.nan
+        lookups["temp_coeff"][app] = coef
+    return lookups
+
+
+def _lookup(key, table, mapping, categories):
+    """(position of `key` in `mapping`'s keys, their values as literals) for a `choose` expression."""
+    keys = list(mapping)
+    if key in categories:
+        code = {value: i for i, value in enumerate(categories[key])}
+        keys = [code[k] for k in keys]
+    position = pc.Expression._call("index_in", [pc.field(key)],
+                                   pc.SetLookupOptions(pa.array(keys, table.schema.field(key).type)))
+    return position, [pa.scalar(float(value), pa.float64()) for value in mapping.values()]
+
+
+def arrow_pattern_columns(table, lookups, categories=None):
+    """{column: float64 array} for PATTERN_COLUMNS, computed in one projection over `table`."""
+    categories = categories or {}
+    expressions = []
+    for name, (key, _, _) in LOOKUPS.items():
+        position, values = _lookup(key, table, lookups[name], categories)
+        expressions.append(pc.Expression._call("choose", [position, *values]))
+
+    # Temp_Impact: temperature × the appliance's coefficient, 0 for other appliances
+    apps = list(lookups["appliance_base"])
+    position, _ = _lookup("Appliance Type", table, lookups["appliance_base"], categories)
+    temp = pc.field(TEMP).cast(pa.float64())
+    impact = [pc.multiply(temp, pa.scalar(float(lookups["temp_coeff"][app]), pa.float64()))
+              if app in lookups["temp_coeff"] else pa.scalar(0.0, pa.float64()) for app in apps]
+    expressions.append(pc.Expression._call("choose", [position, *impact]))
+
+    # stream the batches straight into the output arrays (in order: the source is ordered)
+    out = {column: np.empty(table.num_rows) for column in PATTERN_COLUMNS}
+    reader = _plan(table, ac.Declaration("project", ac.ProjectNodeOptions(expressions, PATTERN_COLUMNS))
+                   ).to_reader(use_threads=True)
+    offset = 0
+    for batch in reader:
+        for column, values in zip(PATTERN_COLUMNS, batch.columns):
+            out[column][offset:offset + len(batch)] = values.to_numpy(zero_copy_only=False)
+        offset += len(batch)
+    return out
+
+
+# ============================================================
+# 3. ENTRY POINT
+# ============================================================
+def build_pattern_features(df, engine="pandas"):
+    """Add PATTERN_COLUMNS to `df`; returns (df, lookups) with the LOOKUP_NAMES tables."""
+    if engine == "pandas":
+        lookups = pandas_lookups(df)
+        return add_pattern_features(df, lookups), lookups
+
+    # categorical keys (--compact) enter the plan as their int8 codes: no strings to hash
+    categories = {key: list(df[key].cat.categories) for key in KEYS
+                  if isinstance(df[key].dtype, pd.CategoricalDtype)}
+    table = pa.table({column: df[column].cat.codes if column in categories else df[column]
+                      for column in KEYS + [TARGET, TEMP]})
+    lookups = arrow_lookups(table, categories)
+    for column, values in arrow_pattern_columns(table, lookups, categories).items():
+        df[column] = pd.Series(values, index=df.index, copy=False)  # a bare array would be copied
+    return df, lookups
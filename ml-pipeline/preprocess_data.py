@@ -1,44 +1,24 @@
 # -----------------------------
 # 📌 Data Preprocessing
 # -----------------------------
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
+from features import load_features, add_season_dummies, add_ingest_args
+from instrument import StageRecorder, add_instrument_args
 
-# Load dataset
-data = pd.read_csv("smart_home_energy_consumption_large.csv")
+parser = add_ingest_args(argparse.ArgumentParser(description="Preprocess smart-home energy data"))
+args = add_instrument_args(parser).parse_args()
+run = StageRecorder("preprocess_data", args)
 
-# Handle missing values
-for col in data.columns:
-    if data[col].dtype in ["int64", "float64"]:
-        data[col].fillna(data[col].median(), inplace=True)
-    else:
-        data[col].fillna(data[col].mode()[0], inplace=True)
+# Load cleaned dataset with time-based features (cached after the first run)
+run.stage("load")
+data = load_features(compact=args.compact, chunksize=args.chunksize)
 
-# Convert datetime column (assuming column name = 'timestamp')
-data['datetime'] = pd.to_datetime(data['Date'] + ' ' + data['Time'])
-
-# Extract time-based features
-data['hour'] = data['datetime'].dt.hour
-data['day'] = data['datetime'].dt.day
-data['month'] = data['datetime'].dt.month
-data['weekday'] = data['datetime'].dt.dayofweek
-data['is_weekend'] = data['weekday'].apply(lambda x: 1 if x >= 5 else 0)
-
-# Season feature (basic categorization)
-def get_season(month):
-    if month in [12, 1, 2]:
-        return 'winter'
-    elif month in [3, 4, 5]:
-        return 'spring'
-    elif month in [6, 7, 8]:
-        return 'summer'
-    else:
-        return 'autumn'
-data['season'] = data['month'].apply(get_season)
-
-# Encode 'season'
-data = pd.get_dummies(data, columns=['season'], drop_first=True)
+# Season feature (basic categorization) + one-hot encoding
+run.stage("season", rows=len(data))
+data = add_season_dummies(data)
 
 # Select relevant features
 features = ['hour', 'day', 'month', 'weekday', 'is_weekend',
@@ -47,7 +27,9 @@ features = ['hour', 'day', 'month', 'weekday', 'is_weekend',
 X = data[features]
 
 # Standardize
+run.stage("scale", rows=len(X))
 scaler = StandardScaler()
 X_scaled = scaler.fit_transform(X)
 
 print("✅ Preprocessing done. Shape:", X_scaled.shape)
+run.done()
@@ -0,0 +1,202 @@
+# -----------------------------
+# 🔁 Recursive Multi-Step Forecasting
+# -----------------------------
+# forecast_energy used to feed the model zeros for lag_1..lag_3, rolling_3/6/12
+# and prob_*. The recursive forecaster instead starts from the last observed
+# readings of every (household, appliance) series and rolls those windows
+# forward with its own predictions, one hourly step at a time. Each step is a
+# single batched ForecastEngine call across all series, so a 168-hour horizon
+# costs 168 predict calls. When the engine carries a multi-quantile model
+# (train_xgboost.py --quantiles), each step also returns its outermost quantiles
+# as predicted_lower_kwh / predicted_upper_kwh, from the same feature matrix.
+#
+# Usage: python recursive_forecast.py [--horizon 168] [--source csv|db]
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from forecast_engine import ForecastEngine
+from clustering import band_features, load_kmeans
+from model_bundle import load_bundle, clustering_state
+
+SERIES_KEYS = ["household_id", "Appliance Type"]
+HISTORY_COLUMNS = ["datetime", "Appliance Type", "Energy Consumption (kWh)",
+                   "Outdoor Temperature (°C)", "Season", "Household Size"]
+WINDOW = 12  # longest rolling window (rolling_12)
+
+
+# ============================================================
+# 1. HISTORY SOURCES
+# ============================================================
+def load_history(path="models/data_with_predictions.csv"):
+    """Readings from the training export; household_id comes from Home ID when present."""
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = HISTORY_COLUMNS + (["Home ID"] if "Home ID" in header else [])
+    df = pd.read_csv(path, usecols=usecols, parse_dates=["datetime"])
+    df["household_id"] = df.pop("Home ID") if "Home ID" in df.columns else 1
+    return df
+
+
+def load_history_db(conn, window=WINDOW, household_id=None):
+    """Last `window` readings of every (household, appliance) series from energy_consumption."""
+    query = """
+    SELECT household_id, timestamp, appliance_type, energy_kwh, outdoor_temp, season, household_size
+    FROM (
+        SELECT ec.*, h.household_size,
+               ROW_NUMBER() OVER (PARTITION BY ec.household_id, ec.appliance_type
+                                  ORDER BY ec.timestamp DESC) AS rn
+        FROM energy_consumption ec
+        JOIN households h USING (household_id)
+        WHERE %(household_id)s IS NULL OR ec.household_id = %(household_id)s
+    ) recent
+    WHERE rn <= %(window)s
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(query, {"window": window, "household_id": household_id})
+        rows = cursor.fetchall()
+    df = pd.DataFrame(rows, columns=["household_id", "datetime", "Appliance Type",
+                                     "Energy Consumption (kWh)", "Outdoor Temperature (°C)",
+                                     "Season", "Household Size"])
+    for col in ["Energy Consumption (kWh)", "Outdoor Temperature (°C)"]:
+        df[col] = df[col].astype(float)
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
+
+
+# ============================================================
+# 2. FORECASTER
+# ============================================================
+class RecursiveForecaster:
+    def __init__(self, engine, kmeans_centers, kmeans_mean, kmeans_scale, kmeans_labels):
+        self.engine = engine
+        self.centers = np.asarray(kmeans_centers, dtype=float)
+        self.k_mean = np.asarray(kmeans_mean, dtype=float)
+        self.k_scale = np.asarray(kmeans_scale, dtype=float)
+        self.cluster_label = np.array([kmeans_labels[c] for c in range(len(self.centers))])
+        self.labels = dict(enumerate(self.cluster_label))
+
+    @classmethod
+    def load(cls, models_dir="models"):
+        """From the latest model bundle if it carries the clustering, else from the pickles."""
+        bundle = load_bundle(models_dir)
+        if bundle is not None and bundle["clustering"] is not None:
+            return cls(bundle["engine"], **bundle["clustering"])
+
+        loaded = load_kmeans(models_dir)
+        if loaded is None:
+            raise FileNotFoundError(f"No saved clustering in {models_dir}/ - run train_kmeans.py first")
+        engine = bundle["engine"] if bundle is not None else ForecastEngine.load(models_dir)
+        return cls(engine, **clustering_state(loaded["kmeans_model"], loaded["kmeans_scaler"],
+                                              loaded["kmeans_labels"]))
+
+    def initial_state(self, history):
+        """Per-series exogenous values, the last WINDOW readings (oldest first, NaN-padded
+        on the left for short series) and how many of them are real readings."""
+        history = history.sort_values("datetime", kind="stable")
+        grouped = history.groupby(SERIES_KEYS, sort=True)
+        last = grouped.tail(1).set_index(SERIES_KEYS).sort_index()
+
+        # Position of every reading counted back from the newest one in its series
+        tail = grouped.tail(WINDOW)
+        pos = tail.groupby(SERIES_KEYS).cumcount(ascending=False).to_numpy()
+        series = pd.MultiIndex.from_frame(tail[SERIES_KEYS])
+        row = last.index.get_indexer(series)
+
+        window = np.full((len(last), WINDOW), np.nan)
+        window[row, WINDOW - 1 - pos] = tail["Energy Consumption (kWh)"].to_numpy()
+        count = np.bincount(row, minlength=len(last))
+        return last, window, count
+
+    def cluster_features(self, hour, weekday, energy):
+        """K-means distances and usage label for (hour, weekday, is_weekend, energy) points."""
+        points = np.column_stack([hour, weekday, (weekday >= 5).astype(float), energy])
+        scaled = (points - self.k_mean) / self.k_scale
+        dist = np.sqrt(((scaled[:, None, :] - self.centers[None, :, :]) ** 2).sum(axis=2))
+        return band_features(dist, self.labels), self.cluster_label[dist.argmin(axis=1)]
+
+    def forecast(self, history, horizon=168, start=None):
+        """Hourly forecasts for every series over `horizon` steps after `start`.
+
+        `start` defaults to the hour after the newest reading. Temperature,
+        season and household size are carried forward from each series' last
+        reading. The current reading is unknown at forecast time, so cluster
+        features use lag_1 in its place, and rolling windows end at the
+        previous step. The interval columns are NaN without a quantile model.
+        """
+        last, window, count = self.initial_state(history)
+        if start is None:
+            start = history["datetime"].max().floor("h") + pd.Timedelta(hours=1)
+        steps = pd.date_range(start, periods=horizon, freq="h")
+
+        appliance = last.index.get_level_values("Appliance Type").to_numpy()
+        temp = last["Outdoor Temperature (°C)"].to_numpy(dtype=float)
+        season = last["Season"].to_numpy()
+        house = last["Household Size"].to_numpy()
+        n = len(last)
+
+        out = np.empty((horizon, n))
+        bands = np.full((horizon, n, 2), np.nan)
+        with_bands = self.engine.quantile_model is not None
+        for i, ts in enumerate(steps):
+            hour = np.full(n, ts.hour)
+            weekday = np.full(n, ts.dayofweek)
+            month = np.full(n, ts.month)
+            cluster, usage_label = self.cluster_features(hour, weekday, window[:, -1])
+
+            # Rolling means over the readings a short series really has, as add_lag_features
+            rolling = {f"rolling_{w}": np.nansum(window[:, -w:], axis=1) / np.minimum(count, w)
+                       for w in (3, 6, WINDOW)}
+            X = self.engine.build_features(
+                appliance, temp, season, house, hour, weekday, month, usage_label,
+                lag_1=window[:, -1], lag_2=window[:, -2], lag_3=window[:, -3],
+                **rolling, **cluster)
+            pred = self.engine.predict_features(X)
+            out[i] = pred
+            if with_bands:
+                bands[i] = self.engine.predict_quantiles_features(X)[:, [0, -1]]
+            window[:, :-1] = window[:, 1:]
+            window[:, -1] = pred
+            count = np.minimum(count + 1, WINDOW)
+
+        result = pd.DataFrame({
+            "forecast_timestamp": np.repeat(steps.to_numpy(), n),
+            "predicted_energy_kwh": out.ravel(),
+            "predicted_lower_kwh": bands[:, :, 0].ravel(),
+            "predicted_upper_kwh": bands[:, :, 1].ravel(),
+        })
+        keys = last.index.to_frame(index=False)
+        for col in SERIES_KEYS:
+            result[col] = np.tile(keys[col].to_numpy(), horizon)
+        return result[SERIES_KEYS + ["forecast_timestamp", "predicted_energy_kwh",
+                                     "predicted_lower_kwh", "predicted_upper_kwh"]]
+
+
+# ============================================================
+# 3. CLI
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Recursive multi-step energy forecast")
+    parser.add_argument("--horizon", type=int, default=168, help="hours to forecast (default 168)")
+    parser.add_argument("--source", choices=["csv", "db"], default="csv")
+    parser.add_argument("--history", default="models/data_with_predictions.csv")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--out", default="models/recursive_forecast.csv")
+    args = parser.parse_args()
+
+    if args.source == "db":
+        import psycopg2
+        from db_config import DB_CONFIG
+        with psycopg2.connect(**DB_CONFIG) as conn:
+            history = load_history_db(conn)
+    else:
+        history = load_history(args.history)
+
+    forecaster = RecursiveForecaster.load(args.models)
+    forecast = forecaster.forecast(history, horizon=args.horizon)
+    forecast.to_csv(args.out, index=False)
+    print(f"✅ {len(forecast)} forecasts ({args.horizon} steps) saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
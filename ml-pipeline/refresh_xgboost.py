@@ -0,0 +1,261 @@
+# -----------------------------
+# 🔄 Incremental XGBoost Refresh - nightly delta instead of a full retrain
+# -----------------------------
+# train_xgboost.py tunes from scratch and refits on the whole history. When
+# only a day of readings is new, this script refreshes the latest model bundle
+# at a cost that follows the size of the delta:
+#
+#   1. features for the new readings only: encoders, pattern lookups and the
+#      K-Means state come from the bundle, lag/rolling windows continue from the
+#      per-series tail train_xgboost.py saved (models/series_tail.arrow)
+#   2. drift check: the current model's MAE on the new readings (which it has
+#      never seen) against the test MAE it was trained with
+#   3. below --drift-threshold, boosting continues: up to --rounds trees are
+#      added on the earlier 80% of the delta, with early stopping on the latest
+#      20%. The result is saved as a new bundle only if it beats the current model there
+#   4. above it, a full retrain on --history plus the delta, with an Optuna
+#      study seeded from the previous study's best parameter sets (tuning.py)
+#      and --retune-trials trials. train_xgboost.py always writes to ./models,
+#      so a retune is refused for any other --models. Per-segment models are
+#      retrained with the segmentation in models/segments/index.json; the
+#      retrain runs with train_xgboost.py's default --matrix and --workers
+#
+# The scalers, encoders, pattern lookups and clustering are kept as trained,
+# so the model keeps seeing the inputs it learned on. A multi-quantile model
+# and per-segment models are carried over unchanged.
+#
+# Usage: python refresh_xgboost.py --new todays_readings.csv [--rounds 100]
+#        [--drift-threshold 0.25] [--history smart_home_energy_consumption_large.csv]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error
+
+from clustering import CLUSTER_FEATURES, band_features, load_kmeans
+from features import (LAGS, RAW_CSV, ROLLING_WINDOWS, SERIES_COLUMNS, SERIES_TAIL_PATH, TARGET,
+                      add_lag_features, build_features, load_series_tail, save_series_tail)
+from instrument import StageRecorder, add_instrument_args
+from model_bundle import clustering_state, load_bundle, save_bundle
+from segments import INDEX_FILE, SEGMENTS_DIR
+from walk_forward import chronological_split
+from xgb_data import booster_params
+
+ROUNDS = 100
+EARLY_STOPPING = 10
+VALID_SHARE = 0.2
+DRIFT_THRESHOLD = 0.25  # relative MAE increase on the delta that triggers a full retune
+RETUNE_TRIALS = 10
+LAG_COLUMNS = [f"lag_{n}" for n in LAGS] + [f"rolling_{w}" for w in ROLLING_WINDOWS]
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ============================================================
+# 1. DELTA FEATURES
+# ============================================================
+def new_readings(delta, tail, keys):
+    """Delta readings the tail does not hold yet, so a retried run adds nothing twice.
+
+    Repeats of a (series, datetime) are dropped, and so is every reading at or
+    before its series' last tail reading.
+    """
+    delta = delta.drop_duplicates(keys + ["datetime"], keep="last")
+    if tail is None or not len(tail):
+        return delta
+    last = tail.groupby(keys, observed=True)["datetime"].max().rename("_last")
+    seen = delta.join(last, on=keys)["_last"] >= delta["datetime"]
+    return delta[~seen.to_numpy()]
+
+
+def cluster_features(frame, clustering):
+    """prob_* distances and usage label per row, from the bundle's K-Means state."""
+    centers = np.asarray(clustering["kmeans_centers"], dtype=float)
+    scaled = (frame[CLUSTER_FEATURES].to_numpy(dtype=float) - clustering["kmeans_mean"]) / clustering["kmeans_scale"]
+    dist = np.sqrt(((scaled[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2))
+    labels = np.array([clustering["kmeans_labels"][c] for c in range(len(centers))])
+    return band_features(dist, dict(enumerate(labels))), labels[dist.argmin(axis=1)]
+
+
+def delta_features(delta, engine, clustering, tail=None):
+    """(X, y, rows) for the new readings the engine can encode, in series/time order.
+
+    Lag windows run on from `tail`; readings still without lag_3 are dropped,
+    as in training.
+    """
+    keys = [c for c in SERIES_COLUMNS if c in delta.columns]
+    if tail is not None:
+        delta = pd.concat([tail.assign(_new=False), delta.assign(_new=True)], ignore_index=True)
+    else:
+        delta = delta.assign(_new=True)
+    rows = add_lag_features(delta, keys)
+    rows = rows[rows["_new"].to_numpy(dtype=bool)].dropna(subset=LAG_COLUMNS)
+
+    house = rows["Household Size"].to_numpy(dtype=np.int64)
+    known = (rows["Appliance Type"].isin(engine.app_classes) & rows["Season"].isin(engine.season_classes)
+             & (house >= 0) & (house < len(engine.house_f)))
+    known &= ~np.isnan(engine.house_f[np.clip(house, 0, len(engine.house_f) - 1)])
+    if not known.all():
+        print(f"⚠️ Skipping {int((~known).sum())} readings with labels the model was not trained on")
+    rows = rows[known.to_numpy()].reset_index(drop=True)
+
+    cluster, usage_label = cluster_features(rows, clustering)
+    X = engine.build_features(
+        rows["Appliance Type"].to_numpy(), rows["Outdoor Temperature (°C)"].to_numpy(dtype=float),
+        rows["Season"].to_numpy(), rows["Household Size"].to_numpy(), rows["hour"].to_numpy(),
+        rows["weekday"].to_numpy(), rows["month"].to_numpy(), usage_label,
+        **cluster, **{name: rows[name].to_numpy(dtype=float) for name in LAG_COLUMNS})
+    return X, rows[TARGET].to_numpy(dtype=float), rows
+
+
+# ============================================================
+# 2. WARM START
+# ============================================================
+def warm_start(engine, params, X, y, timestamps, rounds=ROUNDS, n_jobs=-1):
+    """Continue boosting the engine's model on (X, y); returns (booster, added, MAE before, after).
+
+    Trees are added on the earlier readings and early-stopped on the latest
+    VALID_SHARE; both MAEs are on those latest readings, in kWh.
+    """
+    model = engine.model
+    booster = model if isinstance(model, xgb.Booster) else model.get_booster()
+    X_scaled = (X - engine.x_mean) / engine.x_scale
+    y_scaled = (y - engine.y_mean) / engine.y_scale
+    train_idx, valid_idx = chronological_split(timestamps, test_size=VALID_SHARE)
+    dtrain = xgb.DMatrix(X_scaled[train_idx], y_scaled[train_idx])
+    dvalid = xgb.DMatrix(X_scaled[valid_idx], y_scaled[valid_idx])
+
+    def valid_mae(b):
+        return mean_absolute_error(y[valid_idx], b.predict(dvalid) * engine.y_scale + engine.y_mean)
+
+    native, _ = booster_params(params, n_jobs)
+    base_rounds = booster.num_boosted_rounds()
+    updated = xgb.train(native, dtrain, num_boost_round=rounds, xgb_model=booster.copy(),
+                        evals=[(dvalid, "valid")], early_stopping_rounds=EARLY_STOPPING,
+                        verbose_eval=False)
+    updated = updated[:updated.best_iteration + 1]
+    return updated, updated.num_boosted_rounds() - base_rounds, valid_mae(booster), valid_mae(updated)
+
+
+# ============================================================
+# 3. CLI
+# ============================================================
+def retune(args, metadata, quantiles):
+    """Full train_xgboost.py run on --history plus the delta, seeded from the bundle's study."""
+    if os.path.abspath(args.models) != os.path.abspath("models"):
+        raise SystemExit(f"❌ A retune retrains into ./models, not {args.models} - "
+                         "run refresh_xgboost.py from the directory whose models/ should be retrained")
+    cmd = [sys.executable, os.path.join(HERE, "train_xgboost.py"), "--csv", args.history, args.new,
+           "--n-trials", str(args.retune_trials)]
+    if metadata.get("study"):
+        cmd += ["--seed-study", metadata["study"]]
+    if quantiles:
+        cmd += ["--quantiles", *map(str, quantiles)]
+    index_path = os.path.join(args.models, SEGMENTS_DIR, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        cmd += ["--segment-by", index["by"]]
+        if index.get("households"):
+            cmd += ["--household-clusters", str(len(set(index["households"].values())))]
+    print("⚠️ The retrain uses train_xgboost.py's default --matrix and --workers; "
+          "rerun it by hand to change them")
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the XGBoost model from new readings")
+    parser.add_argument("--new", required=True, help="CSV of new readings (Kaggle schema)")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="most trees to add on the delta")
+    parser.add_argument("--drift-threshold", type=float, default=DRIFT_THRESHOLD,
+                        help="relative MAE increase on the delta above which the model is retuned")
+    parser.add_argument("--history", default=RAW_CSV,
+                        help="readings the model was trained on (without the delta), for a retune")
+    parser.add_argument("--retune-trials", type=int, default=RETUNE_TRIALS)
+    args = add_instrument_args(parser).parse_args()
+    run = StageRecorder("refresh_xgboost", args)
+
+    run.stage("load")
+    bundle = load_bundle(args.models)
+    if bundle is None:
+        raise SystemExit("❌ No model bundle - run train_xgboost.py first")
+    engine, metadata = bundle["engine"], bundle["manifest"]["metadata"]
+    clustering = bundle["clustering"]
+    if clustering is None:
+        loaded = load_kmeans(args.models)
+        if loaded is None:
+            raise SystemExit("❌ No saved clustering - run train_kmeans.py first")
+        clustering = clustering_state(loaded["kmeans_model"], loaded["kmeans_scaler"], loaded["kmeans_labels"])
+    tail_path = os.path.join(args.models, os.path.basename(SERIES_TAIL_PATH))
+    tail = load_series_tail(tail_path)
+    if tail is None:
+        print("⚠️ No series tail (models/series_tail.arrow) - lag windows start with the new readings")
+
+    delta = build_features(args.new)
+    keys = [c for c in SERIES_COLUMNS if c in delta.columns]
+    if tail is not None:
+        tail = tail.drop_duplicates(keys + ["datetime"], keep="last")
+    fresh = new_readings(delta, tail, keys)
+    if len(fresh) < len(delta):
+        print(f"⏭️ Skipping {len(delta) - len(fresh)} readings already in the series tail or repeated")
+    delta = fresh
+    if not len(delta):
+        print("✅ No readings newer than the series tail - nothing to refresh")
+        run.done()
+        return
+    print(f"📥 {len(delta)} new readings, bundle {bundle['version']}")
+    run.rows(len(delta))
+
+    # 1️⃣ Features for the new readings only
+    run.stage("features", rows=len(delta))
+    X, y, rows = delta_features(delta, engine, clustering, tail)
+    if not len(X):
+        raise SystemExit("❌ No new readings with complete lag features")
+
+    # 2️⃣ How well does the current model predict readings it has never seen?
+    run.stage("drift", rows=len(X))
+    delta_mae = mean_absolute_error(y, engine.predict_features(X))
+    reference = metadata.get("reference_mae", metadata["mae"])
+    drift = delta_mae / reference - 1
+    print(f"📐 MAE on the delta {delta_mae:.4f} kWh vs {reference:.4f} kWh at training ({drift:+.1%})")
+
+    if drift > args.drift_threshold:
+        # 3️⃣b Drifted: full retrain, trying the previous study's best parameters first
+        print(f"📉 Drift above {args.drift_threshold:.0%} - retuning on {args.history} + {args.new} "
+              f"({args.retune_trials} trials)")
+        run.stage("retune")
+        retune(args, metadata, engine.quantiles)
+        run.done()
+        return
+
+    # 3️⃣a Continue boosting the current model on the delta
+    run.stage("warm_start", rows=len(X))
+    booster, added, before, after = warm_start(engine, metadata["best_params"], X, y,
+                                               rows["datetime"].to_numpy(), rounds=args.rounds)
+    print(f"🌲 {added} tree(s) added: MAE on the latest {VALID_SHARE:.0%} of the delta "
+          f"{before:.4f} -> {after:.4f} kWh")
+
+    run.stage("save")
+    if added and after < before:
+        engine._set_model(booster)
+        refresh = {"parent": bundle["version"], "rows": len(X), "trees_added": added, "delta_mae": delta_mae,
+                   "drift": drift, "valid_mae_before": before, "valid_mae_after": after}
+        version = save_bundle(engine, args.models, clustering,
+                              {**metadata, "reference_mae": reference, "refresh": refresh})
+        print(f"📦 Refreshed bundle {version} saved to {args.models}/bundles/")
+    else:
+        print("✅ No improvement on the new readings - current bundle kept")
+
+    # The series tail always moves on, so the next delta continues from these readings
+    new_tail = delta[keys + ["datetime", TARGET]]
+    save_series_tail(new_tail if tail is None else pd.concat([tail, new_tail], ignore_index=True), tail_path)
+    run.done()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# -----------------------------
+# 🧮 Rollups - hourly, daily and hour-of-day summaries the dashboard reads
+# -----------------------------
+# Each rollup holds, per household, key, appliance and usage_label, the reading
+# count and the kWh and cost totals, so every average the API reports is
+# total / count and stays exact as rows are added:
+#   energy_hourly        key = the hour the reading falls in
+#   energy_daily         key = the day
+#   energy_hour_profile  key = hour of day (0-23) over all history, for the
+#                        peak-hours view, which would otherwise still scan
+#                        every hourly bucket
+#
+# They are maintained by the pipeline rather than as continuous aggregates:
+#   - bulk_load.py folds the readings it actually inserted into every rollup
+#     inside the same transaction (fold_cte), so a load touches only the
+#     buckets it loaded and the dashboard never sees readings without them;
+#     backend/routes/upload.js folds its inserted readings the same way
+#   - refresh_rollups() recomputes the hourly and daily buckets of a time range
+#     from energy_consumption, and the profile from energy_hourly; it backfills
+#     an existing database and repairs the rollups after readings were
+#     relabelled (update_kmeans.py --db)
+# Readings without a usage_label are not rolled up, as for usage_patterns.
+import psycopg2
+
+# table -> (key column, key type, key expression over a reading's timestamp)
+ROLLUPS = {
+    "energy_hourly": ("bucket", "TIMESTAMP", "date_trunc('hour', timestamp)"),
+    "energy_daily": ("bucket", "TIMESTAMP", "date_trunc('day', timestamp)"),
+    "energy_hour_profile": ("hour", "INTEGER", "EXTRACT(HOUR FROM timestamp)::int"),
+}
+TIME_BUCKETED = ["energy_hourly", "energy_daily"]
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    household_id INTEGER NOT NULL REFERENCES households(household_id),
+    {key} {key_type} NOT NULL,
+    appliance_type VARCHAR(50) NOT NULL,
+    usage_label VARCHAR(20) NOT NULL,
+    reading_count INTEGER NOT NULL,
+    total_kwh DECIMAL(14, 4) NOT NULL,
+    total_cost DECIMAL(14, 2) NOT NULL,
+    PRIMARY KEY (household_id, {key}, appliance_type, usage_label)
+)
+"""
+
+FOLD_CTE = """{table}_fold AS (
+    INSERT INTO {table} AS r
+        (household_id, {key}, appliance_type, usage_label, reading_count, total_kwh, total_cost)
+    SELECT household_id, {expr}, appliance_type, usage_label,
+           COUNT(*), SUM(energy_kwh), COALESCE(SUM(cost_usd), 0)
+    FROM {source}
+    WHERE usage_label IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (household_id, {key}, appliance_type, usage_label) DO UPDATE
+    SET reading_count = r.reading_count + EXCLUDED.reading_count,
+        total_kwh = r.total_kwh + EXCLUDED.total_kwh,
+        total_cost = r.total_cost + EXCLUDED.total_cost
+)"""
+
+# %(start)s / %(end)s may be NULL for an open-ended range
+RANGE_FILTER = """(%(start)s::timestamp IS NULL OR {column} >= date_trunc('day', %(start)s::timestamp))
+  AND (%(end)s::timestamp IS NULL OR {column} < date_trunc('day', %(end)s::timestamp) + INTERVAL '1 day')"""
+
+REFRESH_DELETE = "DELETE FROM {table} WHERE " + RANGE_FILTER.format(column="bucket")
+
+RECOMPUTE = """
+SELECT household_id, {expr}, appliance_type, usage_label,
+       COUNT(*), SUM(energy_kwh), COALESCE(SUM(cost_usd), 0)
+FROM energy_consumption
+WHERE usage_label IS NOT NULL
+  AND """ + RANGE_FILTER.format(column="timestamp") + """
+GROUP BY 1, 2, 3, 4
+"""
+
+REFRESH_INSERT = """
+INSERT INTO {table}
+    (household_id, bucket, appliance_type, usage_label, reading_count, total_kwh, total_cost)"""
+
+PROFILE_REBUILD = """
+INSERT INTO energy_hour_profile
+    (household_id, hour, appliance_type, usage_label, reading_count, total_kwh, total_cost)
+SELECT household_id, EXTRACT(HOUR FROM bucket)::int, appliance_type, usage_label,
+       SUM(reading_count), SUM(total_kwh), SUM(total_cost)
+FROM energy_hourly
+GROUP BY 1, 2, 3, 4
+"""
+
+
+def fold_cte(source="inserted"):
+    """WITH-clause entries that add the readings in CTE `source` to every rollup."""
+    return ",\n".join(FOLD_CTE.format(table=table, key=key, expr=expr, source=source)
+                      for table, (key, _, expr) in ROLLUPS.items())
+
+
+def recompute_sql(table, start=None, end=None):
+    """(query, params) computing `table`'s rows for a day range straight from energy_consumption."""
+    return RECOMPUTE.format(expr=ROLLUPS[table][2]), {"start": start, "end": end}
+
+
+def refresh_rollups(cursor, start=None, end=None):
+    """Recompute the rollups for the days from `start` to `end` (inclusive; None = open).
+
+    The hourly and daily buckets in the range are rebuilt from the readings and
+    the hour-of-day profile from energy_hourly. Runs on the caller's cursor so
+    it commits with the change that made it necessary. Returns {table: rows written}.
+    """
+    written = {}
+    for table in TIME_BUCKETED:
+        query, params = recompute_sql(table, start, end)
+        cursor.execute(REFRESH_DELETE.format(table=table), params)
+        cursor.execute(REFRESH_INSERT.format(table=table) + query, params)
+        written[table] = cursor.rowcount
+    cursor.execute("DELETE FROM energy_hour_profile")
+    cursor.execute(PROFILE_REBUILD)
+    written["energy_hour_profile"] = cursor.rowcount
+    return written
+
+
+def ensure_rollups(connect_kwargs):
+    """Create missing rollup tables and backfill empty ones from energy_consumption.
+
+    Databases created from an older database/schema.sql get the tables on the
+    first populate_database.py run. Returns {table: rows backfilled}.
+    """
+    with psycopg2.connect(**connect_kwargs) as conn, conn.cursor() as cursor:
+        for table, (key, key_type, _) in ROLLUPS.items():
+            cursor.execute(ROLLUP_DDL.format(table=table, key=key, key_type=key_type))
+        cursor.execute("SELECT " + ", ".join(f"EXISTS (SELECT 1 FROM {table})" for table in ROLLUPS)
+                       + ", EXISTS (SELECT 1 FROM energy_consumption)")
+        *filled, has_readings = cursor.fetchone()
+        backfilled = {}
+        if has_readings and not all(filled):
+            backfilled = refresh_rollups(cursor)
+    conn.close()
+    return backfilled
@@ -0,0 +1,278 @@
+# -----------------------------
+# 🧭 Pipeline Runner - dependency graph with cached, concurrent stages
+# -----------------------------
+# One entry point for the README sequence. Each stage declares the stages it
+# needs, the files it reads and the files it writes:
+#
+#   features   preprocess_data.py   raw CSV                 -> feature cache
+#   kmeans     train_kmeans.py      raw CSV, feature cache  -> kmeans_*.pkl, data_with_clusters.csv
+#   xgboost    train_xgboost.py     raw CSV, feature cache,
+#                                   kmeans_*.pkl (unless --refit-kmeans)
+#                                                           -> bundle, data_with_predictions.csv
+#   populate   populate_database.py data_with_predictions.csv -> database
+#
+# A stage's key is a hash of its command line, its code (the script plus every
+# ml-pipeline module it imports, followed transitively) and the content of its
+# input files. The key and the digests of its outputs are kept in
+# models/pipeline_state.json; a stage is skipped when its key is unchanged and
+# its outputs are still there, unmodified. Because downstream keys hash the
+# upstream *outputs*, a rerun that reproduces the same bytes stops the cascade.
+# File digests are remembered per (size, mtime), so unchanged inputs are not
+# re-read.
+#
+# Stages whose needs are met run concurrently (--jobs); with --refit-kmeans,
+# xgboost no longer waits for kmeans. Each stage logs to models/logs/<stage>.log
+# and writes its stage report to models/reports/ (instrument.py).
+#
+# The raw CSV is a source input: fetch it with download_dataset.py or create it
+# with generate_dataset.py first.
+#
+# Usage: python run_pipeline.py [kmeans xgboost ...] [--jobs 2] [--force xgboost|all]
+#                               [--dry-run] [--refit-kmeans] [--dsn "host=..."]
+import argparse
+import ast
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from features import RAW_CSV, SERIES_TAIL_PATH, cache_path, file_hash
+from clustering import KMEANS_ARTIFACTS
+from walk_forward import METRICS_PATH
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = "models/pipeline_state.json"
+LOG_DIR = "models/logs"
+STAGES = ["features", "kmeans", "xgboost", "populate"]
+KMEANS_FILES = [f"models/{name}.pkl" for name in KMEANS_ARTIFACTS]
+PREDICTIONS_CSV = "models/data_with_predictions.csv"
+
+
+class Stage:
+    def __init__(self, name, script, args=(), needs=(), inputs=(), outputs=()):
+        self.name, self.script, self.args = name, script, list(args)
+        self.needs, self.inputs, self.outputs = list(needs), list(inputs), list(outputs)
+
+
+def build_graph(args, raw_digest):
+    """The pipeline stages for these options, in dependency order."""
+    ingest = ["--compact"] if args.compact else []
+    features_cache = cache_path(RAW_CSV, compact=args.compact, digest=raw_digest)
+
+    kmeans_args = [*ingest, *(["--large"] if args.large else [])]
+    xgb_args = [*ingest, "--n-trials", str(args.n_trials), "--workers", str(args.workers),
+                "--folds", str(args.folds), *(["--refit-kmeans"] if args.refit_kmeans else []),
+                *(["--segment-by", args.segment_by] if args.segment_by else []),
+                *(["--feature-engine", args.feature_engine] if args.feature_engine != "pandas" else [])]
+    xgb_outputs = ["models/bundles/LATEST", PREDICTIONS_CSV, SERIES_TAIL_PATH,
+                   *([METRICS_PATH] if args.folds else []),
+                   *(["models/segments/index.json"] if args.segment_by else [])]
+    populate_args = ["--csv", PREDICTIONS_CSV, *(["--dsn", args.dsn] if args.dsn else [])]
+
+    return {stage.name: stage for stage in [
+        Stage("features", "preprocess_data.py", ingest, inputs=[RAW_CSV], outputs=[features_cache]),
+        Stage("kmeans", "train_kmeans.py", kmeans_args, needs=["features"],
+              inputs=[RAW_CSV, features_cache],
+              outputs=[*KMEANS_FILES, "models/data_with_clusters.csv"]),
+        Stage("xgboost", "train_xgboost.py", xgb_args,
+              needs=["features"] if args.refit_kmeans else ["features", "kmeans"],
+              inputs=[RAW_CSV, features_cache, *([] if args.refit_kmeans else KMEANS_FILES)],
+              outputs=xgb_outputs),
+        Stage("populate", "populate_database.py", populate_args, needs=["xgboost"],
+              inputs=[PREDICTIONS_CSV]),
+    ]}
+
+
+def local_imports(script, seen=None):
+    """File names of `script` and every ml-pipeline module it imports, transitively."""
+    seen = set() if seen is None else seen
+    if script in seen:
+        return seen
+    seen.add(script)
+    with open(os.path.join(HERE, script)) as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            module = name.split(".")[0] + ".py"
+            if os.path.exists(os.path.join(HERE, module)):
+                local_imports(module, seen)
+    return seen
+
+
+class State:
+    """models/pipeline_state.json: stage keys and output digests, plus a digest memo per file."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.data = {"files": {}, "stages": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def digest(self, path):
+        """Content digest of `path` (None if missing), reused while size and mtime are unchanged."""
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        memo = self.data["files"].get(path)
+        if memo and memo[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return memo[2]
+        digest = file_hash(path)
+        self.data["files"][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def stage_key(stage, state):
+    """Hash of everything that determines the stage's outputs."""
+    code = {name: file_hash(os.path.join(HERE, name)) for name in sorted(local_imports(stage.script))}
+    inputs = {path: state.digest(path) for path in stage.inputs}
+    payload = json.dumps({"args": stage.args, "code": code, "inputs": inputs}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def is_fresh(stage, key, state):
+    recorded = state.data["stages"].get(stage.name)
+    return (recorded is not None and recorded["key"] == key
+            and all(state.digest(path) == recorded["outputs"].get(path) for path in stage.outputs))
+
+
+def run_stage(stage):
+    """Run the stage's script with its log in models/logs/; returns (exit code, wall seconds)."""
+    start = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{stage.name}.log"), "w") as log:
+        code = subprocess.call([sys.executable, os.path.join(HERE, stage.script), *stage.args],
+                               stdout=log, stderr=subprocess.STDOUT)
+    return code, time.perf_counter() - start
+
+
+def with_needs(graph, targets):
+    """`targets` plus everything they depend on, in pipeline order."""
+    wanted, stack = set(), list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in wanted:
+            wanted.add(name)
+            stack.extend(graph[name].needs)
+    return [name for name in graph if name in wanted]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ml-pipeline stages that are out of date")
+    parser.add_argument("targets", nargs="*", metavar="STAGE",
+                        help=f"stages to bring up to date with their dependencies: {', '.join(STAGES)} (default: all)")
+    parser.add_argument("--jobs", type=int, default=2, help="stages run at the same time")
+    parser.add_argument("--force", nargs="+", default=[], choices=["all", *STAGES],
+                        help="rerun these stages even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="show what would run and why")
+    parser.add_argument("--compact", action="store_true", help="pass --compact to the pipeline scripts")
+    parser.add_argument("--large", action="store_true", help="pass --large to train_kmeans.py")
+    parser.add_argument("--refit-kmeans", action="store_true",
+                        help="train_xgboost fits its own K-Means, so it runs alongside train_kmeans")
+    parser.add_argument("--n-trials", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--segment-by", choices=["appliance", "household_cluster"], default=None)
+    parser.add_argument("--feature-engine", choices=["pandas", "arrow"], default="pandas")
+    parser.add_argument("--dsn", default=None, help="libpq connection string for populate_database.py")
+    args = parser.parse_args()
+    unknown = set(args.targets) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    if not os.path.exists(RAW_CSV):
+        raise SystemExit(f"❌ {RAW_CSV} not found - run download_dataset.py or generate_dataset.py first")
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    state = State()
+    graph = build_graph(args, state.digest(RAW_CSV))
+    order = with_needs(graph, args.targets or STAGES)
+    forced = set(STAGES if "all" in args.force else args.force)
+
+    print("=" * 60)
+    print(f"🧭 PIPELINE: {' -> '.join(order)} ({args.jobs} jobs)")
+    print("=" * 60)
+
+    status = {}  # name -> skipped / done / failed / blocked / (dry run) stale
+    running = {}
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while len(status) < len(order):
+            for name in order:
+                stage = graph[name]
+                if name in status or name in running.values():
+                    continue
+                needs = [status.get(need) for need in stage.needs if need in order]
+                if any(s in ("failed", "blocked") for s in needs):
+                    status[name] = "blocked"
+                    print(f"⛔ {name}: not run, a stage it needs failed")
+                    continue
+                if any(s is None for s in needs):
+                    continue
+                if args.dry_run and "stale" in needs:
+                    status[name] = "stale"
+                    print(f"🔸 {name}: would run if its upstream outputs change")
+                    continue
+                key = stage_key(stage, state)
+                if name not in forced and is_fresh(stage, key, state):
+                    status[name] = "skipped"
+                    print(f"⏭️ {name}: up to date")
+                    continue
+                reason = "forced" if name in forced else "inputs, code or parameters changed"
+                if args.dry_run:
+                    status[name] = "stale"
+                    print(f"🔸 {name}: would run ({reason})")
+                    continue
+                print(f"▶️ {name}: {stage.script} {' '.join(stage.args)} ({reason})")
+                stage.key = key
+                running[pool.submit(run_stage, stage)] = name
+
+            if not running:
+                continue
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = graph[name]
+                code, wall = future.result()
+                if code == 0:
+                    status[name] = "done"
+                    state.data["stages"][name] = {
+                        "key": stage.key,
+                        "outputs": {path: state.digest(path) for path in stage.outputs},
+                        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "wall_s": round(wall, 2),
+                    }
+                    state.save()
+                    print(f"✅ {name}: done in {wall:.1f}s")
+                else:
+                    status[name] = "failed"
+                    log = os.path.join(LOG_DIR, f"{name}.log")
+                    print(f"❌ {name}: exit {code} after {wall:.1f}s, last lines of {log}:")
+                    with open(log) as f:
+                        print("".join("   " + line for line in f.readlines()[-10:]), end="")
+    if not args.dry_run:
+        state.save()
+
+    counts = {s: sum(v == s for v in status.values()) for s in ("done", "skipped", "failed", "blocked")}
+    print(f"\n🏁 {counts['done']} run, {counts['skipped']} up to date, "
+          f"{counts['failed'] + counts['blocked']} failed or blocked in {time.perf_counter() - start:.1f}s")
+    if counts["failed"] or counts["blocked"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# -----------------------------
+# 🧩 Per-Segment Models - one forecaster per appliance or household cluster
+# -----------------------------
+# train_xgboost.py --segment-by appliance|household_cluster trains, next to the
+# global model, one XGBoost model per segment with the tuned global parameters:
+#   appliance          one model per Appliance Type
+#   household_cluster  homes are clustered on their hour-of-day consumption
+#                      profile and level (K-Means); one model per cluster
+#
+# The feature matrix is reordered once so every segment is a contiguous block
+# in time order and written as .npy files to /dev/shm when it fits (else
+# models/cache/segments). Segment workers are separate processes (like the
+# walk-forward and tuning workers) that memory-map those files read-only, so
+# all of them share one copy of the data in the page cache - nothing is
+# pickled or copied per worker. Each worker holds out the latest 20% of its
+# segment, reports its metrics next to the global model's on the same rows,
+# and saves its model as a bundle (model_bundle.py) under
+#   models/segments/<by>/<segment>/bundles/<version>/
+# models/segments/index.json records the segmentation, every segment's bundle
+# and the household -> cluster map. Segments with fewer than --min-segment-rows
+# readings are not trained and fall back to the global model.
+#
+# SegmentedForecaster is the dispatcher: it routes every (household,
+# appliance) series to its segment's model (or the global one) and forecasts
+# each segment's series in one batch; forecast_service.py uses it whenever an
+# index exists. Household clusters are keyed by Kaggle Home ID, so serving maps
+# each DB household_id to the Home ID it holds (households.home_id, set by
+# bulk_load.py); households without one are served by the global model.
+#
+# Worker entry point (launched by train_segments()):
+#   python segments.py --data DIR --segment I --params JSON --n-jobs J --models DIR
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from walk_forward import chronological_split
+
+SEGMENT_MODES = ["appliance", "household_cluster"]
+SEGMENTS_DIR = "segments"
+INDEX_FILE = "index.json"
+SHARED_DIR = "/dev/shm"
+FALLBACK_DATA_DIR = "models/cache/segments"
+MIN_SEGMENT_ROWS = 500
+HOUSEHOLD_CLUSTERS = 8
+TARGET = "Energy Consumption (kWh)"
+
+
+# ============================================================
+# 1. SEGMENT KEYS
+# ============================================================
+def household_clusters(df, k=HOUSEHOLD_CLUSTERS, household_col="Home ID"):
+    """{household id: cluster} from each home's log level and normalized 24-hour profile."""
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
+    profile = (df.pivot_table(index=household_col, columns="hour", values=TARGET, aggfunc="mean",
+                              observed=True)
+               .reindex(columns=range(24)))
+    profile = profile.T.fillna(profile.mean(axis=1)).T
+    level = profile.mean(axis=1).clip(lower=1e-6)
+    points = np.column_stack([np.log(level), profile.div(level, axis=0)])
+    k = min(k, len(profile))
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+    labels = kmeans.fit_predict(StandardScaler().fit_transform(points))
+    return {int(home): int(c) for home, c in zip(profile.index, labels)}
+
+
+def segment_keys(by, appliance, household=None, households=None):
+    """Segment key of every row; None where a household has no cluster."""
+    if by == "appliance":
+        return np.asarray(appliance, dtype=object)
+    cluster = pd.Series(np.asarray(household)).map(households)
+    return np.array([None if pd.isna(c) else f"cluster_{int(c)}" for c in cluster], dtype=object)
+
+
+def _dirname(key):
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in key)
+
+
+def load_homes(conn):
+    """{household_id: Home ID} for the households bulk_load.py loaded from a Home ID."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT household_id, home_id FROM households WHERE home_id IS NOT NULL")
+        return {int(h): int(home) for h, home in cursor.fetchall()}
+
+
+# ============================================================
+# 2. PARALLEL TRAINING
+# ============================================================
+def _data_dir(nbytes):
+    """A fresh directory in shared memory if the arrays fit there, else under models/cache/."""
+    if os.path.isdir(SHARED_DIR) and shutil.disk_usage(SHARED_DIR).free > 2 * nbytes:
+        return os.path.join(SHARED_DIR, f"ieoms-segments-{os.getpid()}")
+    return FALLBACK_DATA_DIR
+
+
+def train_segments(X, y, timestamps, keys, params, by, models_dir="models", workers=None,
+                   min_rows=MIN_SEGMENT_ROWS, households=None):
+    """Train one model per segment key in parallel workers; returns per-segment metrics.
+
+    `X` holds the raw (unscaled) FEATURES, `keys` the segment of every row.
+    The global bundle in `models_dir` must already exist: segment bundles
+    reuse its encoders, lookup tables and clustering state.
+    """
+    keys = np.asarray(keys, dtype=object)
+    valid = np.array([k is not None for k in keys])
+    names, counts = np.unique(keys[valid].astype(str), return_counts=True)
+    trained = [str(name) for name, count in zip(names, counts) if count >= min_rows]
+    skipped = {str(name): int(count) for name, count in zip(names, counts) if count < min_rows}
+
+    # Rows of trained segments, grouped by segment and in time order within each
+    code = pd.Categorical(keys, categories=trained).codes
+    ts = np.asarray(timestamps, dtype="datetime64[ns]")
+    order = np.lexsort((ts, code))
+    order = order[code[order] >= 0]
+    offsets = np.searchsorted(code[order], np.arange(len(trained) + 1))
+
+    X = np.asarray(X, dtype=np.float64)
+    data_dir = _data_dir(len(order) * (X.shape[1] + 2) * 8)
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        np.save(os.path.join(data_dir, "X.npy"), X[order])
+        np.save(os.path.join(data_dir, "y.npy"), np.asarray(y, dtype=np.float64)[order])
+        np.save(os.path.join(data_dir, "timestamps.npy"), ts[order])
+        with open(os.path.join(data_dir, "segments.json"), "w") as f:
+            json.dump({"by": by, "keys": trained, "offsets": offsets.tolist()}, f)
+
+        workers = min(workers or os.cpu_count() or 1, max(len(trained), 1))
+        n_jobs = max(1, (os.cpu_count() or 1) // workers)
+        cmd = [sys.executable, os.path.abspath(__file__), "--data", data_dir,
+               "--params", json.dumps(params), "--n-jobs", str(n_jobs), "--models", models_dir]
+
+        def run(i):
+            proc = subprocess.run(cmd + ["--segment", str(i)], capture_output=True, text=True)
+            if proc.returncode:
+                raise RuntimeError(f"Segment worker for {trained[i]} failed:\n{proc.stderr[-2000:]}")
+            return json.loads(proc.stdout.strip().splitlines()[-1])
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, range(len(trained))))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    from model_bundle import latest_version
+    index = {
+        "by": by,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "global_version": latest_version(models_dir),
+        "params": params,
+        "segments": {r["segment"]: {k: v for k, v in r.items() if k != "segment"} for r in results},
+        "skipped": skipped,
+        "households": {str(h): c for h, c in (households or {}).items()},
+    }
+    root = os.path.join(models_dir, SEGMENTS_DIR)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, INDEX_FILE + ".tmp"), "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(os.path.join(root, INDEX_FILE + ".tmp"), os.path.join(root, INDEX_FILE))
+    return pd.DataFrame(results)
+
+
+def train_one(data_dir, segment, params, n_jobs, models_dir):
+    """Fit segment `segment` from the shared arrays and save it as a bundle; returns its metrics."""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    from xgboost import XGBRegressor
+    from forecast_engine import ENGINE_ARRAYS, ENGINE_VOCABS, ForecastEngine
+    from model_bundle import load_bundle, save_bundle
+
+    with open(os.path.join(data_dir, "segments.json")) as f:
+        layout = json.load(f)
+    key = layout["keys"][segment]
+    start, stop = layout["offsets"][segment], layout["offsets"][segment + 1]
+    X, y, ts = (np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")[start:stop]
+                for name in ["X", "y", "timestamps"])
+
+    train_idx, test_idx = chronological_split(ts, test_size=0.2)
+    x_mean, x_scale = X[train_idx].mean(axis=0), X[train_idx].std(axis=0)
+    x_scale[x_scale == 0] = 1.0
+    y_mean, y_scale = y[train_idx].mean(), y[train_idx].std() or 1.0
+
+    model = XGBRegressor(**params, random_state=42, n_jobs=n_jobs)
+    model.fit((X[train_idx] - x_mean) / x_scale, (y[train_idx] - y_mean) / y_scale)
+    pred = model.predict((X[test_idx] - x_mean) / x_scale) * y_scale + y_mean
+
+    base = load_bundle(models_dir)
+    global_pred = base["engine"].predict_features(X[test_idx])
+    arrays = {name: getattr(base["engine"], name) for name in ENGINE_ARRAYS}
+    arrays.update(x_mean=x_mean, x_scale=x_scale)
+    vocabs = {name: list(getattr(base["engine"], name)) for name in ENGINE_VOCABS}
+    engine = ForecastEngine.from_arrays(model, arrays, vocabs, y_mean, y_scale)
+
+    y_test = y[test_idx]
+    metrics = {
+        "rows": int(stop - start),
+        "r2": float(r2_score(y_test, pred)),
+        "mae": float(mean_absolute_error(y_test, pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, pred))),
+        "global_mae": float(mean_absolute_error(y_test, global_pred)),
+    }
+    seg_dir = os.path.join(models_dir, SEGMENTS_DIR, layout["by"], _dirname(key))
+    version = save_bundle(engine, seg_dir, base["clustering"],
+                          {"segment_by": layout["by"], "segment": key, **metrics})
+    return {"segment": key, "models_dir": os.path.relpath(seg_dir, models_dir),
+            "version": version, **metrics}
+
+
+# ============================================================
+# 3. DISPATCHER
+# ============================================================
+class SegmentedForecaster:
+    """Routes each (household, appliance) series to its segment's model, else the global one."""
+
+    def __init__(self, index, forecasters, fallback, homes=None):
+        """`homes`: {household_id: Home ID} (load_homes); needed to route household clusters."""
+        self.by = index["by"]
+        self.households = {int(h): c for h, c in index.get("households", {}).items()}
+        self.homes = homes or {}
+        self.forecasters = forecasters
+        self.fallback = fallback
+        self.engine = fallback.engine  # vocabularies are shared by every segment
+
+    @classmethod
+    def load(cls, models_dir="models"):
+        """The segmented forecaster if models/segments/index.json exists, else the global one."""
+        from recursive_forecast import RecursiveForecaster
+
+        fallback = RecursiveForecaster.load(models_dir)
+        path = os.path.join(models_dir, SEGMENTS_DIR, INDEX_FILE)
+        if not os.path.exists(path):
+            return fallback
+        with open(path) as f:
+            index = json.load(f)
+        forecasters = {key: RecursiveForecaster.load(os.path.join(models_dir, entry["models_dir"]))
+                       for key, entry in index["segments"].items()}
+        return cls(index, forecasters, fallback)
+
+    def route(self, household_id, appliance):
+        """Segment key serving each (household, appliance) pair; None = global model.
+
+        Household clusters only route households whose Home ID is known, so a
+        household_id that is not a Home ID is never sent to some home's cluster.
+        """
+        home = pd.Series(np.asarray(household_id)).map(self.homes).to_numpy()
+        keys = segment_keys(self.by, appliance, home, self.households)
+        return np.array([k if k in self.forecasters else None for k in keys], dtype=object)
+
+    def forecaster_for(self, household_id, appliance):
+        key = self.route([household_id], [appliance])[0]
+        return self.forecasters[key] if key is not None else self.fallback
+
+    def forecast(self, history, horizon=168, start=None):
+        """RecursiveForecaster.forecast, with each segment's series predicted by its own model."""
+        if start is None:
+            start = history["datetime"].max().floor("h") + pd.Timedelta(hours=1)
+        keys = self.route(history["household_id"].to_numpy(), history["Appliance Type"].to_numpy())
+        keys = pd.Series(keys, index=history.index).fillna("")
+        parts = []
+        for key, rows in history.groupby(keys.to_numpy(), sort=True):
+            forecaster = self.forecasters[key] if key else self.fallback
+            parts.append(forecaster.forecast(rows, horizon=horizon, start=start))
+        result = pd.concat(parts, ignore_index=True)
+        return result.sort_values(["forecast_timestamp", "household_id", "Appliance Type"],
+                                  kind="stable", ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-segment model worker")
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--segment", type=int, required=True)
+    parser.add_argument("--params", required=True, help="XGBRegressor params as JSON")
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--models", default="models")
+    args = parser.parse_args()
+    print(json.dumps(train_one(args.data, args.segment, json.loads(args.params), args.n_jobs,
+                               args.models)))
+
+
+if __name__ == "__main__":
+    main()
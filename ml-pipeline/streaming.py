@@ -0,0 +1,258 @@
+# -----------------------------
+# 🌊 Streaming Inference - next-hour forecasts from live readings, O(1) per reading
+# -----------------------------
+# Readings arrive one at a time. Recomputing train_xgboost.py's lag_1..lag_3 and
+# rolling_3/6/12 with pandas shift/rolling over a series' whole history costs
+# more with every reading. Instead each (household, appliance) series keeps a
+# SeriesState: a fixed ring buffer of its last WINDOW readings plus a running
+# sum per rolling window. A reading updates every window by adding the new value
+# and subtracting the one that falls out, so its cost does not grow with the
+# history. The features equal add_lag_features for the next reading of the series.
+#
+# After every reading the StreamingPredictor forecasts the series' next hour,
+# with the same semantics as RecursiveForecaster:
+#
+#   * K-Means distances (prob_*) and the usage label come from the saved
+#     centroids, with lag_1 standing in for the unknown reading. The hour and
+#     weekday part of each distance is precomputed for all 168 hours of the
+#     week, so only the energy term is evaluated per reading
+#   * temperature, season and household size are carried forward from the reading
+#   * the row goes through LatencyPredictor.predict_one (scalers folded into the
+#     trees, or the compiled export)
+#
+# Forecasts start once a series has max(LAGS) readings. Training drops rows
+# without lag_3, so the model never saw them. Readings must arrive in time order
+# per series. Late readings are counted in `late` and skipped, as are readings
+# without an energy value (NaN or JSON null: `missing`, kept out of the windows)
+# and readings whose appliance or season the model was not trained on
+# (`unknown`, no forecast). On stdin, lines that are not a complete JSON reading
+# are skipped and counted too.
+#
+# Usage: python streaming.py [--csv readings.csv --out models/stream_forecasts.csv]
+#        (without --csv: JSON readings on stdin, one per line, JSON forecasts on stdout)
+import argparse
+import json
+import math
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from features import LAGS, ROLLING_WINDOWS, load_features
+from latency_predictor import LatencyPredictor
+from clustering import band_groups
+from recursive_forecast import RecursiveForecaster
+
+WINDOW = max(max(ROLLING_WINDOWS), max(LAGS))
+RESUM_EVERY = 4096  # re-add the windows from the buffer now and then so float error cannot accumulate
+HOUR = timedelta(hours=1)
+
+Reading = namedtuple("Reading", "household_id appliance timestamp energy temp season house")
+Forecast = namedtuple("Forecast", "household_id appliance forecast_timestamp predicted_energy_kwh")
+
+# JSON reading field -> Reading field (the names forecast_service.py accepts)
+READING_FIELDS = {"household_id": "household_id", "appliance_type": "appliance", "timestamp": "timestamp",
+                  "energy_kwh": "energy", "outdoor_temp": "temp", "season": "season",
+                  "household_size": "house"}
+
+
+# ============================================================
+# 1. ONLINE FEATURE STATE
+# ============================================================
+class SeriesState:
+    """Last WINDOW readings of one series with a running sum per rolling window."""
+    __slots__ = ("buffer", "pos", "count", "sums", "last")
+
+    def __init__(self):
+        self.buffer = [0.0] * WINDOW
+        self.pos = 0  # slot the next reading goes to
+        self.count = 0
+        self.sums = [0.0] * len(ROLLING_WINDOWS)
+        self.last = None
+
+    def push(self, energy):
+        """Add one reading; False (and nothing changes) when energy is NaN."""
+        if energy != energy:
+            return False
+        buffer, pos, count, sums = self.buffer, self.pos, self.count, self.sums
+        for i, w in enumerate(ROLLING_WINDOWS):
+            if count >= w:
+                sums[i] -= buffer[(pos - w) % WINDOW]
+            sums[i] += energy
+        buffer[pos] = energy
+        self.pos = (pos + 1) % WINDOW
+        self.count = count + 1
+        if self.count % RESUM_EVERY == 0:
+            self.sums = [sum(self.buffer[(self.pos - k) % WINDOW] for k in range(1, w + 1))
+                         for w in ROLLING_WINDOWS]
+        return True
+
+    def lag(self, n):
+        return self.buffer[(self.pos - n) % WINDOW] if self.count >= n else math.nan
+
+    def features(self):
+        """lag_N / rolling_N for the series' next reading, as add_lag_features computes them."""
+        history = {f"lag_{n}": self.lag(n) for n in LAGS}
+        for w, total in zip(ROLLING_WINDOWS, self.sums):
+            n = min(self.count, w)
+            history[f"rolling_{w}"] = total / n if n else math.nan
+        return history
+
+
+# ============================================================
+# 2. STREAMING PREDICTOR
+# ============================================================
+class StreamingPredictor:
+    def __init__(self, predictor, kmeans_centers, kmeans_mean, kmeans_scale, kmeans_labels):
+        """`predictor`: a LatencyPredictor. The clustering as in a bundle (clustering_state)."""
+        self.predictor = predictor
+        self.series = {}
+        self.late = self.missing = self.unknown = 0
+
+        centers = np.asarray(kmeans_centers, dtype=float)
+        mean, scale = np.asarray(kmeans_mean, dtype=float), np.asarray(kmeans_scale, dtype=float)
+        self._labels = [kmeans_labels[c] for c in range(len(centers))]
+        self._groups = list(band_groups(dict(enumerate(self._labels))).items())
+        # Squared distance to every center over (hour, weekday, is_weekend) for each hour of the week
+        hour, weekday = np.divmod(np.arange(24 * 7), 7)
+        calendar = (np.column_stack([hour, weekday, weekday >= 5]) - mean[:3]) / scale[:3]
+        self._calendar = (((calendar[:, None, :] - centers[None, :, :3]) ** 2).sum(axis=2)).tolist()
+        self._energy_mean, self._energy_scale = float(mean[3]), float(scale[3])
+        self._energy_centers = centers[:, 3].tolist()
+
+    @classmethod
+    def load(cls, models_dir="models", export=None):
+        """Clustering from the bundle (or pickles); the model from it or from a latency_predictor export."""
+        forecaster = RecursiveForecaster.load(models_dir)
+        predictor = (LatencyPredictor.load_export(export) if export
+                     else LatencyPredictor.from_engine(forecaster.engine))
+        return cls(predictor, forecaster.centers, forecaster.k_mean, forecaster.k_scale,
+                   dict(enumerate(forecaster.cluster_label)))
+
+    def cluster_features(self, hour, weekday, energy):
+        """prob_* distances and usage label for one point, as RecursiveForecaster.cluster_features."""
+        e = (energy - self._energy_mean) / self._energy_scale
+        dist = [math.sqrt(part + (e - c) ** 2)
+                for part, c in zip(self._calendar[hour * 7 + weekday], self._energy_centers)]
+        nearest = dist.index(min(dist))
+        return {name: min(dist[c] for c in clusters) for name, clusters in self._groups}, self._labels[nearest]
+
+    def update(self, household_id, appliance, timestamp, energy, temp, season, house):
+        """Add one reading; returns the series' next-hour Forecast (None while warming up or skipped)."""
+        key = (household_id, appliance)
+        state = self.series.get(key)
+        if state is None:
+            state = self.series[key] = SeriesState()
+        if state.last is not None and timestamp < state.last:
+            self.late += 1
+            return None
+        if energy is None or not state.push(float(energy)):
+            self.missing += 1
+            return None
+        state.last = timestamp
+        if state.count < max(LAGS):
+            return None
+
+        target = timestamp.replace(minute=0, second=0, microsecond=0) + HOUR
+        hour, weekday = target.hour, target.weekday()
+        history = state.features()
+        cluster, usage_label = self.cluster_features(hour, weekday, history["lag_1"])
+        try:
+            kwh = self.predictor.predict_one(appliance, float(temp), season, int(house), hour, weekday,
+                                             target.month, usage_label, **history, **cluster)
+        except (ValueError, IndexError):
+            # A label or household size the model never saw: one unforecastable series must not stop the stream
+            self.unknown += 1
+            return None
+        return Forecast(household_id, appliance, target, kwh)
+
+    def run(self, readings):
+        """Forecasts for an iterable of Reading (or same-order tuples), yielded as they are produced."""
+        update = self.update
+        for reading in readings:
+            forecast = update(*reading)
+            if forecast is not None:
+                yield forecast
+
+    async def arun(self, readings):
+        """run() for an async iterable of readings."""
+        async for reading in readings:
+            forecast = self.update(*reading)
+            if forecast is not None:
+                yield forecast
+
+
+# ============================================================
+# 3. READING SOURCES
+# ============================================================
+def readings_from_frame(df):
+    """Readings of a load_features() frame in time order (household 1 without a Home ID column)."""
+    df = df.sort_values("datetime", kind="stable")
+    household = df["Home ID"].to_numpy() if "Home ID" in df.columns else np.ones(len(df), dtype=int)
+    return map(Reading._make, zip(
+        household.tolist(), df["Appliance Type"].astype(str).tolist(),
+        df["datetime"].dt.to_pydatetime().tolist(),
+        df["Energy Consumption (kWh)"].to_numpy(dtype=float).tolist(),
+        df["Outdoor Temperature (°C)"].to_numpy(dtype=float).tolist(),
+        df["Season"].astype(str).tolist(), df["Household Size"].to_numpy(dtype=int).tolist()))
+
+
+def reading_from_json(line):
+    """Reading from one JSON line; KeyError/ValueError when a field is absent or malformed."""
+    record = json.loads(line)
+    values = {field: record[name] for name, field in READING_FIELDS.items()}
+    values["timestamp"] = datetime.fromisoformat(values["timestamp"])
+    return Reading(**values)
+
+
+# ============================================================
+# 4. CLI
+# ============================================================
+def skipped_summary(streaming, malformed=0):
+    skipped = {"late": streaming.late, "without energy": streaming.missing,
+               "with unknown labels": streaming.unknown, "malformed": malformed}
+    return ", ".join(f"{n} {why}" for why, n in skipped.items() if n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Next-hour forecasts from a stream of readings")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--export", default=None, help="latency_predictor.py export to predict with")
+    parser.add_argument("--csv", default=None, help="replay this readings CSV instead of reading stdin")
+    parser.add_argument("--out", default="models/stream_forecasts.csv")
+    args = parser.parse_args()
+
+    streaming = StreamingPredictor.load(args.models, export=args.export)
+    if args.csv is None:
+        malformed = 0
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                reading = reading_from_json(line)
+            except (KeyError, TypeError, ValueError):
+                malformed += 1
+                continue
+            forecast = streaming.update(*reading)
+            if forecast is not None:
+                print(json.dumps({**forecast._asdict(),
+                                  "forecast_timestamp": forecast.forecast_timestamp.isoformat()}),
+                      flush=True)
+        skipped = skipped_summary(streaming, malformed)
+        if skipped:
+            print(f"⚠️ Readings skipped: {skipped}", file=sys.stderr)
+        return
+
+    forecasts = pd.DataFrame(streaming.run(readings_from_frame(load_features(args.csv))),
+                             columns=Forecast._fields)
+    forecasts.to_csv(args.out, index=False)
+    skipped = skipped_summary(streaming)
+    print(f"✅ {len(forecasts)} forecasts for {len(streaming.series)} series saved to {args.out}"
+          + (f" (readings skipped: {skipped})" if skipped else ""))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,147 @@
 # -----------------------------
 # ⚡ Smart Energy Management System - Peak Hour Detection using K-Means
 # -----------------------------
+# --large switches to the large-data mode: mini-batch k-means fitted chunk by
+# chunk over the compact feature cache, chunked assignment of every row, and
+# cluster diagnostics on a stratified sample of --sample-size rows.
+#
+# The visualization (--plot density, the default) bins every row into an
+# hour × energy grid per usage label and draws the grids as heatmaps, so its
+# cost does not grow with the data; the grids are also written to
+# models/kmeans_density.json for the dashboard. --plot scatter draws every
+# row (the sample in --large mode) as before.
+#
+# --k auto chooses the number of usage bands from --k-range on a bounded sample
+# (clustering.select_k); the bands are Off-Peak, Normal 1..k-2 and Peak by energy.
+import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm, to_hex
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-import pickle
-
-# 1️⃣ Load and Clean Data
-data = pd.read_csv("smart_home_energy_consumption_large.csv")
-
-# Handle missing values
-for col in data.columns:
-    if data[col].dtype in ["int64", "float64"]:
-        data[col].fillna(data[col].median(), inplace=True)
-    else:
-        data[col].fillna(data[col].mode()[0], inplace=True)
-
-# 2️⃣ Extract Time-based Features
-data['datetime'] = pd.to_datetime(data['Date'] + ' ' + data['Time'])
-data['hour'] = data['datetime'].dt.hour
-data['day'] = data['datetime'].dt.day
-data['month'] = data['datetime'].dt.month
-data['weekday'] = data['datetime'].dt.dayofweek
-data['is_weekend'] = data['weekday'].apply(lambda x: 1 if x >= 5 else 0)
-
-
-# Season feature
-def get_season(month):
-    if month in [12, 1, 2]:
-        return 'winter'
-    elif month in [3, 4, 5]:
-        return 'spring'
-    elif month in [6, 7, 8]:
-        return 'summer'
-    else:
-        return 'autumn'
-data['season'] = data['month'].apply(get_season)
-data = pd.get_dummies(data, columns=['season'], drop_first=True)
-
-# 3️⃣ Select Features for Clustering
-# We will use time-based features and energy consumption for clustering
-X = data[['hour',  'weekday', 'is_weekend', 'Energy Consumption (kWh)']]
-
-# 4️⃣ Scale the Data
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# 5️⃣ Apply K-Means Clustering
-# Using 3 clusters for Peak, Normal, and Off-Peak
-kmeans = KMeans(n_clusters=3, random_state=42, n_init=10) # Added n_init for clarity
-data['cluster'] = kmeans.fit_predict(X_scaled)
-
-# 6️⃣ Evaluate Cluster Quality
-sil_score = silhouette_score(X_scaled, data['cluster'])
-print(f"✅ Silhouette Score (K-Means): {sil_score:.2f}")
-
-# 7️⃣ Label Clusters as Peak / Normal / Off-Peak
-# Sort clusters by average energy consumption to assign labels
-cluster_avg = data.groupby('cluster')['Energy Consumption (kWh)'].mean().sort_values(ascending=False)
-
-# Map labels dynamically based on average energy consumption
-labels = {}
-if len(cluster_avg) >= 3:
-    labels[cluster_avg.index[0]] = "Peak"
-    labels[cluster_avg.index[1]] = "Normal"
-    labels[cluster_avg.index[2]] = "Off-Peak"
-elif len(cluster_avg) == 2:
-    labels[cluster_avg.index[0]] = "Peak"
-    labels[cluster_avg.index[1]] = "Off-Peak"
+from features import load_features, add_season_dummies, add_ingest_args, iter_feature_batches
+from clustering import (CLUSTER_FEATURES, SAMPLE_SIZE, label_clusters, centroid_energy,
+                        stratified_sample, cluster_diagnostics, cluster_aggregates,
+                        mean_by, count_by, fit_scaler, fit_minibatch_kmeans, assign_in_chunks,
+                        save_kmeans, ENERGY_BIN, DENSITY_PATH, density_counts, density_by_label,
+                        save_density, band_order, K_RANGE, SELECT_SAMPLE, FeatureReservoir, k_arg,
+                        select_k, save_selection, SELECTION_PATH)
+from instrument import StageRecorder, add_instrument_args
+
+parser = add_ingest_args(argparse.ArgumentParser(description="Peak hour detection using K-Means"))
+parser.add_argument("--large", action="store_true",
+                    help="mini-batch k-means + chunked assignment (implies --compact)")
+parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE,
+                    help=f"rows in the stratified diagnostics sample (default {SAMPLE_SIZE})")
+parser.add_argument("--epochs", type=int, default=2, help="passes over the data in --large mode")
+parser.add_argument("--plot", choices=["density", "scatter"], default="density",
+                    help="density: per-label hour × energy heatmaps from binned counts; "
+                         "scatter: one point per row")
+parser.add_argument("--energy-bin", type=float, default=ENERGY_BIN,
+                    help=f"kWh per energy bin of the density grid (default {ENERGY_BIN})")
+parser.add_argument("--k", type=k_arg, default=3,
+                    help="number of usage bands, or auto to choose one from --k-range")
+parser.add_argument("--k-range", type=int, nargs=2, default=K_RANGE, metavar=("MIN", "MAX"),
+                    help=f"candidate k for --k auto (default {K_RANGE[0]} {K_RANGE[1]})")
+parser.add_argument("--k-workers", type=int, default=None,
+                    help="parallel k-selection processes (default: one per core)")
+parser.add_argument("--select-sample", type=int, default=SELECT_SAMPLE,
+                    help=f"rows the k candidates are fitted on (default {SELECT_SAMPLE})")
+args = add_instrument_args(parser).parse_args()
+run = StageRecorder("train_kmeans", args)
+
+rng = np.random.default_rng(42)
+
+
+def choose_k(X_select):
+    """--k auto: score every candidate k on the sample in parallel and keep the best."""
+    run.stage("select_k", rows=len(X_select))
+    best, table = select_k(X_select, args.k_range, args.k_workers)
+    print(f"🔢 k selection on {len(X_select)} sampled rows:")
+    print(table.round(3).to_string())
+    save_selection(best, table, len(X_select))
+    print(f"✅ Chose k={best} (saved to {SELECTION_PATH})")
+    return best
+
+
+if not args.large:
+    # 1️⃣ Load and Clean Data
+    # 2️⃣ Extract Time-based Features
+    # Both steps live in features.py and are cached after the first run
+    run.stage("load")
+    data = load_features(compact=args.compact, chunksize=args.chunksize)
+
+    # Season feature
+    data = add_season_dummies(data)
+
+    # 3️⃣ Select Features for Clustering
+    # We will use time-based features and energy consumption for clustering
+    X = data[CLUSTER_FEATURES]
+
+    # 4️⃣ Scale the Data
+    run.stage("scale", rows=len(data))
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    # 5️⃣ Apply K-Means Clustering
+    # One cluster per usage band (3 for Peak, Normal, and Off-Peak unless --k says otherwise)
+    k = args.k
+    if k == "auto":
+        k = choose_k(X_scaled[np.sort(rng.choice(len(X_scaled), min(len(X_scaled), args.select_sample),
+                                                 replace=False))])
+    run.stage("kmeans", rows=len(data))
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10) # Added n_init for clarity
+    data['cluster'] = kmeans.fit_predict(X_scaled)
+
+    # 7️⃣ Label Clusters as usage bands (Peak / Normal / Off-Peak for k=3)
+    # Sort clusters by average energy consumption to assign labels
+    run.stage("aggregate", rows=len(data))
+    labels = label_clusters(data.groupby('cluster')['Energy Consumption (kWh)'].mean())
+    data['usage_label'] = data['cluster'].map(labels)
+
+    agg = cluster_aggregates(data)
+    density = density_counts(data, kmeans.n_clusters, args.energy_bin)
+    sizes = data['cluster'].value_counts().sort_index()
+    idx = stratified_sample(data['cluster'].to_numpy(), min(1.0, args.sample_size / len(data)), rng)
+    X_sample, sample = X_scaled[idx], data.iloc[idx]
+    plot_data = data
 else:
-    if len(cluster_avg) > 0:
-      labels[cluster_avg.index[0]] = "Normal"
+    # 1️⃣–4️⃣ Stream the compact feature cache; the scaler is fitted chunk by chunk
+    batches = lambda: iter_feature_batches(compact=True, chunksize=args.chunksize)
+    run.stage("scale")
+    reservoir = FeatureReservoir(args.select_sample) if args.k == "auto" else None
+    scaler = fit_scaler(batches(), reservoir)
+    total_rows = int(scaler.n_samples_seen_)
+    run.rows(total_rows)
+    print(f"📊 Streaming {total_rows} rows in chunks of {args.chunksize}")
+
+    # 5️⃣ Mini-batch K-Means, one cluster per usage band (k from the reservoir sample with --k auto)
+    k = choose_k(scaler.transform(reservoir.rows)) if reservoir is not None else args.k
+    run.stage("kmeans", rows=total_rows * args.epochs)
+    kmeans = fit_minibatch_kmeans(batches, scaler, n_clusters=k, epochs=args.epochs)
+
+    # 7️⃣ Label clusters by centroid energy (the cluster mean at convergence), then
+    # assign every row chunk by chunk, streaming the labelled rows to CSV
+    run.stage("assign", rows=total_rows)
+    labels = label_clusters(centroid_energy(kmeans, scaler))
+    agg, X_sample, sample, sizes, density = assign_in_chunks(
+        batches(), scaler, kmeans, labels, min(1.0, args.sample_size / total_rows),
+        out_csv='models/data_with_clusters.csv', prepare=add_season_dummies,
+        energy_bin=args.energy_bin)
+    plot_data = sample
 
-data['usage_label'] = data['cluster'].map(labels)
+# 6️⃣ Evaluate Cluster Quality (on a stratified sample - silhouette is quadratic in rows)
+run.stage("diagnostics", rows=len(X_sample))
+diagnostics = cluster_diagnostics(X_sample, sample['cluster'].to_numpy())
+print(f"✅ Silhouette Score (K-Means): {diagnostics['silhouette']:.2f}")
+print(f"   Davies-Bouldin: {diagnostics['davies_bouldin']:.2f} | "
+      f"Calinski-Harabasz: {diagnostics['calinski_harabasz']:.0f} | "
+      f"sample rows: {diagnostics['sample_rows']}")
+print("   Cluster sizes:", sizes.to_dict())
+
+run.stage("analysis")
+cluster_avg = mean_by(agg, labels, 'cluster').sort_values(ascending=False)
 
 # -----------------------------
 # 🔹 Analyze Clusters
@@ -87,38 +153,66 @@ print(cluster_avg)
 # 🔹 Analyze Appliance Energy Consumption within Clusters
 # -----------------------------
 print("\nAverage Energy Consumption by Appliance Type within each Usage Label:")
-appliance_cluster_summary = data.groupby(['usage_label', 'Appliance Type'])['Energy Consumption (kWh)'].mean().unstack()
+appliance_cluster_summary = mean_by(agg, labels, ['usage_label', 'Appliance Type']).unstack()
 print(appliance_cluster_summary)
 
 
 # 8️⃣ Visualization: Energy Consumption vs. Hour with Usage Labels
-plt.figure(figsize=(10,5))
-colors = {'Peak':'red', 'Normal':'orange', 'Off-Peak':'green'}
-# Use the usage_label for coloring in the scatter plot
-plt.scatter(data['hour'], data['Energy Consumption (kWh)'],
-            c=data['usage_label'].map(colors), s=20, alpha=0.6)
-plt.title("⚡ Energy Consumption vs. Hour by Usage Label (K-Means)")
-plt.xlabel("Hour of Day")
-plt.ylabel("Energy Consumption (kWh)")
-plt.grid(True)
+# Bands in between Off-Peak and Peak get oranges, darker with energy
+bands = band_order(labels)
+middle = bands[1:-1]
+cmaps = {'Peak':'Reds', 'Off-Peak':'Greens', **{lbl: 'Oranges' for lbl in middle}}
+colors = {'Peak':'red', 'Off-Peak':'green', 'Normal':'orange',
+          **{lbl: to_hex(plt.cm.Oranges(0.8 - 0.5 * i / max(len(middle) - 1, 1)))
+             for i, lbl in enumerate(middle) if lbl != 'Normal'}}
+if args.plot == "density":
+    # Render from the binned counts: the cost depends on the grid, not the row count
+    run.stage("plot", rows=int(density.sum()))
+    top = len(save_density(density, labels, args.energy_bin)["energy_edges"]) - 1
+    grids = density_by_label(density, labels)
+    fig, axes = plt.subplots(1, len(grids), figsize=(5 * len(grids), 5), sharey=True, squeeze=False)
+    for ax, (label, grid) in zip(axes[0], grids.items()):
+        counts = np.ma.masked_equal(grid[:, :top].T, 0)
+        image = ax.imshow(counts, origin='lower', aspect='auto', cmap=cmaps.get(label, 'viridis'),
+                          norm=LogNorm(vmin=1, vmax=max(1, int(grid.max()))),  # zeros are masked
+                          extent=[-0.5, 23.5, 0, top * args.energy_bin])
+        fig.colorbar(image, ax=ax, label="Readings")
+        ax.set_title(label)
+        ax.set_xlabel("Hour of Day")
+    axes[0][0].set_ylabel("Energy Consumption (kWh)")
+    fig.suptitle("⚡ Energy Consumption vs. Hour by Usage Label (K-Means)")
+    fig.tight_layout()
+else:
+    run.stage("plot", rows=len(plot_data))
+    plt.figure(figsize=(10,5))
+    # Use the usage_label for coloring in the scatter plot
+    plt.scatter(plot_data['hour'], plot_data['Energy Consumption (kWh)'],
+                c=plot_data['usage_label'].map(colors), s=20, alpha=0.6)
+    plt.title("⚡ Energy Consumption vs. Hour by Usage Label (K-Means)")
+    plt.xlabel("Hour of Day")
+    plt.ylabel("Energy Consumption (kWh)")
+    plt.grid(True)
 plt.savefig('models/kmeans_visualization.png')
 print("\n✅ Visualization saved to models/kmeans_visualization.png")
+if args.plot == "density":
+    print(f"✅ Density grids saved to {DENSITY_PATH}")
 
 # 9️⃣ Average Usage by Label
-summary = data.groupby('usage_label')['Energy Consumption (kWh)'].mean().sort_values(ascending=False)
+run.stage("summary")
+summary = mean_by(agg, labels, 'usage_label').sort_values(ascending=False)
 print("\n🔍 Average Energy Consumption by Usage Label:")
 print(summary)
 
 # 🔟 Peak Hour Range Analysis (based on frequency of each hour in the cluster)
 # Get the hour counts for each usage label
-peak_hours_counts = data[data['usage_label'] == 'Peak']['hour'].value_counts().sort_index()
-normal_hours_counts = data[data['usage_label'] == 'Normal']['hour'].value_counts().sort_index()
-offpeak_hours_counts = data[data['usage_label'] == 'Off-Peak']['hour'].value_counts().sort_index()
+hour_counts = count_by(agg, labels, ['usage_label', 'hour'])
+def hours_for(label):
+    return hour_counts.xs(label, level='usage_label') if label in labels.values() else pd.Series(dtype=int)
+band_hours_counts = {lbl: hours_for(lbl) for lbl in bands}
 
 print("\n⏰ Hourly Distribution within Usage Labels:")
-print("Peak Hours Distribution:\n", peak_hours_counts)
-print("\nNormal Hours Distribution:\n", normal_hours_counts)
-print("\nOff-Peak Hours Distribution:\n", offpeak_hours_counts)
+for lbl, counts in band_hours_counts.items():
+    print(f"\n{lbl} Hours Distribution:\n", counts)
 
 
 # -----------------------------
@@ -128,15 +222,14 @@ print("\nCluster → Label Mapping:")
 for c, lbl in labels.items():
     print(f"Cluster {c}: {lbl}")
 
+# Highest band first; every band between Off-Peak and Peak is a moderate one
+meanings = {"Peak": ("Periods with highest energy consumption.", "Highest Usage"),
+            "Off-Peak": ("Minimal energy consumption (midnight–morning).", "Low Usage")}
 print("\n🔹 Interpretation:")
-if "Peak" in (data['usage_label'].values if 'usage_label' in data.columns else []):
-    print("Peak Hours → Periods with highest energy consumption.")
-if "Normal" in (data['usage_label'].values if 'usage_label' in data.columns else []):
-    print("Normal Hours → Moderate usage times.")
-if "Off-Peak" in (data['usage_label'].values if 'usage_label' in data.columns else []):
-    print("Off-Peak Hours → Minimal energy consumption (midnight–morning).")
-
-# Automatic Interpretation of Peak/Normal/Off-Peak Hours (based on hours with highest counts)
+for lbl in bands:
+    print(f"{lbl} Hours → {meanings.get(lbl, ('Moderate usage times.',))[0]}")
+
+# Automatic Interpretation of each band's Hours (based on hours with highest counts)
 print("\n🔹 Automatic Interpretation of Hourly Ranges:")
 
 def get_dominant_hour_range(hour_counts):
@@ -163,28 +256,30 @@ def get_dominant_hour_range(hour_counts):
     return ", ".join(ranges) if ranges else "No clear dominant hours"
 
 
-peak_range = get_dominant_hour_range(peak_hours_counts)
-normal_range = get_dominant_hour_range(normal_hours_counts)
-offpeak_range = get_dominant_hour_range(offpeak_hours_counts)
-
-print(f"Peak Hours (Highest Usage): {peak_range}")
-print(f"Normal Hours (Moderate Usage): {normal_range}")
-print(f"Off-Peak Hours (Low Usage): {offpeak_range}")
+for lbl, counts in band_hours_counts.items():
+    usage = meanings.get(lbl, (None, "Moderate Usage"))[1]
+    print(f"{lbl} Hours ({usage}): {get_dominant_hour_range(counts)}")
 
 
 # -----------------------------
 # 🔹 Print Sample Results
 # -----------------------------
 print("\nSample Clustered Data:")
-print(data[['datetime', 'hour', 'Appliance Type', 'Energy Consumption (kWh)', 'cluster', 'usage_label']].head(10))
+print(plot_data[['datetime', 'hour', 'Appliance Type', 'Energy Consumption (kWh)', 'cluster', 'usage_label']].head(10))
 
 # -----------------------------
 # 🔹 Save Model
 # -----------------------------
-with open('models/kmeans_model.pkl', 'wb') as f:
-    pickle.dump(kmeans, f)
+# Scaler, cluster → label mapping and cluster sizes are saved alongside the model so
+# new points can be placed in the same space and update_kmeans.py can update it
+run.stage("save_model")
+save_kmeans(kmeans, scaler, labels, sizes.reindex(range(kmeans.n_clusters), fill_value=0))
 print("\n✅ K-Means model saved to models/kmeans_model.pkl")
+print("✅ K-Means scaler, label mapping and cluster sizes saved to models/")
 
-# Save the processed data with usage labels
-data.to_csv('models/data_with_clusters.csv', index=False)
+# Save the processed data with usage labels (already streamed out in --large mode)
+if not args.large:
+    run.stage("export_csv", rows=len(data))
+    data.to_csv('models/data_with_clusters.csv', index=False)
 print("✅ Processed data saved to models/data_with_clusters.csv")
+run.done()
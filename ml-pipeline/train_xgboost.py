@@ -1,34 +1,81 @@
+import argparse
+import time
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.cluster import KMeans
 from xgboost import XGBRegressor
 import optuna
 import pickle
+from features import RAW_CSV, load_features, add_ingest_args, add_lag_features, save_series_tail
+from forecast_engine import ForecastEngine, FEATURES
+from model_bundle import save_bundle, clustering_state
+from clustering import (CLUSTER_FEATURES, K_RANGE, SELECT_SAMPLE, label_clusters, load_kmeans, scale,
+                        band_features, k_arg, select_k)
+from tuning import tune, STORAGE
+from walk_forward import chronological_split, walk_forward, save_metrics, METRICS_PATH
+from xgb_data import (MATRIX_MODES, CHUNK_DIR, CHUNK_ROWS, write_chunks, build_matrices,
+                      fit_booster, as_regressor)
+from instrument import StageRecorder, add_instrument_args
+from pattern_features import FEATURE_ENGINES, LOOKUP_NAMES, build_pattern_features
+from quantiles import fit_quantile_model, interval_metrics, quantile_column
+from segments import (SEGMENT_MODES, HOUSEHOLD_CLUSTERS, MIN_SEGMENT_ROWS, household_clusters,
+                      segment_keys, train_segments)
+
+parser = add_ingest_args(argparse.ArgumentParser(description="Train the XGBoost energy forecaster"))
+parser.add_argument("--csv", nargs="+", default=[RAW_CSV], metavar="PATH",
+                    help="readings to train on (Kaggle schema); several files are concatenated")
+parser.add_argument("--refit-kmeans", action="store_true",
+                    help="fit a fresh K-Means instead of reusing models/kmeans_model.pkl")
+parser.add_argument("--k", type=k_arg, default=3,
+                    help="usage bands for --refit-kmeans, or auto to choose one from --k-range")
+parser.add_argument("--k-range", type=int, nargs=2, default=K_RANGE, metavar=("MIN", "MAX"))
+parser.add_argument("--n-trials", type=int, default=30, help="finished Optuna trials to reach")
+parser.add_argument("--workers", type=int, default=1, help="parallel tuning processes")
+parser.add_argument("--storage", default=STORAGE, help="Optuna study store (resumed if it exists)")
+parser.add_argument("--study-name", default=None,
+                    help="defaults to a fingerprint of the training data")
+parser.add_argument("--seed-study", default=None,
+                    help="try this earlier study's best parameter sets first in a new study")
+parser.add_argument("--matrix", choices=MATRIX_MODES, default="dense",
+                    help="quantized: build one QuantileDMatrix for all trials; "
+                         "external: stream it from chunk files (out-of-core)")
+parser.add_argument("--chunk-dir", default=CHUNK_DIR)
+parser.add_argument("--legacy-pickles", action="store_true",
+                    help="also write the loose per-artifact pickles next to the bundle")
+parser.add_argument("--folds", type=int, default=5, help="walk-forward folds (0 to skip)")
+parser.add_argument("--cv-workers", type=int, default=None,
+                    help="parallel fold processes (default: one per core, up to --folds)")
+parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+parser.add_argument("--feature-engine", choices=FEATURE_ENGINES, default="pandas",
+                    help="arrow: build the pattern features with one lazy Arrow Acero plan")
+parser.add_argument("--quantiles", type=float, nargs="+", default=None, metavar="Q",
+                    help="also train one multi-quantile model for prediction intervals, e.g. 0.1 0.5 0.9")
+parser.add_argument("--segment-by", choices=SEGMENT_MODES, default=None,
+                    help="also train one model per appliance / household cluster (segments.py)")
+parser.add_argument("--household-clusters", type=int, default=HOUSEHOLD_CLUSTERS)
+parser.add_argument("--min-segment-rows", type=int, default=MIN_SEGMENT_ROWS,
+                    help="smaller segments are served by the global model")
+parser.add_argument("--segment-workers", type=int, default=None,
+                    help="parallel segment processes (default: one per core)")
+args = add_instrument_args(parser).parse_args()
+if args.k == "auto" and not args.refit_kmeans:
+    parser.error("--k auto chooses the bands of a fresh K-Means - add --refit-kmeans")
+run = StageRecorder("train_xgboost", args)
 
 print("\n======================================")
 print("📊 LOADING DATA")
 print("======================================")
 
-df = pd.read_csv("smart_home_energy_consumption_large.csv")
-
 # ============================================================
 # 1. CLEAN DATA
 # ============================================================
-for col in df.columns:
-    if df[col].dtype in ["int64", "float64"]:
-        df[col] = df[col].fillna(df[col].median())
-    else:
-        df[col] = df[col].fillna(df[col].mode()[0])
-
-df["datetime"] = pd.to_datetime(df["Date"] + " " + df["Time"])
-df["hour"] = df["datetime"].dt.hour
-df["weekday"] = df["datetime"].dt.dayofweek
-df["is_weekend"] = (df["weekday"] >= 5).astype(int)
-df["month"] = df["datetime"].dt.month
-df["day"] = df["datetime"].dt.day
+# Cleaning and time features are shared with the other scripts (features.py)
+run.stage("load")
+df = pd.concat([load_features(path, compact=args.compact, chunksize=args.chunksize) for path in args.csv],
+               ignore_index=True) if len(args.csv) > 1 else load_features(args.csv[0], compact=args.compact,
+                                                                           chunksize=args.chunksize)
 
 # ============================================================
 # 2. K-MEANS CLUSTERING for Usage Behavior
@@ -37,19 +84,34 @@ print("\n======================================")
 print("⚡ RUNNING K-MEANS")
 print("======================================")
 
-cluster_features = ["hour", "weekday", "is_weekend", "Energy Consumption (kWh)"]
-cluster_scaled = StandardScaler().fit_transform(df[cluster_features])
-
-kmeans = KMeans(n_clusters=3, random_state=42, n_init=10)
-df["cluster"] = kmeans.fit_predict(cluster_scaled)
-
-cluster_avg = df.groupby("cluster")["Energy Consumption (kWh)"].mean().sort_values(ascending=False)
-
-label_map = {
-    cluster_avg.index[0]: "Peak",
-    cluster_avg.index[1]: "Normal",
-    cluster_avg.index[2]: "Off-Peak"
-}
+# Reuse the clustering train_kmeans.py saved (and update_kmeans.py keeps current),
+# so usage labels and prob_* features match what the forecasters compute later.
+run.stage("kmeans", rows=len(df))
+saved_kmeans = None if args.refit_kmeans else load_kmeans()
+
+if saved_kmeans is not None:
+    print("⚡ Using saved K-Means from models/kmeans_model.pkl")
+    kmeans = saved_kmeans["kmeans_model"]
+    cluster_scaler = saved_kmeans["kmeans_scaler"]
+    cluster_scaled = scale(cluster_scaler, df)
+    df["cluster"] = kmeans.predict(cluster_scaled)
+    label_map = saved_kmeans["kmeans_labels"]
+else:
+    cluster_scaler = StandardScaler()
+    cluster_scaled = cluster_scaler.fit_transform(df[CLUSTER_FEATURES])
+
+    k = args.k
+    if k == "auto":
+        # Candidates are scored in parallel workers on a bounded sample (clustering.select_k)
+        rng = np.random.default_rng(42)
+        sample = rng.choice(len(cluster_scaled), min(len(cluster_scaled), SELECT_SAMPLE), replace=False)
+        k, table = select_k(cluster_scaled[np.sort(sample)], args.k_range)
+        print(table.round(3).to_string())
+        print(f"🔢 Chose k={k}")
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+    df["cluster"] = kmeans.fit_predict(cluster_scaled)
+
+    label_map = label_clusters(df.groupby("cluster")["Energy Consumption (kWh)"].mean())
 
 df["usage_label"] = df["cluster"].map(label_map)
 
@@ -57,58 +119,28 @@ le_usage = LabelEncoder()
 df["usage_encoded"] = le_usage.fit_transform(df["usage_label"])
 
 # ⭐ ADD CLUSTER PROBABILITY FEATURES
-cluster_dist = kmeans.transform(cluster_scaled)
-df["prob_peak"] = cluster_dist[:, cluster_avg.index[0]]
-df["prob_normal"] = cluster_dist[:, cluster_avg.index[1]]
-df["prob_offpeak"] = cluster_dist[:, cluster_avg.index[2]]
+# Distance to the Peak band, the nearest band in between and the Off-Peak band, for any k
+for name, dist in band_features(kmeans.transform(cluster_scaled), label_map).items():
+    df[name] = dist
 
 # ============================================================
 # 3. PATTERN-BASED FEATURES
 # ============================================================
-appliance_base = df.groupby("Appliance Type")["Energy Consumption (kWh)"].mean().to_dict()
-season_mult = df.groupby("Season")["Energy Consumption (kWh)"].mean() / df["Energy Consumption (kWh)"].mean()
-season_mult = season_mult.to_dict()
-
-household_factor = df.groupby("Household Size")["Energy Consumption (kWh)"].mean() / df["Energy Consumption (kWh)"].mean()
-household_factor = household_factor.to_dict()
-
-monthly_mult = df.groupby("month")["Energy Consumption (kWh)"].mean() / df["Energy Consumption (kWh)"].mean()
-monthly_mult = monthly_mult.to_dict()
-
-daily_mult = df.groupby("weekday")["Energy Consumption (kWh)"].mean() / df["Energy Consumption (kWh)"].mean()
-daily_mult = daily_mult.to_dict()
-
-temp_coeff = {}
-for app in ["Heater", "Air Conditioning"]:
-    ss = df[df["Appliance Type"] == app]
-    temp_coeff[app] = ss["Outdoor Temperature (°C)"].corr(ss["Energy Consumption (kWh)"])
-
-def add_features(d):
-    d["Appliance_Base"] = d["Appliance Type"].map(appliance_base)
-    d["Season_M"] = d["Season"].map(season_mult)
-    d["House_F"] = d["Household Size"].map(household_factor)
-    d["Month_M"] = d["month"].map(monthly_mult)
-    d["Day_M"] = d["weekday"].map(daily_mult)
-
-    d["Temp_Impact"] = 0.0
-    for app, coef in temp_coeff.items():
-        mask = d["Appliance Type"] == app
-        d.loc[mask, "Temp_Impact"] = d.loc[mask, "Outdoor Temperature (°C)"] * coef
-
-    return d
-
-df = add_features(df)
+run.stage("features", rows=len(df))
+# Lookup tables learnt from the training frame, joined back per row
+# (pattern_features.py; --feature-engine arrow runs them as one Acero plan)
+df, lookups = build_pattern_features(df, engine=args.feature_engine)
+(appliance_base, season_mult, household_factor, monthly_mult,
+ daily_mult, temp_coeff) = (lookups[name] for name in LOOKUP_NAMES)
 
 # ============================================================
 # 4. ADD LAG + ROLLING FEATURES (MAJOR BOOST)
 # ============================================================
-df["lag_1"] = df["Energy Consumption (kWh)"].shift(1)
-df["lag_2"] = df["Energy Consumption (kWh)"].shift(2)
-df["lag_3"] = df["Energy Consumption (kWh)"].shift(3)
-
-df["rolling_3"] = df["Energy Consumption (kWh)"].rolling(3).mean()
-df["rolling_6"] = df["Energy Consumption (kWh)"].rolling(6).mean()
-df["rolling_12"] = df["Energy Consumption (kWh)"].rolling(12).mean()
+# Per (household, appliance) series in time order, so windows never cross series
+run.stage("lags", rows=len(df))
+df = add_lag_features(df)
+# refresh_xgboost.py builds lag features for new readings on top of this tail
+save_series_tail(df)
 
 df = df.dropna().reset_index(drop=True)
 
@@ -124,15 +156,8 @@ df["Season_encoded"] = le_season.fit_transform(df["Season"])
 # ============================================================
 # 6. FINAL FEATURES
 # ============================================================
-features = [
-    "Appliance_encoded", "Outdoor Temperature (°C)", "Season_encoded",
-    "Household Size", "hour", "weekday", "month",
-    "Appliance_Base", "Season_M", "House_F", "Month_M", "Day_M",
-    "Temp_Impact",
-    "usage_encoded", "prob_peak", "prob_normal", "prob_offpeak",
-    "lag_1", "lag_2", "lag_3",
-    "rolling_3", "rolling_6", "rolling_12"
-]
+# Shared with ForecastEngine so training and serving agree on column order
+features = FEATURES
 
 target = "Energy Consumption (kWh)"
 
@@ -142,9 +167,11 @@ y = df[target]
 # ============================================================
 # 7. TRAIN/TEST SPLIT + SCALING
 # ============================================================
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+# Hold out the latest 20% of readings; a random split would train on the future
+run.stage("split_scale", rows=len(df))
+train_idx, test_idx = chronological_split(df["datetime"], test_size=0.2)
+X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
 
 scaler_x = StandardScaler()
 X_train_scaled = scaler_x.fit_transform(X_train)
@@ -153,6 +180,19 @@ X_test_scaled = scaler_x.transform(X_test)
 scaler_y = StandardScaler()
 y_train_scaled = scaler_y.fit_transform(y_train.values.reshape(-1, 1)).flatten()
 
+# Quantize the training matrix once for every trial and the final fit;
+# in external mode XGBoost streams it back from chunk files on disk
+matrices = None
+if args.matrix != "dense":
+    run.stage("matrix", rows=len(X_train_scaled))
+    if args.matrix == "external":
+        n_chunks = write_chunks(X_train_scaled, y_train_scaled, args.chunk_dir, args.chunk_rows)
+        print(f"💾 Training matrix spilled to {n_chunks} chunks in {args.chunk_dir}")
+    matrices = build_matrices(args.matrix, X_train_scaled, y_train_scaled, X_test_scaled,
+                              scaler_y.transform(y_test.values.reshape(-1, 1)).flatten(),
+                              chunk_dir=args.chunk_dir)
+    print(f"🧱 Built {args.matrix} QuantileDMatrix ({matrices[0].num_row()} rows)")
+
 # ============================================================
 # 8. OPTUNA HYPERPARAMETER TUNING
 # ============================================================
@@ -160,44 +200,36 @@ print("\n======================================")
 print("🎯 OPTUNA HYPERPARAMETER TUNING")
 print("======================================")
 
-def objective(trial):
-    params = {
-        "n_estimators": trial.suggest_int("n_estimators", 300, 800),
-        "max_depth": trial.suggest_int("max_depth", 3, 12),
-        "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3),
-        "subsample": trial.suggest_float("subsample", 0.6, 1.0),
-        "colsample_bytree": trial.suggest_float("colsample_bytree", 0.6, 1.0),
-        "min_child_weight": trial.suggest_int("min_child_weight", 1, 10),
-        "gamma": trial.suggest_float("gamma", 0, 5),
-        "reg_alpha": trial.suggest_float("reg_alpha", 0.0, 1.0),
-        "reg_lambda": trial.suggest_float("reg_lambda", 0.0, 2.0),
-        "random_state": 42,
-        "n_jobs": -1,
-    }
-
-    model = XGBRegressor(**params)
-    model.fit(X_train_scaled, y_train_scaled)
-
-    pred_scaled = model.predict(X_test_scaled)
-    pred = scaler_y.inverse_transform(pred_scaled.reshape(-1, 1)).flatten()
-
-    return r2_score(y_test, pred)
-
-study = optuna.create_study(direction="maximize")
-study.optimize(objective, n_trials=30)
+run.stage("optuna", rows=len(X_train_scaled))
+study = tune(X_train_scaled, y_train_scaled, X_test_scaled, y_test,
+             (scaler_y.mean_[0], scaler_y.scale_[0]), n_trials=args.n_trials,
+             workers=args.workers, storage=args.storage, study_name=args.study_name,
+             matrix=args.matrix, matrices=matrices, seed_from=args.seed_study,
+             chunk_dir=args.chunk_dir)
 
+pruned = len(study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.PRUNED,)))
+print(f"\n✂️ {pruned} of {len(study.trials)} trials pruned")
 print("\nBest Params:", study.best_params)
 
 # ============================================================
 # 9. TRAIN FINAL MODEL WITH OPTUNA BEST PARAMETERS
 # ============================================================
-model = XGBRegressor(**study.best_params)
-model.fit(X_train_scaled, y_train_scaled)
+run.stage("final_fit", rows=len(X_train_scaled))
+start = time.perf_counter()
+if matrices is None:
+    model = XGBRegressor(**study.best_params, random_state=42, n_jobs=-1)
+    model.fit(X_train_scaled, y_train_scaled)
+else:
+    model = as_regressor(fit_booster(study.best_params, matrices[0]), study.best_params)
+point_fit_s = time.perf_counter() - start
 
 # ============================================================
 # 10. EVALUATE FINAL MODEL
 # ============================================================
+run.stage("evaluate", rows=len(X_test_scaled))
+start = time.perf_counter()
 pred_scaled = model.predict(X_test_scaled)
+point_predict_s = time.perf_counter() - start
 pred = scaler_y.inverse_transform(pred_scaled.reshape(-1, 1)).flatten()
 
 r2 = r2_score(y_test, pred)
@@ -214,83 +246,120 @@ print(f"MSE      : {mse:.4f}")
 print(f"RMSE     : {rmse:.4f} kWh")
 print("======================================")
 
+# Walk-forward folds give the metrics the backend reports for the model
+if args.folds:
+    run.stage("walk_forward", rows=len(X))
+    print(f"\n🚶 Walk-forward validation ({args.folds} folds)")
+    folds = walk_forward(X, y, df["datetime"], study.best_params, args.folds, args.cv_workers)
+    print(folds[["fold", "train_rows", "test_rows", "test_from", "test_to", "r2", "mae", "rmse"]]
+          .round(4).to_string(index=False))
+    summary = save_metrics(folds, study.best_params)
+    print(f"✅ Mean R² {summary['r2']:.4f} / MAE {summary['mae']:.4f} / RMSE {summary['rmse']:.4f} "
+          f"saved to {METRICS_PATH}")
+
+# ============================================================
+# 11. QUANTILE MODEL (PREDICTION INTERVALS)
+# ============================================================
+# Every requested quantile from one multi-output model with the tuned
+# parameters (quantiles.py); its fit and predict cost is reported against the
+# point model's above and kept in the bundle metadata
+quantile_model, intervals = None, None
+if args.quantiles:
+    run.stage("quantiles", rows=len(X_train_scaled))
+    quantiles = sorted(args.quantiles)
+    start = time.perf_counter()
+    quantile_model = fit_quantile_model(study.best_params, X_train_scaled, y_train_scaled, quantiles,
+                                        dtrain=matrices[0] if matrices is not None else None)
+    quantile_fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bands = quantile_model.inplace_predict(X_test_scaled)
+    quantile_predict_s = time.perf_counter() - start
+    bands = np.sort(bands * scaler_y.scale_[0] + scaler_y.mean_[0], axis=1)
+
+    intervals = {**interval_metrics(y_test, bands, quantiles),
+                 "fit_s": quantile_fit_s, "predict_s": quantile_predict_s,
+                 "point_fit_s": point_fit_s, "point_predict_s": point_predict_s}
+    names = "/".join(f"P{round(q * 100)}" for q in quantiles)
+    print(f"\n📏 {names} from one model: P{round(quantiles[0] * 100)}-P{round(quantiles[-1] * 100)} "
+          f"coverage {intervals['coverage']:.3f} (nominal {intervals['level']:.2f}), "
+          f"mean width {intervals['mean_width_kwh']:.4f} kWh")
+    print("   pinball loss: " + ", ".join(f"P{round(float(q) * 100)} {loss:.4f}"
+                                          for q, loss in intervals["pinball"].items()))
+    print(f"⏱️ Cost vs point model: fit {quantile_fit_s:.2f}s vs {point_fit_s:.2f}s "
+          f"({quantile_fit_s / point_fit_s:.1f}x), test predict {quantile_predict_s:.3f}s vs "
+          f"{point_predict_s:.3f}s ({quantile_predict_s / point_predict_s:.1f}x) for all {len(quantiles)} quantiles")
+
 # ============================================================
-# 11. SAVE MODELS AND ENCODERS
+# 12. SAVE MODEL BUNDLE
 # ============================================================
-with open('models/xgboost_model.pkl', 'wb') as f:
-    pickle.dump(model, f)
-with open('models/scaler_x.pkl', 'wb') as f:
-    pickle.dump(scaler_x, f)
-with open('models/scaler_y.pkl', 'wb') as f:
-    pickle.dump(scaler_y, f)
-with open('models/le_app.pkl', 'wb') as f:
-    pickle.dump(le_app, f)
-with open('models/le_season.pkl', 'wb') as f:
-    pickle.dump(le_season, f)
-with open('models/le_usage.pkl', 'wb') as f:
-    pickle.dump(le_usage, f)
-with open('models/appliance_base.pkl', 'wb') as f:
-    pickle.dump(appliance_base, f)
-with open('models/season_mult.pkl', 'wb') as f:
-    pickle.dump(season_mult, f)
-with open('models/household_factor.pkl', 'wb') as f:
-    pickle.dump(household_factor, f)
-with open('models/monthly_mult.pkl', 'wb') as f:
-    pickle.dump(monthly_mult, f)
-with open('models/daily_mult.pkl', 'wb') as f:
-    pickle.dump(daily_mult, f)
-with open('models/temp_coeff.pkl', 'wb') as f:
-    pickle.dump(temp_coeff, f)
-
-print("\n✅ All models and encoders saved to models/ directory")
+# Booster, scaler parameters, encoder vocabularies, lookup tables and the
+# K-Means state behind prob_* as one versioned, pickle-free bundle
+# (model_bundle.py); consumers load it with ForecastEngine.load("models").
+run.stage("save_bundle")
+engine = ForecastEngine(model, scaler_x, scaler_y, le_app, le_season, le_usage,
+                        appliance_base, season_mult, household_factor, monthly_mult,
+                        daily_mult, temp_coeff)
+if quantile_model is not None:
+    engine.set_quantile_model(quantile_model, quantiles)
+version = save_bundle(engine, "models", clustering_state(kmeans, cluster_scaler, label_map),
+                      {"r2": r2, "mae": mae, "rmse": rmse, "best_params": study.best_params,
+                       "study": study.study_name,
+                       **({"intervals": intervals} if intervals else {})})
+print(f"\n📦 Model bundle {version} saved to models/bundles/")
+
+if args.legacy_pickles:
+    artifacts = {"xgboost_model": model, "scaler_x": scaler_x, "scaler_y": scaler_y,
+                 "le_app": le_app, "le_season": le_season, "le_usage": le_usage,
+                 "appliance_base": appliance_base, "season_mult": season_mult,
+                 "household_factor": household_factor, "monthly_mult": monthly_mult,
+                 "daily_mult": daily_mult, "temp_coeff": temp_coeff}
+    for name, obj in artifacts.items():
+        with open(f'models/{name}.pkl', 'wb') as f:
+            pickle.dump(obj, f)
+    print("✅ Loose pickles also saved to models/ (--legacy-pickles)")
 
 # ============================================================
-# 12. SAVE PROCESSED DATA WITH PREDICTIONS
+# 13. PER-SEGMENT MODELS
+# ============================================================
+# One model per appliance or household cluster with the tuned parameters,
+# trained in parallel worker processes over a shared copy of the features
+if args.segment_by:
+    run.stage("segments", rows=len(df))
+    households = None
+    if args.segment_by == "household_cluster":
+        if "Home ID" not in df.columns:
+            raise SystemExit("❌ --segment-by household_cluster needs a Home ID column")
+        households = household_clusters(df, args.household_clusters)
+    keys = segment_keys(args.segment_by, df["Appliance Type"],
+                        df.get("Home ID"), households)
+    print(f"\n🧩 Training per-{args.segment_by} models")
+    segment_metrics = train_segments(X, y, df["datetime"], keys, study.best_params, args.segment_by,
+                                     workers=args.segment_workers, min_rows=args.min_segment_rows,
+                                     households=households)
+    print(segment_metrics[["segment", "rows", "r2", "mae", "global_mae"]].round(4).to_string(index=False))
+    print("✅ Segment bundles and routing index saved to models/segments/")
+
+# ============================================================
+# 14. SAVE PROCESSED DATA WITH PREDICTIONS
 # ============================================================
 # Add predictions to the full dataset
+run.stage("predict_full", rows=len(df))
 df_full = df.copy()
 X_full = df_full[features]
 X_full_scaled = scaler_x.transform(X_full)
 pred_full_scaled = model.predict(X_full_scaled)
 pred_full = scaler_y.inverse_transform(pred_full_scaled.reshape(-1, 1)).flatten()
 df_full['predicted_energy_kwh'] = pred_full
+if quantile_model is not None:
+    # P10/P50/P90... columns; populate_database.py stores the outermost pair as the interval
+    bands_full = engine.predict_quantiles_features(X_full.to_numpy(dtype=float))
+    for q, column in zip(quantiles, bands_full.T):
+        df_full[quantile_column(q)] = column
 
+run.stage("export_csv", rows=len(df_full))
 df_full.to_csv('models/data_with_predictions.csv', index=False)
 print("✅ Full dataset with predictions saved to models/data_with_predictions.csv")
 
-# ============================================================
-# 13. FORECASTING FUNCTION
-# ============================================================
-def forecast_energy(app, temp, season, house, hr, day, mon, usage_label):
-    usage_encoded = le_usage.transform([usage_label])[0]
-
-    feat = pd.DataFrame([[
-        le_app.transform([app])[0],
-        temp,
-        le_season.transform([season])[0],
-        house,
-        hr,
-        day,
-        mon,
-        appliance_base[app],
-        season_mult[season],
-        household_factor[house],
-        monthly_mult[mon],
-        daily_mult[day],
-        temp * temp_coeff.get(app, 0),
-        usage_encoded,
-        0, 0, 0,  # placeholder for prob features (not known in future)
-        0, 0, 0,
-        0, 0, 0
-    ]], columns=features)
-
-    feat_scaled = scaler_x.transform(feat)
-    pred_scaled = model.predict(feat_scaled)[0]
-    return float(scaler_y.inverse_transform([[pred_scaled]])[0][0])
-
-# Save the forecast function for later use
-with open('models/forecast_function.pkl', 'wb') as f:
-    pickle.dump(forecast_energy, f)
-
-print("✅ Forecast function saved")
 print("\n🎉 XGBoost training complete!")
+run.done()
@@ -0,0 +1,276 @@
+# -----------------------------
+# 🎯 Optuna Tuning - parallel, resumable, pruned
+# -----------------------------
+# The study lives in a local SQLite store, so an interrupted run resumes with
+# every finished trial intact. Trials run in `workers` separate processes that
+# share the store and memory-map the same training arrays, and each trial
+# reports the validation R² XGBoost computes as it boosts, so a MedianPruner
+# can stop hopeless parameter sets early. Trials left RUNNING by a killed
+# process are simply ignored: only COMPLETE and PRUNED trials count toward n_trials.
+# The remaining trials are split across the workers up front, so the study ends
+# with exactly n_trials, and each study keeps its arrays in its own directory
+# under TUNING_DATA_DIR, so concurrent tunings never overwrite each other's data.
+#
+# A new study can be seeded from an earlier one (refresh_xgboost.py does this
+# on retune). The earlier study's best parameter sets are queued as the first
+# trials, so they are re-scored on the new data and TPE starts from known-good
+# regions instead of random ones. Their old scores are not copied: they were
+# measured on different data.
+#
+# Worker entry point (launched by tune()):
+#   python tuning.py --data DIR --storage URL --study-name NAME --n-trials N --n-jobs J
+#                    [--matrix dense|quantized|external] [--chunk-dir DIR]
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+
+import numpy as np
+import optuna
+import xgboost as xgb
+from optuna.storages import RDBStorage
+from optuna.trial import TrialState
+from sklearn.metrics import r2_score
+from xgboost import XGBRegressor
+
+from xgb_data import CHUNK_DIR, MATRIX_MODES, build_matrices, fit_booster
+
+STORAGE = "sqlite:///models/optuna_study.db"
+TUNING_DATA_DIR = "models/cache/tuning"  # one subdirectory per study
+REPORT_EVERY = 10  # boosting rounds between intermediate reports
+DATA_ARRAYS = ["X_train", "y_train", "X_valid", "y_valid", "y_scaling"]
+SEED_TOP = 5  # best trials of the seed study queued into a new one
+
+
+def suggest_params(trial):
+    return {
+        "n_estimators": trial.suggest_int("n_estimators", 300, 800),
+        "max_depth": trial.suggest_int("max_depth", 3, 12),
+        "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3),
+        "subsample": trial.suggest_float("subsample", 0.6, 1.0),
+        "colsample_bytree": trial.suggest_float("colsample_bytree", 0.6, 1.0),
+        "min_child_weight": trial.suggest_int("min_child_weight", 1, 10),
+        "gamma": trial.suggest_float("gamma", 0, 5),
+        "reg_alpha": trial.suggest_float("reg_alpha", 0.0, 1.0),
+        "reg_lambda": trial.suggest_float("reg_lambda", 0.0, 2.0),
+    }
+
+
+class PruningCallback(xgb.callback.TrainingCallback):
+    """Reports validation R² every REPORT_EVERY rounds and stops the booster once Optuna prunes.
+
+    XGBoost tracks RMSE on the scaled target; R² = 1 - (rmse * y_scale)² / var(y_valid).
+    """
+
+    def __init__(self, trial, y_scale, y_var):
+        self.trial = trial
+        self.y_scale = y_scale
+        self.y_var = y_var
+        self.pruned = False
+
+    def after_iteration(self, model, epoch, evals_log):
+        if (epoch + 1) % REPORT_EVERY:
+            return False
+        rmse = evals_log["validation_0"]["rmse"][-1]
+        self.trial.report(1 - (rmse * self.y_scale) ** 2 / self.y_var, epoch + 1)
+        self.pruned = self.trial.should_prune()
+        return self.pruned
+
+
+def make_objective(data, n_jobs=-1, matrices=None):
+    """Objective on the raw arrays, or on prebuilt (dtrain, dvalid) from xgb_data.build_matrices."""
+    y_mean, y_scale = data["y_scaling"]
+    y_valid = data["y_valid"]
+    y_valid_scaled = (y_valid - y_mean) / y_scale
+    y_var = float(np.var(y_valid))
+
+    def booster_objective(trial):
+        dtrain, dvalid = matrices
+        pruning = PruningCallback(trial, y_scale, y_var)
+        booster = fit_booster(suggest_params(trial), dtrain, n_jobs,
+                              evals=[(dvalid, "validation_0")], callbacks=[pruning])
+        if pruning.pruned:
+            raise optuna.TrialPruned()
+
+        pred = booster.predict(dvalid) * y_scale + y_mean
+        return r2_score(y_valid, pred)
+
+    def objective(trial):
+        pruning = PruningCallback(trial, y_scale, y_var)
+        model = XGBRegressor(**suggest_params(trial), random_state=42, n_jobs=n_jobs,
+                             eval_metric="rmse", callbacks=[pruning])
+        model.fit(data["X_train"], data["y_train"],
+                  eval_set=[(data["X_valid"], y_valid_scaled)], verbose=False)
+        if pruning.pruned:
+            raise optuna.TrialPruned()
+
+        pred = model.predict(data["X_valid"]) * y_scale + y_mean
+        return r2_score(y_valid, pred)
+
+    return objective if matrices is None else booster_objective
+
+
+def worker_matrices(data, matrix, chunk_dir=CHUNK_DIR):
+    if matrix == "dense":
+        return None
+    y_mean, y_scale = data["y_scaling"]
+    return build_matrices(matrix, data["X_train"], data["y_train"], data["X_valid"],
+                          (data["y_valid"] - y_mean) / y_scale, chunk_dir=chunk_dir)
+
+
+# ============================================================
+# STUDY STORE + SHARED DATA
+# ============================================================
+def open_study(storage=STORAGE, study_name="xgboost"):
+    engine_kwargs = None
+    if storage.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(storage[len("sqlite:///"):]) or ".", exist_ok=True)
+        # Workers share one SQLite file; wait on its lock instead of failing the trial
+        engine_kwargs = {"connect_args": {"timeout": 60}}
+    rdb = RDBStorage(storage, engine_kwargs=engine_kwargs)
+    return optuna.create_study(study_name=study_name, storage=rdb, direction="maximize",
+                               pruner=optuna.pruners.MedianPruner(n_startup_trials=5,
+                                                                  n_warmup_steps=50),
+                               load_if_exists=True)
+
+
+def data_fingerprint(*arrays):
+    h = hashlib.blake2b(digest_size=8)
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).data)
+    return h.hexdigest()
+
+
+def tuning_data_dir(study_name):
+    return os.path.join(TUNING_DATA_DIR, study_name)
+
+
+def latest_tuning_data():
+    """Directory of the most recently saved tuning arrays, or None."""
+    if not os.path.isdir(TUNING_DATA_DIR):
+        return None
+    dirs = [os.path.join(TUNING_DATA_DIR, d) for d in os.listdir(TUNING_DATA_DIR)]
+    dirs = [d for d in dirs if os.path.isfile(os.path.join(d, f"{DATA_ARRAYS[-1]}.npy"))]
+    return max(dirs, key=os.path.getmtime, default=None)
+
+
+def save_tuning_data(data, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    for name in DATA_ARRAYS:
+        np.save(os.path.join(data_dir, f"{name}.npy"), np.asarray(data[name]))
+
+
+def load_tuning_data(data_dir):
+    return {name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+            for name in DATA_ARRAYS}
+
+
+def finished_trials(study):
+    return len(study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED)))
+
+
+def split_trials(n_trials, workers):
+    """Per-worker trial counts summing to n_trials, skipping workers that would get none."""
+    shares = [n_trials // workers + (i < n_trials % workers) for i in range(workers)]
+    return [n for n in shares if n]
+
+
+def require_complete(study):
+    if not study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,)):
+        raise RuntimeError(f"No trial of study '{study.study_name}' completed - every trial "
+                           "failed or was pruned, so there are no best parameters")
+    return study
+
+
+def seed_study(study, seed_name, storage=STORAGE, top=SEED_TOP):
+    """Queue the `top` best parameter sets of study `seed_name` into `study`; returns how many."""
+    try:
+        previous = optuna.load_study(study_name=seed_name, storage=storage)
+    except KeyError:
+        print(f"⚠️ Seed study '{seed_name}' not found in {storage} - tuning from scratch")
+        return 0
+    complete = previous.get_trials(deepcopy=False, states=(TrialState.COMPLETE,))
+    seen, queued = set(), 0
+    for trial in sorted(complete, key=lambda t: t.value, reverse=True):
+        key = tuple(sorted(trial.params.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        study.enqueue_trial(trial.params)
+        queued += 1
+        if queued == top:
+            break
+    return queued
+
+
+# ============================================================
+# ENTRY POINTS
+# ============================================================
+def tune(X_train, y_train, X_valid, y_valid, y_scaling, n_trials=30, workers=1,
+         storage=STORAGE, study_name=None, matrix="dense", matrices=None, seed_from=None,
+         chunk_dir=CHUNK_DIR):
+    """Run (or resume) the study until it holds n_trials finished trials; returns it.
+
+    The study name defaults to a fingerprint of the training data, so a changed
+    dataset starts a new study instead of resuming a stale one. With a
+    quantized/external `matrix`, pass the prebuilt `matrices` for in-process
+    trials; worker processes build their own once each (external mode streams
+    the chunks in `chunk_dir`). `seed_from` names an
+    earlier study whose best parameter sets a new study tries first.
+    """
+    data = {"X_train": X_train, "y_train": y_train, "X_valid": X_valid,
+            "y_valid": np.asarray(y_valid, dtype=float), "y_scaling": np.asarray(y_scaling, dtype=float)}
+    study_name = study_name or f"xgboost_{data_fingerprint(X_train, y_train, X_valid)}"
+    study = open_study(storage, study_name)
+
+    done = finished_trials(study)
+    if done:
+        print(f"♻️ Resuming study '{study_name}' with {done} finished trials")
+    elif seed_from and seed_from != study_name and not study.trials:
+        queued = seed_study(study, seed_from, storage)
+        if queued:
+            print(f"🌱 Seeded study '{study_name}' with the {queued} best parameter sets of '{seed_from}'")
+    if done >= n_trials:
+        return require_complete(study)
+
+    if workers <= 1:
+        if matrix != "dense" and matrices is None:
+            matrices = worker_matrices(data, matrix, chunk_dir)
+        study.optimize(make_objective(data, matrices=matrices), n_trials=n_trials - done)
+        return require_complete(study)
+
+    data_dir = tuning_data_dir(study_name)
+    save_tuning_data(data, data_dir)
+    shares = split_trials(n_trials - done, workers)
+    n_jobs = max(1, (os.cpu_count() or 1) // len(shares))
+    cmd = [sys.executable, os.path.abspath(__file__), "--data", data_dir,
+           "--storage", storage, "--study-name", study_name,
+           "--n-jobs", str(n_jobs), "--matrix", matrix, "--chunk-dir", chunk_dir]
+    procs = [subprocess.Popen(cmd + ["--n-trials", str(n)]) for n in shares]
+    failed = [p.args for p in procs if p.wait() != 0]
+    if failed:
+        print(f"⚠️ {len(failed)} tuning worker(s) exited with an error")
+    return require_complete(optuna.load_study(study_name=study_name, storage=storage))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optuna tuning worker")
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--storage", default=STORAGE)
+    parser.add_argument("--study-name", required=True)
+    parser.add_argument("--n-trials", type=int, default=30)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--matrix", choices=MATRIX_MODES, default="dense")
+    parser.add_argument("--chunk-dir", default=CHUNK_DIR)
+    args = parser.parse_args()
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = open_study(args.storage, args.study_name)
+    data = load_tuning_data(args.data)
+    objective = make_objective(data, args.n_jobs, worker_matrices(data, args.matrix, args.chunk_dir))
+    study.optimize(objective, n_trials=args.n_trials)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# -----------------------------
+# 🔄 Incremental K-Means Update - nightly delta instead of a full recluster
+# -----------------------------
+# Loads the saved clustering, moves its centroids using only the new readings,
+# keeps Peak/Normal/Off-Peak attached to the same clusters by matching new
+# centroids to old ones, and relabels only the stored readings that fall in an
+# (hour, weekday, energy range) cell whose label actually changed.
+#
+# Usage: python update_kmeans.py --new todays_readings.csv [--db]
+import argparse
+import copy
+
+from features import build_features
+from clustering import (load_kmeans, save_kmeans, update_centroids, match_labels,
+                        labels_in_energy_order, centroid_energy, changed_label_ranges, scale)
+from instrument import StageRecorder, add_instrument_args
+
+RELABEL_QUERY = """
+WITH moved AS (
+    UPDATE energy_consumption
+    SET usage_label = %(new_label)s
+    WHERE EXTRACT(HOUR FROM timestamp) = %(hour)s
+      AND EXTRACT(ISODOW FROM timestamp) - 1 = %(weekday)s
+      AND energy_kwh >= %(energy_from)s AND energy_kwh < %(energy_to)s
+      AND usage_label IS DISTINCT FROM %(new_label)s
+    RETURNING timestamp
+)
+SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM moved
+"""
+
+
+def relabel_database(conn, changes):
+    """Apply the changed cells to energy_consumption; returns the number of rows touched.
+
+    The rollups keyed by usage_label are recomputed over the relabelled
+    range in the same transaction.
+    """
+    from rollups import refresh_rollups
+
+    touched, start, end = 0, None, None
+    with conn.cursor() as cursor:
+        for change in changes.to_dict(orient="records"):
+            change["energy_from"] = max(change["energy_from"], -1e9)
+            change["energy_to"] = min(change["energy_to"], 1e9)
+            change["hour"] = int(change["hour"])
+            change["weekday"] = int(change["weekday"])
+            cursor.execute(RELABEL_QUERY, change)
+            rows, first, last = cursor.fetchone()
+            if rows:
+                touched += rows
+                start = first if start is None else min(start, first)
+                end = last if end is None else max(end, last)
+        if touched:
+            refresh_rollups(cursor, start, end)
+    conn.commit()
+    return touched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental k-means update from new readings")
+    parser.add_argument("--new", required=True, help="CSV of new readings (Kaggle schema)")
+    parser.add_argument("--models", default="models")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--db", action="store_true", help="relabel affected rows in energy_consumption")
+    args = add_instrument_args(parser).parse_args()
+    run = StageRecorder("update_kmeans", args)
+
+    run.stage("load")
+
+    saved = load_kmeans(args.models, required=("kmeans_model", "kmeans_scaler",
+                                                "kmeans_labels", "kmeans_counts"))
+    if saved is None:
+        raise SystemExit("❌ No saved clustering with counts - run train_kmeans.py first")
+
+    kmeans, scaler = saved["kmeans_model"], saved["kmeans_scaler"]
+    old_labels, counts = saved["kmeans_labels"], saved["kmeans_counts"]
+    old_centers = copy.deepcopy(kmeans.cluster_centers_)
+
+    delta = build_features(args.new)
+    print(f"📥 {len(delta)} new readings")
+    run.rows(len(delta))
+
+    # 1️⃣ Update centroids from the delta only
+    run.stage("update", rows=len(delta) * args.iterations)
+    counts = update_centroids(kmeans, scaler, counts, delta, iterations=args.iterations)
+    shift = ((kmeans.cluster_centers_ - old_centers) ** 2).sum(axis=1) ** 0.5
+    print("📐 Centroid shift (scaled units):", {c: round(float(d), 4) for c, d in enumerate(shift)})
+
+    # 2️⃣ Keep every label on its cluster by matching new centroids to old ones
+    labels = match_labels(old_centers, kmeans.cluster_centers_, old_labels)
+    if not labels_in_energy_order(labels, centroid_energy(kmeans, scaler)):
+        print("⚠️ Matched labels no longer follow centroid energy order - consider a full retrain")
+
+    # 3️⃣ Label the delta and find the stored rows whose label changed
+    run.stage("label_delta", rows=len(delta))
+    delta["cluster"] = kmeans.predict(scale(scaler, delta))
+    delta["usage_label"] = delta["cluster"].map(labels)
+    delta.to_csv(f"{args.models}/delta_with_clusters.csv", index=False)
+
+    changes = changed_label_ranges(old_centers, old_labels, kmeans.cluster_centers_, labels, scaler)
+    print(f"🔁 {len(changes)} (hour, weekday, energy range) cells changed label")
+    if len(changes):
+        print(changes.head(20).to_string(index=False))
+
+    if args.db and len(changes):
+        import psycopg2
+        from db_config import DB_CONFIG
+        run.stage("relabel_db")
+        with psycopg2.connect(**DB_CONFIG) as conn:
+            relabelled = relabel_database(conn, changes)
+        run.rows(relabelled)
+        print(f"✅ Relabelled {relabelled} stored readings")
+
+    run.stage("save_model")
+    save_kmeans(kmeans, scaler, labels, counts, args.models)
+    print(f"✅ Updated clustering saved to {args.models}/ ({int(counts.sum())} rows represented)")
+    run.done()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# -----------------------------
+# 🚶 Walk-Forward Validation - time-ordered folds evaluated in parallel
+# -----------------------------
+# Every fold trains on all readings before a cut-off and is scored on the next
+# block of time, so no fold ever sees its own future. Folds are independent and
+# run as separate worker processes (like the tuning workers, so the calling
+# script is never re-imported) over memory-mapped copies of the data, written to
+# a directory private to the run (in /dev/shm when they fit) and removed after
+# it; scalers are refit inside each fold on its training rows. If one fold
+# fails, the folds still running are stopped before the error is raised.
+#
+# The per-fold metrics and their mean are written to
+# models/walk_forward_metrics.json, which the backend's forecasts endpoint serves.
+#
+# Worker entry point (launched by walk_forward()):
+#   python walk_forward.py --data DIR --fold I --n-folds N --params JSON --n-jobs J
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from xgboost import XGBRegressor
+
+METRICS_PATH = "models/walk_forward_metrics.json"
+SHARED_DIR = "/dev/shm"
+FOLD_DATA_DIR = "models/cache/walk_forward"  # one subdirectory per run when /dev/shm is too small
+
+
+def chronological_split(timestamps, test_size=0.2):
+    """(train_idx, test_idx) with the latest `test_size` share of readings held out."""
+    order = np.argsort(np.asarray(timestamps), kind="stable")
+    cut = int(round(len(order) * (1 - test_size)))
+    return order[:cut], order[cut:]
+
+
+def walk_forward_folds(timestamps, n_folds=5, min_train=0.5):
+    """Expanding-window folds: the first `min_train` share of time trains fold 0,
+    the rest is cut into `n_folds` equal-size test blocks in time order."""
+    order = np.argsort(np.asarray(timestamps), kind="stable")
+    bounds = np.linspace(int(len(order) * min_train), len(order), n_folds + 1).astype(int)
+    return [(order[:start], order[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def evaluate_fold(X, y, ts, fold, train_idx, test_idx, params, n_jobs=1):
+    x_mean, x_scale = X[train_idx].mean(axis=0), X[train_idx].std(axis=0)
+    x_scale[x_scale == 0] = 1.0
+    y_mean, y_scale = y[train_idx].mean(), y[train_idx].std() or 1.0
+
+    model = XGBRegressor(**params, random_state=42, n_jobs=n_jobs)
+    model.fit((X[train_idx] - x_mean) / x_scale, (y[train_idx] - y_mean) / y_scale)
+    pred = model.predict((X[test_idx] - x_mean) / x_scale) * y_scale + y_mean
+
+    y_test = y[test_idx]
+    return {
+        "fold": fold,
+        "train_rows": int(len(train_idx)),
+        "test_rows": int(len(test_idx)),
+        "test_from": str(pd.Timestamp(ts[test_idx].min())),
+        "test_to": str(pd.Timestamp(ts[test_idx].max())),
+        "r2": float(r2_score(y_test, pred)),
+        "mae": float(mean_absolute_error(y_test, pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, pred))),
+    }
+
+
+def _data_dir(nbytes):
+    """A fresh directory for this run's arrays, in shared memory if they fit there."""
+    if os.path.isdir(SHARED_DIR) and shutil.disk_usage(SHARED_DIR).free > 2 * nbytes:
+        return os.path.join(SHARED_DIR, f"ieoms-walk-forward-{os.getpid()}")
+    return os.path.join(FOLD_DATA_DIR, str(os.getpid()))
+
+
+def walk_forward(X, y, timestamps, params, n_folds=5, workers=None):
+    """Evaluate `params` on every fold, `workers` folds at a time; returns a per-fold DataFrame."""
+    X = np.asarray(X, dtype=np.float64)
+    data_dir = _data_dir(X.nbytes + 16 * len(X))
+    workers = min(workers or os.cpu_count() or 1, n_folds)
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    cmd = [sys.executable, os.path.abspath(__file__), "--data", data_dir, "--n-folds", str(n_folds),
+           "--params", json.dumps(params), "--n-jobs", str(n_jobs)]
+
+    results, running, pending = [], [], list(range(n_folds))
+    try:
+        os.makedirs(data_dir, exist_ok=True)
+        np.save(os.path.join(data_dir, "X.npy"), X)
+        np.save(os.path.join(data_dir, "y.npy"), np.asarray(y, dtype=np.float64))
+        np.save(os.path.join(data_dir, "timestamps.npy"), np.asarray(timestamps, dtype="datetime64[ns]"))
+        while pending or running:
+            while pending and len(running) < workers:
+                fold = pending.pop(0)
+                running.append(subprocess.Popen(cmd + ["--fold", str(fold)], stdout=subprocess.PIPE, text=True))
+            proc = running.pop(0)
+            out, _ = proc.communicate()
+            if proc.returncode:
+                raise RuntimeError(f"Walk-forward worker failed: {' '.join(proc.args)}")
+            results.append(json.loads(out))
+    finally:
+        for proc in running:
+            proc.kill()
+            proc.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return pd.DataFrame(results).sort_values("fold").reset_index(drop=True)
+
+
+def save_metrics(folds, params, path=METRICS_PATH):
+    summary = {m: round(float(folds[m].mean()), 4) for m in ["r2", "mae", "rmse"]}
+    with open(path, "w") as f:
+        json.dump({"method": "walk_forward", "n_folds": len(folds), **summary,
+                   "params": params, "folds": folds.to_dict(orient="records")}, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward fold worker")
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--fold", type=int, required=True)
+    parser.add_argument("--n-folds", type=int, default=5)
+    parser.add_argument("--params", required=True, help="XGBRegressor params as JSON")
+    parser.add_argument("--n-jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    X, y, ts = (np.load(os.path.join(args.data, f"{name}.npy"), mmap_mode="r")
+                for name in ["X", "y", "timestamps"])
+    train_idx, test_idx = walk_forward_folds(ts, args.n_folds)[args.fold]
+    print(json.dumps(evaluate_fold(X, y, ts, args.fold, train_idx, test_idx,
+                                   json.loads(args.params), args.n_jobs)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# -----------------------------
+# 🧱 XGBoost Training Matrices - quantized once, optionally out-of-core
+# -----------------------------
+# The sklearn wrapper rebuilds its internal DMatrix on every fit. Here the
+# training matrix is histogram-quantized once and handed to every Optuna
+# trial and the final fit:
+#
+#   dense     - XGBRegressor on NumPy arrays (original path)
+#   quantized - one in-memory QuantileDMatrix
+#   external  - ExtMemQuantileDMatrix streamed from chunk files on disk, so
+#               the training rows never have to fit in RAM at once
+import glob
+import os
+
+import numpy as np
+import xgboost as xgb
+from xgboost import XGBRegressor
+
+MATRIX_MODES = ["dense", "quantized", "external"]
+CHUNK_DIR = "models/cache/xgb_chunks"
+CHUNK_ROWS = 250_000
+MAX_BIN = 256
+
+
+def write_chunks(X, y, chunk_dir=CHUNK_DIR, chunk_rows=CHUNK_ROWS):
+    """Spill (X, y) to numbered X_/y_ .npy pairs; returns the number of chunks."""
+    os.makedirs(chunk_dir, exist_ok=True)
+    stale = glob.glob(os.path.join(chunk_dir, "[Xy]_*.npy"))
+    stale += glob.glob(os.path.join(chunk_dir, "cache", "*"))  # old external-memory pages
+    for path in stale:
+        os.remove(path)
+    n_chunks = 0
+    for n_chunks, start in enumerate(range(0, len(X), chunk_rows), start=1):
+        np.save(os.path.join(chunk_dir, f"X_{n_chunks:05d}.npy"),
+                np.asarray(X[start:start + chunk_rows], dtype=np.float32))
+        np.save(os.path.join(chunk_dir, f"y_{n_chunks:05d}.npy"),
+                np.asarray(y[start:start + chunk_rows], dtype=np.float32))
+    return n_chunks
+
+
+class ChunkIter(xgb.DataIter):
+    """Feeds XGBoost one X_/y_ chunk pair at a time from `chunk_dir`."""
+
+    def __init__(self, chunk_dir=CHUNK_DIR):
+        self.x_files = sorted(glob.glob(os.path.join(chunk_dir, "X_*.npy")))
+        self.pos = 0
+        os.makedirs(os.path.join(chunk_dir, "cache"), exist_ok=True)
+        # One page cache per process: parallel tuning workers stream the same chunks
+        super().__init__(cache_prefix=os.path.join(chunk_dir, "cache", f"xgb-{os.getpid()}"))
+        if not self.x_files:
+            raise FileNotFoundError(f"No X_*.npy chunks in {chunk_dir}")
+
+    def next(self, input_data):
+        if self.pos == len(self.x_files):
+            return False
+        x_file = self.x_files[self.pos]
+        y_file = os.path.join(os.path.dirname(x_file), "y_" + os.path.basename(x_file)[2:])
+        input_data(data=np.load(x_file), label=np.load(y_file))
+        self.pos += 1
+        return True
+
+    def reset(self):
+        self.pos = 0
+
+
+def build_matrices(mode, X_train=None, y_train=None, X_valid=None, y_valid_scaled=None,
+                   chunk_dir=CHUNK_DIR, max_bin=MAX_BIN):
+    """Returns (dtrain, dvalid); the validation matrix shares dtrain's histogram cuts.
+
+    In external mode the training rows come from the chunks already in `chunk_dir`
+    and X_train / y_train are not used.
+    """
+    if mode == "quantized":
+        dtrain = xgb.QuantileDMatrix(X_train, y_train, max_bin=max_bin)
+    elif mode == "external":
+        dtrain = xgb.ExtMemQuantileDMatrix(ChunkIter(chunk_dir), max_bin=max_bin)
+    else:
+        raise ValueError(f"No prebuilt matrix for mode '{mode}'")
+    dvalid = xgb.QuantileDMatrix(X_valid, y_valid_scaled, ref=dtrain, max_bin=max_bin)
+    return dtrain, dvalid
+
+
+def booster_params(params, n_jobs=-1, max_bin=MAX_BIN):
+    """sklearn-style params (as Optuna suggests them) -> (native params, rounds)."""
+    params = dict(params)
+    rounds = params.pop("n_estimators")
+    params.update(objective="reg:squarederror", eval_metric="rmse", tree_method="hist",
+                  max_bin=max_bin, seed=42, nthread=n_jobs)
+    return params, rounds
+
+
+def fit_booster(params, dtrain, n_jobs=-1, evals=(), callbacks=None):
+    native, rounds = booster_params(params, n_jobs)
+    return xgb.train(native, dtrain, num_boost_round=rounds, evals=list(evals),
+                     callbacks=callbacks, verbose_eval=False)
+
+
+def as_regressor(booster, params):
+    """Wrap a trained Booster as an XGBRegressor so model.pkl keeps its usual type."""
+    model = XGBRegressor(**params, random_state=42, n_jobs=-1)
+    model.load_model(bytearray(booster.save_raw("ubj")))
+    return model